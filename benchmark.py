@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+'''
+    Benchmark drahtgitter operators, not part of the unit tests.
+
+    Run all benchmarks with 'python benchmark.py', or only some of
+    them by name, e.g. 'python benchmark.py deflate simplify'.
+'''
+
+import sys
+import timeit
+import random
+try :
+    import numpy
+except ImportError :
+    numpy = None
+from drahtgitter.core import *
+import drahtgitter.core
+import drahtgitter.generators.sphere as sphere
+import drahtgitter.generators.torus as torus
+import drahtgitter.operators.computeTriangleNormals as computeTriangleNormals
+import drahtgitter.operators.computeVertexNormals as computeVertexNormals
+import drahtgitter.operators.computeTangents as computeTangents
+import drahtgitter.operators.optimizeVertexCache as optimizeVertexCache
+import drahtgitter.operators.optimizeOverdraw as optimizeOverdraw
+import drahtgitter.operators.simplify as simplify
+import drahtgitter.operators.packVertexComponents as packVertexComponents
+import drahtgitter.operators.fixVertexComponents as fixVertexComponents
+import drahtgitter.operators.deflate as deflate
+
+pos0 = ('position', 0)
+norm0 = ('normal', 0)
+tex0 = ('texcoord', 0)
+color0 = ('color', 0)
+
+#-------------------------------------------------------------------------------
+def _buildVertexLayout() :
+    vl = VertexLayout()
+    vl.add(VertexComponent(pos0, 3))
+    vl.add(VertexComponent(norm0, 3))
+    vl.add(VertexComponent(tex0, 2))
+    return vl
+
+#-------------------------------------------------------------------------------
+def _shuffledSphere(numSlices, numStacks) :
+    model = sphere.generate(_buildVertexLayout(), 1.0, numSlices, numStacks)
+    order = range(0, model.mesh.getNumTriangles())
+    random.Random(1).shuffle(order)
+    model.mesh.reorderTriangles(order)
+    return model
+
+#-------------------------------------------------------------------------------
+def _time(fn, repeat=2) :
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+#-------------------------------------------------------------------------------
+def _numpyPaths() :
+    paths = [('python', None)]
+    if numpy is not None :
+        paths.append(('numpy', numpy))
+    return paths
+
+#-------------------------------------------------------------------------------
+def vector() :
+    # memory footprint and allocation time compared to an
+    # equivalent dict-backed class
+    class DictVector(object) :
+        def __init__(self, _x=0.0, _y=0.0, _z=0.0, _w=0.0) :
+            self.x = _x
+            self.y = _y
+            self.z = _z
+            self.w = _w
+    dictVec = DictVector(1.0, 2.0, 3.0)
+    dictSize = sys.getsizeof(dictVec) + sys.getsizeof(dictVec.__dict__)
+    slotSize = sys.getsizeof(Vector(1.0, 2.0, 3.0))
+    dictTime = min(timeit.repeat(lambda: DictVector(1.0, 2.0, 3.0), number=20000, repeat=3))
+    slotTime = min(timeit.repeat(lambda: Vector(1.0, 2.0, 3.0), number=20000, repeat=3))
+    print 'Vector: {} bytes (dict-backed: {} bytes), 20000 allocs: {:.4f}s (dict-backed: {:.4f}s)'.format(slotSize, dictSize, slotTime, dictTime)
+
+#-------------------------------------------------------------------------------
+def triangleNormals() :
+    model = sphere.generate(_buildVertexLayout(), 1.0, 128, 64)
+    mesh = model.mesh
+    for name, module in _numpyPaths() :
+        drahtgitter.core.numpy = module
+        try :
+            t = _time(lambda: computeTriangleNormals.do(model) and mesh.touch(), 3)
+            print 'computeTriangleNormals {} {} triangles: {:.4f}s'.format(name, mesh.getNumTriangles(), t)
+        finally :
+            drahtgitter.core.numpy = numpy
+
+#-------------------------------------------------------------------------------
+def vertexNormals() :
+    for numSlices, numStacks in [(64, 32), (128, 64)] :
+        model = sphere.generate(_buildVertexLayout(), 1.0, numSlices, numStacks)
+        t = _time(lambda: computeVertexNormals.do(model, computeVertexNormals.Angle, 30.0))
+        print 'computeVertexNormals {} triangles: {:.4f}s'.format(model.mesh.getNumTriangles(), t)
+
+#-------------------------------------------------------------------------------
+def tangents() :
+    # a sphere with a planar uv mapping
+    model = sphere.generate(_buildVertexLayout(), 1.0, 128, 64)
+    positions = model.mesh.getComponentData(pos0)
+    uvs = []
+    for i in range(0, len(positions), 3) :
+        uvs.extend((positions[i], positions[i + 2]))
+    model.mesh.setComponent(tex0, uvs)
+    t = _time(lambda: computeTangents.do(model))
+    print 'computeTangents {} triangles: {:.4f}s'.format(model.mesh.getNumTriangles(), t)
+
+#-------------------------------------------------------------------------------
+def vertexCache() :
+    for numSlices, numStacks in [(64, 32), (128, 64), (256, 128)] :
+        model = _shuffledSphere(numSlices, numStacks)
+        t = _time(lambda: optimizeVertexCache.do(model))
+        optMesh = optimizeVertexCache.do(model).mesh
+        print 'optimizeVertexCache {} triangles: {:.4f}s, ACMR {:.3f} -> {:.3f}'.format(model.mesh.getNumTriangles(), t, model.mesh.getACMR(), optMesh.getACMR())
+
+#-------------------------------------------------------------------------------
+def overdraw() :
+    model = torus.generate(_buildVertexLayout(), 0.5, 1.0, 32, 48)
+    order = range(0, model.mesh.getNumTriangles())
+    random.Random(1).shuffle(order)
+    model.mesh.reorderTriangles(order)
+    cacheModel = optimizeVertexCache.do(model)
+    t = _time(lambda: optimizeOverdraw.do(cacheModel, 1.05))
+    overdrawModel = optimizeOverdraw.do(cacheModel, 1.05)
+    print 'optimizeOverdraw {} triangles: {:.4f}s, ACMR {:.3f} -> {:.3f}'.format(model.mesh.getNumTriangles(), t, cacheModel.mesh.getACMR(), overdrawModel.mesh.getACMR())
+
+#-------------------------------------------------------------------------------
+def simplification() :
+    # both paths on a 16k triangle sphere, the numpy path also on a 500k one
+    for numSlices, numStacks in [(128, 64), (512, 512)] :
+        model = sphere.generate(_buildVertexLayout(), 1.0, numSlices, numStacks)
+        for name, module in _numpyPaths() :
+            if module is None and numSlices > 128 :
+                continue
+            simplify.numpy = module
+            try :
+                start = timeit.default_timer()
+                simplified = simplify.do(model, model.mesh.getNumTriangles() / 10)
+                print 'simplify {}: {} -> {} triangles in {:.3f}s'.format(name, model.mesh.getNumTriangles(), simplified.mesh.getNumTriangles(), timeit.default_timer() - start)
+            finally :
+                simplify.numpy = numpy
+
+#-------------------------------------------------------------------------------
+def packing() :
+    vl = _buildVertexLayout()
+    vl.add(VertexComponent(color0, 4))
+    model = sphere.generate(vl, 1.0, 64, 32)
+    formats = { norm0: VertexComponent.OctSnorm16, tex0: VertexComponent.Half, color0: VertexComponent.Unorm8 }
+    for name, module in _numpyPaths() :
+        drahtgitter.core.numpy = module
+        try :
+            t = _time(lambda: packVertexComponents.do(model, formats).mesh.packVertices())
+            print 'packVertexComponents {} {} vertices: {:.4f}s'.format(name, model.mesh.getNumVertices(), t)
+        finally :
+            drahtgitter.core.numpy = numpy
+
+#-------------------------------------------------------------------------------
+def deflation() :
+    # both modes on a tiger-sized mesh
+    reducedVl = VertexLayout()
+    reducedVl.add(VertexComponent(pos0, 3))
+    model = fixVertexComponents.do(sphere.generate(_buildVertexLayout(), 1.0, 128, 64), reducedVl)
+    sortTime = _time(lambda: deflate.do(model, deflate.Sort))
+    hashTime = _time(lambda: deflate.do(model, deflate.Hash))
+    exactTime = _time(lambda: deflate.do(model, deflate.Hash, 0.0))
+    print 'deflate {} vertices: sort {:.3f}s, hash {:.3f}s, exact {:.3f}s'.format(model.mesh.getNumVertices(), sortTime, hashTime, exactTime)
+
+#-------------------------------------------------------------------------------
+benchmarks = [
+    ('vector', vector),
+    ('triangleNormals', triangleNormals),
+    ('vertexNormals', vertexNormals),
+    ('tangents', tangents),
+    ('vertexCache', vertexCache),
+    ('overdraw', overdraw),
+    ('simplify', simplification),
+    ('packing', packing),
+    ('deflate', deflation),
+]
+
+if __name__ == '__main__' :
+    names = sys.argv[1:]
+    for name, fn in benchmarks :
+        if not names or name in names :
+            fn()
+
+#--- eof
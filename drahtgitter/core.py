@@ -7,6 +7,17 @@ import logging
 import math
 import copy
 import sys
+import mmap
+import ctypes
+import tempfile
+import hashlib
+import zlib
+
+# numpy is optional, only needed for the zero-copy array views
+try :
+    import numpy
+except ImportError :
+    numpy = None
 
 '''
 Initialize the drahtgitter logger object
@@ -19,10 +30,13 @@ dgLogger.setLevel(logging.DEBUG)
 DG_TOLERANCE = 0.00000001
 
 #-------------------------------------------------------------------------------
-class Vector :
+class Vector(object) :
     '''
     A very simple 1..4D vector class 
     '''
+    # no per-object dict, vectors are created in large numbers
+    __slots__ = ('x', 'y', 'z', 'w')
+
     def __init__(self, _x=0.0, _y=0.0, _z=0.0, _w=0.0) :
         '''
         Construct from 0..4 values
@@ -95,10 +109,12 @@ class Vector :
         return Vector(v.x / l, v.y / l, v.z / l, v.w / l)
 
 #-------------------------------------------------------------------------------
-class Triangle :
+class Triangle(object) :
     '''
     A triangle in a Mesh object
     '''
+    __slots__ = ('vertexIndex0', 'vertexIndex1', 'vertexIndex2', 'groupIndex', 'normalX', 'normalY', 'normalZ')
+
     def __init__(self, vi0=0, vi1=0, vi2=0, groupIndex=0) :
         self.vertexIndex0 = vi0
         self.vertexIndex1 = vi1
@@ -115,52 +131,228 @@ class Triangle :
         '''
         Checks whether this triangle is degenerate.
         '''
+        return isDegenerateTriangle(vertexLayout, vertexBuffer, self.vertexIndex0, self.vertexIndex1, self.vertexIndex2)
+
+#-------------------------------------------------------------------------------
+def isDegenerateTriangle(vertexLayout, vertexBuffer, vi0, vi1, vi2) :
+    '''
+    Checks whether the triangle defined by 3 vertex indices is degenerate.
+    '''
 
-        # check vertex indices
-        if self.vertexIndex0 == self.vertexIndex1 or self.vertexIndex0 == self.vertexIndex2 or self.vertexIndex1 == self.vertexIndex2 :
-            return True
-
-        # check for identical vertices (within DG_TOLERANCE)
-        posOffset = vertexLayout.getComponent(('position', 0)).offset
-        index0 = self.vertexIndex0 * vertexLayout.size + posOffset
-        v0 = Vector(vertexBuffer[index0 + 0], vertexBuffer[index0 + 1], vertexBuffer[index0 + 2])
-        index1 = self.vertexIndex1 * vertexLayout.size + posOffset
-        v1 = Vector(vertexBuffer[index1 + 0], vertexBuffer[index1 + 1], vertexBuffer[index1 + 2])
-        index2 = self.vertexIndex2 * vertexLayout.size + posOffset
-        v2 = Vector(vertexBuffer[index2 + 0], vertexBuffer[index2 + 1], vertexBuffer[index2 + 2])
-        if Vector.equal(v0, v1, DG_TOLERANCE) or Vector.equal(v1, v2, DG_TOLERANCE) or Vector.equal(v0, v2, DG_TOLERANCE) :
-            return True
-
-        # check the cross product
-        v10 = v1 - v0
-        v20 = v2 - v0
-        cross = Vector.cross3(v10, v20)
-        if Vector.equal(cross, Vector(0.0, 0.0, 0.0), 0.0000001) :
-            return True
+    # check vertex indices
+    if vi0 == vi1 or vi0 == vi2 or vi1 == vi2 :
+        return True
+
+    # check for identical vertices (within DG_TOLERANCE)
+    posOffset = vertexLayout.getComponent(('position', 0)).offset
+    index0 = vi0 * vertexLayout.size + posOffset
+    v0 = Vector(vertexBuffer[index0 + 0], vertexBuffer[index0 + 1], vertexBuffer[index0 + 2])
+    index1 = vi1 * vertexLayout.size + posOffset
+    v1 = Vector(vertexBuffer[index1 + 0], vertexBuffer[index1 + 1], vertexBuffer[index1 + 2])
+    index2 = vi2 * vertexLayout.size + posOffset
+    v2 = Vector(vertexBuffer[index2 + 0], vertexBuffer[index2 + 1], vertexBuffer[index2 + 2])
+    if Vector.equal(v0, v1, DG_TOLERANCE) or Vector.equal(v1, v2, DG_TOLERANCE) or Vector.equal(v0, v2, DG_TOLERANCE) :
+        return True
+
+    # check the cross product
+    v10 = v1 - v0
+    v20 = v2 - v0
+    cross = Vector.cross3(v10, v20)
+    if Vector.equal(cross, Vector(0.0, 0.0, 0.0), 0.0000001) :
+        return True
+
+    return False
 
-        return False
+#-------------------------------------------------------------------------------
+class TriangleView(object) :
+    '''
+    A Triangle-compatible accessor into the triangle arrays of a Mesh
+    object, reading and writing attributes goes directly to the mesh.
+    '''
+    def __init__(self, mesh, triIndex) :
+        self.mesh = mesh
+        self.triIndex = triIndex
+
+    def _getIndex(self, i) :
+        return self.mesh.indices[self.triIndex * 3 + i]
+    def _setIndex(self, i, value) :
+        self.mesh.makeUnique('indices')[self.triIndex * 3 + i] = value
+
+    vertexIndex0 = property(lambda self: self._getIndex(0), lambda self, v: self._setIndex(0, v))
+    vertexIndex1 = property(lambda self: self._getIndex(1), lambda self, v: self._setIndex(1, v))
+    vertexIndex2 = property(lambda self: self._getIndex(2), lambda self, v: self._setIndex(2, v))
+
+    def _getGroupIndex(self) :
+        return self.mesh.groupIndices[self.triIndex]
+    def _setGroupIndex(self, value) :
+        self.mesh.makeUnique('groupIndices')[self.triIndex] = value
+
+    groupIndex = property(_getGroupIndex, _setGroupIndex)
+
+    def _getNormal(self, i) :
+        if self.mesh.triangleNormals is None :
+            return 0.0
+        return self.mesh.triangleNormals[self.triIndex * 3 + i]
+    def _setNormal(self, i, value) :
+        self.mesh.allocTriangleNormals()
+        self.mesh.makeUnique('triangleNormals')[self.triIndex * 3 + i] = value
+
+    normalX = property(lambda self: self._getNormal(0), lambda self, v: self._setNormal(0, v))
+    normalY = property(lambda self: self._getNormal(1), lambda self, v: self._setNormal(1, v))
+    normalZ = property(lambda self: self._getNormal(2), lambda self, v: self._setNormal(2, v))
+
+    def getNormal(self) :
+        return Vector(self.normalX, self.normalY, self.normalZ)
+
+    def isDegenerate(self, vertexLayout, vertexBuffer) :
+        '''
+        Checks whether this triangle is degenerate.
+        '''
+        return isDegenerateTriangle(vertexLayout, vertexBuffer, self.vertexIndex0, self.vertexIndex1, self.vertexIndex2)
 
 #-------------------------------------------------------------------------------
-class VertexComponent :
+class TriangleList(object) :
+    '''
+    Sequence-like wrapper around the triangle arrays of a Mesh object,
+    returns TriangleView objects (a list of them for slices). Only for
+    backward compatibility, new code should directly work on the Mesh's
+    index arrays.
+    '''
+    def __init__(self, mesh) :
+        self.mesh = mesh
+
+    def __len__(self) :
+        return self.mesh.getNumTriangles()
+
+    def _checkIndex(self, triIndex) :
+        if not isinstance(triIndex, (int, long)) :
+            raise TypeError('Triangle indices must be integers or slices, not {}'.format(type(triIndex).__name__))
+        numTriangles = self.mesh.getNumTriangles()
+        if triIndex < 0 :
+            triIndex += numTriangles
+        if triIndex < 0 or triIndex >= numTriangles :
+            raise IndexError('Triangle index out of range')
+        return triIndex
+
+    def __getitem__(self, triIndex) :
+        if isinstance(triIndex, slice) :
+            return [TriangleView(self.mesh, i) for i in xrange(*triIndex.indices(len(self)))]
+        return TriangleView(self.mesh, self._checkIndex(triIndex))
+
+    def __setitem__(self, triIndex, triangle) :
+        if isinstance(triIndex, slice) :
+            raise TypeError('Slice assignment of triangles not supported, use Mesh.setTriangles()')
+        self.mesh.setTriangle(self._checkIndex(triIndex), triangle)
+
+    def __delitem__(self, triIndex) :
+        if isinstance(triIndex, slice) :
+            self.mesh.removeTriangles(xrange(*triIndex.indices(len(self))))
+        else :
+            self.mesh.removeTriangle(self._checkIndex(triIndex))
+
+    def __iter__(self) :
+        for triIndex in xrange(0, self.mesh.getNumTriangles()) :
+            yield TriangleView(self.mesh, triIndex)
+
+    def append(self, triangle) :
+        self.mesh.reserveTriangles(1)
+        self.mesh.setTriangle(self.mesh.getNumTriangles() - 1, triangle)
+
+#-------------------------------------------------------------------------------
+class Meshlet(object) :
+    '''
+    A cluster of triangles of a Mesh for per-cluster GPU culling, see
+    operators.buildMeshlets. The triangles are the range firstTriangle,
+    numTriangles of the mesh, vertices holds the mesh vertex indices and
+    localIndices 3 indices into vertices per triangle. The bounding
+    sphere is (center, radius), the normal cone (coneApex, coneAxis,
+    coneCutoff) with coneCutoff the cosine of the cone's half angle.
+    '''
+    __slots__ = ('groupIndex', 'firstTriangle', 'numTriangles', 'vertices', 'localIndices',
+                 'center', 'radius', 'coneApex', 'coneAxis', 'coneCutoff')
+
+    def __init__(self, groupIndex=0, firstTriangle=0) :
+        self.groupIndex = groupIndex
+        self.firstTriangle = firstTriangle
+        self.numTriangles = 0
+        self.vertices = array(Mesh.IndexType)
+        self.localIndices = array('B')
+        self.center = Vector()
+        self.radius = 0.0
+        self.coneApex = Vector()
+        self.coneAxis = Vector()
+        self.coneCutoff = -1.0
+
+    def isBackfacing(self, cameraPos) :
+        '''
+        Conservative backface test, returns True if all triangles
+        of the meshlet face away from a camera position
+        '''
+        if self.coneCutoff <= 0.0 :
+            return False
+        d = self.coneApex - cameraPos
+        l = Vector.length(d)
+        if l == 0.0 :
+            return False
+        sinAngle = math.sqrt(1.0 - self.coneCutoff * self.coneCutoff)
+        return Vector.dot3(d, self.coneAxis) >= sinAngle * l
+
+#-------------------------------------------------------------------------------
+class VertexComponent(object) :
     '''
     A single entry in a VertexLayout, describes one vertex component
     '''
-    def __init__(self, nameAndIndex, size) :
+    __slots__ = ('nameAndIndex', 'offset', 'size', 'format')
+
+    # packed formats
+    Float = 1           # 32-bit float per value
+    Half = 2            # 16-bit float per value
+    Unorm8 = 3          # unsigned byte per value, 0.0..1.0
+    OctSnorm16 = 4      # unit vector (size 3) as 2 signed shorts, octahedral mapping
+
+    def __init__(self, nameAndIndex, size, format=Float) :
         '''
         NOTE: The index is the "stream index", for instance the
         first set of uv coords would have an index=0, the second index=1.
         The offset is the offset of the float data in a vertex (0 is start of
-        vertex), size if the number of floats in the vertex (must be between 1 and 4)
+        vertex), size if the number of floats in the vertex (must be between 1 and 4).
+        The format is the packed format of the component (see Mesh.packVertices()),
+        the vertex buffer always holds floats.
         '''
         self.nameAndIndex = nameAndIndex
         self.offset = 0
         self.size   = size
+        self.format = format
 
     def validate(self) :
         if self.nameAndIndex[1] < 0 or self.nameAndIndex[1] > 8 :
             raise Exception('Stream index must be between 0 and 8')
         if self.size < 1 or self.size > 4 :
             raise Exception('Component size must be between 1 and 4')
+        if self.format not in (VertexComponent.Float, VertexComponent.Half, VertexComponent.Unorm8, VertexComponent.OctSnorm16) :
+            raise Exception('Invalid component format {}'.format(self.format))
+        if self.format == VertexComponent.OctSnorm16 and self.size != 3 :
+            raise Exception('Octahedral component format requires size 3')
+
+    def getDataSize(self) :
+        '''
+        Return the number of bytes of the packed component data
+        '''
+        if self.format == VertexComponent.OctSnorm16 :
+            return 4
+        elif self.format == VertexComponent.Half :
+            return self.size * 2
+        elif self.format == VertexComponent.Unorm8 :
+            return self.size
+        else :
+            return self.size * 4
+
+    def getPackedSize(self) :
+        '''
+        Return the number of bytes of the packed component in
+        a vertex, padded to a multiple of 4 bytes
+        '''
+        return (self.getDataSize() + 3) & ~3
 
 
 #-------------------------------------------------------------------------------
@@ -211,35 +403,1161 @@ class VertexLayout :
         else :
             return None
 
+    def getPackedSize(self) :
+        '''
+        Return the size of a packed vertex in bytes
+        '''
+        return sum(comp.getPackedSize() for comp in self.vertexComponents.values())
+
+    def getPackedOffset(self, nameAndIndex) :
+        '''
+        Return the byte offset of a component in a packed vertex, the
+        components are in the same order as in the float vertex
+        '''
+        comp = self.vertexComponents[nameAndIndex]
+        return sum(other.getPackedSize() for other in self.vertexComponents.values() if other.offset < comp.offset)
+
+    def copy(self) :
+        '''
+        Return a copy of the vertex layout with new component objects
+        (the offsets are preserved), so that components can be added
+        to the copy without affecting the original
+        '''
+        layout = VertexLayout()
+        for comp in sorted(self.vertexComponents.values(), key=lambda comp: comp.offset) :
+            layout.add(VertexComponent(comp.nameAndIndex, comp.size, comp.format))
+        return layout
+
 #-------------------------------------------------------------------------------
-class Mesh :
-    def __init__(self, layout=VertexLayout(), numVertices=0, numTriangles=0) :
+class MappedArray(object) :
+    '''
+    An array.array-like container of numbers which lives in a
+    memory-mapped file instead of the heap, the OS pages the data in
+    and out on demand. Used as out-of-core storage for Mesh objects.
+    If no path is given, an anonymous temporary file is used which
+    is deleted when the MappedArray object goes away.
+    NOTE: resizing remaps the file, this invalidates numpy views.
+    '''
+    ctypesTypes = { 'b': ctypes.c_int8, 'B': ctypes.c_uint8, 'h': ctypes.c_int16, 'H': ctypes.c_uint16,
+                    'i': ctypes.c_int32, 'I': ctypes.c_uint32, 'l': ctypes.c_long, 'L': ctypes.c_ulong,
+                    'f': ctypes.c_float, 'd': ctypes.c_double }
+
+    def __init__(self, typecode, initializer=None, path=None) :
+        if typecode not in MappedArray.ctypesTypes :
+            raise Exception('Unsupported MappedArray type code {}'.format(typecode))
+        self.typecode = typecode
+        self.itemsize = ctypes.sizeof(MappedArray.ctypesTypes[typecode])
+        self.path = path
+        if path == None :
+            self._file = tempfile.TemporaryFile()
+        else :
+            self._file = open(path, 'w+b')
+        self._mmap = None
+        self._data = None
+        self._len = 0
+        self._capacity = 0
+        self._map(16)
+        if initializer != None :
+            self.extend(initializer)
+
+    def _map(self, capacity) :
+        '''
+        (Re-)map the backing file with room for capacity items
+        '''
+        self._data = None
+        if self._mmap != None :
+            self._mmap.close()
+        self._file.truncate(capacity * self.itemsize)
+        self._mmap = mmap.mmap(self._file.fileno(), capacity * self.itemsize)
+        self._data = (MappedArray.ctypesTypes[self.typecode] * capacity).from_buffer(self._mmap)
+        self._capacity = capacity
+
+    def resize(self, num) :
+        '''
+        Set the number of items, new items are zero-initialized
+        '''
+        if num > self._capacity :
+            self._map(max(num, self._capacity * 2))
+        if num > self._len :
+            ctypes.memset(self._address(self._len), 0, (num - self._len) * self.itemsize)
+        self._len = num
+
+    @staticmethod
+    def zeros(typecode, num, path=None) :
+        '''
+        Create a zero-initialized MappedArray with num items (the
+        file is only truncated, so this doesn't touch any memory)
+        '''
+        mapped = MappedArray(typecode, None, path)
+        mapped.resize(num)
+        return mapped
+
+    def _address(self, index) :
+        return ctypes.addressof(self._data) + index * self.itemsize
+
+    def _sliceRange(self, s) :
+        '''
+        Convert a slice into an explicit (first, count, step) tuple
+        with a positive step
+        '''
+        start, stop, step = s.indices(self._len)
+        count = len(xrange(start, stop, step))
+        if step < 0 and count > 0 :
+            start = start + (count - 1) * step
+            step = -step
+        return start, count, step
+
+    def __len__(self) :
+        return self._len
+
+    def __getitem__(self, index) :
+        if isinstance(index, slice) :
+            first, count, step = self._sliceRange(index)
+            items = array(self.typecode, self._data[first:first + count * step:step])
+            if index.step != None and index.step < 0 :
+                items.reverse()
+            return items
+        if index < 0 :
+            index += self._len
+        if index < 0 or index >= self._len :
+            raise IndexError('MappedArray index out of range')
+        return self._data[index]
+
+    def __setitem__(self, index, value) :
+        if isinstance(index, slice) :
+            first, count, step = self._sliceRange(index)
+            if len(value) != count :
+                raise ValueError('MappedArray slice assignment must not change the size')
+            if index.step != None and index.step < 0 :
+                value = value[::-1]
+            self._data[first:first + count * step:step] = value
+            return
+        if index < 0 :
+            index += self._len
+        if index < 0 or index >= self._len :
+            raise IndexError('MappedArray assignment index out of range')
+        self._data[index] = value
+
+    def __delitem__(self, index) :
+        if isinstance(index, slice) :
+            first, count, step = self._sliceRange(index)
+            if step != 1 and count > 1 :
+                raise ValueError('MappedArray only supports deleting contiguous slices')
+        else :
+            if index < 0 :
+                index += self._len
+            if index < 0 or index >= self._len :
+                raise IndexError('MappedArray index out of range')
+            first, count = index, 1
+        tail = self._len - (first + count)
+        if count > 0 and tail > 0 :
+            ctypes.memmove(self._address(first), self._address(first + count), tail * self.itemsize)
+        self._len -= count
+
+    def __iter__(self) :
+        chunkSize = 1<<16
+        for start in xrange(0, self._len, chunkSize) :
+            for item in self._data[start:min(start + chunkSize, self._len)] :
+                yield item
+
+    def __deepcopy__(self, memo) :
+        # a deep copy is mapped to a new anonymous file
+        return MappedArray(self.typecode, self)
+
+    @property
+    def __array_interface__(self) :
+        # allows zero-copy numpy views through numpy.asarray()
+        return { 'shape': (self._len,), 
+                 'typestr': numpy.dtype(self.typecode).str,
+                 'data': (ctypes.addressof(self._data), False),
+                 'version': 3 }
+
+    def append(self, value) :
+        self.resize(self._len + 1)
+        self._data[self._len - 1] = value
+
+    def extend(self, values) :
+        if isinstance(values, MappedArray) or isinstance(values, array) :
+            first = self._len
+            self.resize(first + len(values))
+            chunkSize = 1<<16
+            for start in xrange(0, len(values), chunkSize) :
+                chunk = values[start:start + chunkSize]
+                self._data[first + start:first + start + len(chunk)] = chunk
+        else :
+            for value in values :
+                self.append(value)
+
+    def tostring(self) :
+        return ctypes.string_at(ctypes.addressof(self._data), self._len * self.itemsize)
+
+    def chunks(self, chunkSize=1<<20) :
         '''
-        Holds everything for describing geometry.
+        Iterate over the raw bytes in chunks of up to chunkSize items
         '''
-        self.vertexBuffer = [0.0] * numVertices * layout.size
+        for start in xrange(0, self._len, chunkSize) :
+            yield ctypes.string_at(self._address(start), min(chunkSize, self._len - start) * self.itemsize)
+
+    def tolist(self) :
+        return self._data[0:self._len]
+
+#-------------------------------------------------------------------------------
+def updateHashWithArray(h, buf) :
+    '''
+    Feed the type, length and raw bytes of an array.array or MappedArray
+    into a hashlib object, the bytes are hashed in bulk without conversion
+    '''
+    h.update('{}{}:'.format(buf.typecode, len(buf)))
+    if isinstance(buf, MappedArray) :
+        for chunk in buf.chunks() :
+            h.update(chunk)
+    else :
+        h.update(buffer(buf))
+
+#-------------------------------------------------------------------------------
+def checksumArray(value, buf) :
+    '''
+    Update a running adler32 checksum with the raw bytes of an
+    array.array or MappedArray, this is much cheaper than a hashlib
+    digest and used to detect in-place modifications
+    '''
+    if isinstance(buf, MappedArray) :
+        for chunk in buf.chunks() :
+            value = zlib.adler32(chunk, value)
+        return value
+    return zlib.adler32(buffer(buf), value)
+
+#-------------------------------------------------------------------------------
+def numpyView(buf) :
+    '''
+    Returns a zero-copy numpy array on an array.array or MappedArray.
+    '''
+    if numpy is None :
+        raise Exception('numpy is required for array views!')
+    if isinstance(buf, MappedArray) :
+        return numpy.asarray(buf)
+    return numpy.frombuffer(buf, dtype=numpy.dtype(buf.typecode))
+
+#-------------------------------------------------------------------------------
+def _roundHalfEven(x) :
+    r = math.floor(x)
+    d = x - r
+    if d > 0.5 or (d == 0.5 and r % 2.0 == 1.0) :
+        r += 1.0
+    return int(r)
+
+#-------------------------------------------------------------------------------
+def _floatToHalf(f) :
+    '''
+    Convert a float to the bits of a 16-bit float, rounded to
+    nearest even (same result as numpy's float16 conversion)
+    '''
+    if f != f :
+        return 0x7e00
+    sign = 0
+    if f < 0.0 or (f == 0.0 and math.copysign(1.0, f) < 0.0) :
+        sign = 0x8000
+    a = abs(f)
+    if a >= 65520.0 :
+        return sign | 0x7c00
+    if a < 2.0 ** -14 :
+        # subnormal, a carry becomes the smallest normal
+        return sign | _roundHalfEven(a * 2.0 ** 24)
+    m, e = math.frexp(a)
+    return sign | (((e + 14) << 10) + _roundHalfEven((m * 2.0 - 1.0) * 1024.0))
+
+#-------------------------------------------------------------------------------
+def _halfToFloat(h) :
+    '''
+    Convert the bits of a 16-bit float to a float
+    '''
+    exp = (h >> 10) & 0x1f
+    mant = h & 0x3ff
+    if exp == 0 :
+        f = math.ldexp(mant, -24)
+    elif exp == 31 :
+        if mant != 0 :
+            return float('nan')
+        f = float('inf')
+    else :
+        f = math.ldexp(mant + 1024, exp - 25)
+    if h & 0x8000 :
+        return -f
+    return f
+
+#-------------------------------------------------------------------------------
+def _unorm8(f) :
+    return int(math.floor(min(max(f, 0.0), 1.0) * 255.0 + 0.5))
+
+#-------------------------------------------------------------------------------
+def _snorm16(f) :
+    return int(math.floor(min(max(f, -1.0), 1.0) * 32767.0 + 0.5))
+
+#-------------------------------------------------------------------------------
+def _octEncode(x, y, z) :
+    '''
+    Map a vector to the octahedron, returns 2 floats in -1.0..1.0
+    '''
+    l = abs(x) + abs(y) + abs(z)
+    if l == 0.0 :
+        return 0.0, 0.0
+    u = x / l
+    v = y / l
+    if z < 0.0 :
+        u, v = (1.0 - abs(v)) * (1.0 if u >= 0.0 else -1.0), (1.0 - abs(u)) * (1.0 if v >= 0.0 else -1.0)
+    return u, v
+
+#-------------------------------------------------------------------------------
+def _octDecode(u, v) :
+    '''
+    Map a point on the octahedron back to a normalized vector
+    '''
+    z = 1.0 - abs(u) - abs(v)
+    if z < 0.0 :
+        u, v = (1.0 - abs(v)) * (1.0 if u >= 0.0 else -1.0), (1.0 - abs(u)) * (1.0 if v >= 0.0 else -1.0)
+    l = math.sqrt(u * u + v * v + z * z)
+    return u / l, v / l, z / l
+
+#-------------------------------------------------------------------------------
+def packComponentData(lanes, format) :
+    '''
+    Pack the values of a vertex component, given as one float sequence
+    per component value (e.g. the x, y, z lanes of the vertex buffer),
+    into a VertexComponent format. Returns a bytearray with the packed
+    (little-endian, unpadded) data of each vertex one after another.
+    The whole component is converted at once (with numpy if available).
+    '''
+    size = len(lanes)
+    numValues = len(lanes[0])
+    if numpy is not None :
+        return _packComponentDataNumpy(lanes, format)
+    if format == VertexComponent.OctSnorm16 :
+        values = array('h', [0]) * (numValues * 2)
+        us = []
+        vs = []
+        for x, y, z in zip(lanes[0], lanes[1], lanes[2]) :
+            u, v = _octEncode(x, y, z)
+            us.append(_snorm16(u))
+            vs.append(_snorm16(v))
+        values[0::2] = array('h', us)
+        values[1::2] = array('h', vs)
+    else :
+        if format == VertexComponent.Half :
+            values = array('H', [0]) * (numValues * size)
+            convert = _floatToHalf
+        elif format == VertexComponent.Unorm8 :
+            values = array('B', [0]) * (numValues * size)
+            convert = _unorm8
+        else :
+            values = array('f', [0]) * (numValues * size)
+            convert = float
+        for i in range(0, size) :
+            values[i::size] = array(values.typecode, [convert(f) for f in lanes[i]])
+    if sys.byteorder == 'big' and values.itemsize > 1 :
+        values.byteswap()
+    return bytearray(values.tostring())
+
+#-------------------------------------------------------------------------------
+def _packComponentDataNumpy(lanes, format) :
+    '''
+    The numpy version of packComponentData
+    '''
+    values = numpy.array([numpy.asarray(lane, dtype=numpy.float64) for lane in lanes]).T
+    if format == VertexComponent.OctSnorm16 :
+        x, y, z = values[:, 0], values[:, 1], values[:, 2]
+        l = numpy.abs(x) + numpy.abs(y) + numpy.abs(z)
+        l[l == 0.0] = 1.0
+        u = x / l
+        v = y / l
+        lower = z < 0.0
+        lu = (1.0 - numpy.abs(v)) * numpy.where(u >= 0.0, 1.0, -1.0)
+        lv = (1.0 - numpy.abs(u)) * numpy.where(v >= 0.0, 1.0, -1.0)
+        u = numpy.where(lower, lu, u)
+        v = numpy.where(lower, lv, v)
+        uv = numpy.column_stack((u, v))
+        packed = numpy.floor(numpy.clip(uv, -1.0, 1.0) * 32767.0 + 0.5).astype('<i2')
+    elif format == VertexComponent.Half :
+        packed = values.astype('<f2')
+    elif format == VertexComponent.Unorm8 :
+        packed = numpy.floor(numpy.clip(values, 0.0, 1.0) * 255.0 + 0.5).astype(numpy.uint8)
+    else :
+        packed = values.astype('<f4')
+    return bytearray(packed.tobytes())
+
+#-------------------------------------------------------------------------------
+def unpackComponentData(data, size, format) :
+    '''
+    Unpack the data of a vertex component as returned by
+    packComponentData, returns a list of size float lists
+    (one per component value).
+    '''
+    if numpy is not None :
+        return _unpackComponentDataNumpy(data, size, format)
+    if format == VertexComponent.OctSnorm16 :
+        values = array('h')
+    elif format == VertexComponent.Half :
+        values = array('H')
+    elif format == VertexComponent.Unorm8 :
+        values = array('B')
+    else :
+        values = array('f')
+    values.fromstring(str(data))
+    if sys.byteorder == 'big' and values.itemsize > 1 :
+        values.byteswap()
+    if format == VertexComponent.OctSnorm16 :
+        xs = []
+        ys = []
+        zs = []
+        for u, v in zip(values[0::2], values[1::2]) :
+            x, y, z = _octDecode(max(u / 32767.0, -1.0), max(v / 32767.0, -1.0))
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+        return [xs, ys, zs]
+    elif format == VertexComponent.Half :
+        return [[_halfToFloat(h) for h in values[i::size]] for i in range(0, size)]
+    elif format == VertexComponent.Unorm8 :
+        return [[b / 255.0 for b in values[i::size]] for i in range(0, size)]
+    else :
+        return [values[i::size].tolist() for i in range(0, size)]
+
+#-------------------------------------------------------------------------------
+def _unpackComponentDataNumpy(data, size, format) :
+    '''
+    The numpy version of unpackComponentData
+    '''
+    if format == VertexComponent.OctSnorm16 :
+        uv = numpy.frombuffer(data, dtype='<i2').reshape(-1, 2).astype(numpy.float64)
+        uv = numpy.maximum(uv / 32767.0, -1.0)
+        u, v = uv[:, 0], uv[:, 1]
+        z = 1.0 - numpy.abs(u) - numpy.abs(v)
+        lower = z < 0.0
+        lu = (1.0 - numpy.abs(v)) * numpy.where(u >= 0.0, 1.0, -1.0)
+        lv = (1.0 - numpy.abs(u)) * numpy.where(v >= 0.0, 1.0, -1.0)
+        u = numpy.where(lower, lu, u)
+        v = numpy.where(lower, lv, v)
+        l = numpy.sqrt(u * u + v * v + z * z)
+        values = numpy.column_stack((u / l, v / l, z / l))
+    elif format == VertexComponent.Half :
+        values = numpy.frombuffer(data, dtype='<f2').reshape(-1, size).astype(numpy.float64)
+    elif format == VertexComponent.Unorm8 :
+        values = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, size) / 255.0
+    else :
+        values = numpy.frombuffer(data, dtype='<f4').reshape(-1, size).astype(numpy.float64)
+    return [values[:, i].tolist() for i in range(0, size)]
+
+#-------------------------------------------------------------------------------
+class VertexStream(object) :
+    '''
+    A separately indexed vertex component of a multi-indexed Mesh,
+    values holds size floats per value, indices holds one value index
+    per triangle corner (3 per triangle).
+    '''
+    __slots__ = ('size', 'values', 'indices')
+
+    def __init__(self, size, values, indices) :
+        self.size = size
+        self.values = values
+        self.indices = indices
+
+    def getNumValues(self) :
+        return len(self.values) / self.size
+
+#-------------------------------------------------------------------------------
+def _sharedArrayProperty(name, isGeometry) :
+    '''
+    Defines a Mesh array attribute which may be shared with clones,
+    assigning a new array makes the attribute unique to the mesh
+    (and bumps the mesh version for geometry arrays).
+    '''
+    attr = '_' + name
+    def getter(self) :
+        return getattr(self, attr)
+    def setter(self, value) :
+        setattr(self, attr, value)
+        self._shared.discard(name)
+        if isGeometry :
+            self.version += 1
+    return property(getter, setter)
+
+#-------------------------------------------------------------------------------
+def _computeComponentMinMax(mesh, nameAndIndex) :
+    '''
+    Computes the per-float minimum and maximum of a vertex component,
+    returns a (mins, maxs) tuple of tuples, or None if there are no values
+    '''
+    stream = mesh.getStream(nameAndIndex)
+    if stream != None :
+        buf, offset, stride = stream.values, 0, stream.size
+    else :
+        comp = mesh.vertexLayout.getComponent(nameAndIndex)
+        if comp == None :
+            raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+        buf, offset, stride = mesh.vertexBuffer, comp.offset, mesh.vertexLayout.size
+    if len(buf) == 0 :
+        return None
+    size = mesh.vertexLayout.getComponent(nameAndIndex).size
+    lanes = [buf[offset + i::stride] for i in range(0, size)]
+    return tuple(min(lane) for lane in lanes), tuple(max(lane) for lane in lanes)
+
+#-------------------------------------------------------------------------------
+def _computeBoundingSphere(mesh) :
+    '''
+    Computes a bounding sphere around the center of the bounding box,
+    returns a (center, radius) tuple, or None if the mesh is empty
+    '''
+    minMax = mesh.getComponentMinMax(('position', 0))
+    if minMax == None :
+        return None
+    mins, maxs = minMax
+    cx, cy, cz = [(mins[i] + maxs[i]) * 0.5 for i in range(0, 3)]
+    positions = mesh.getPositionData()[0]
+    xs, ys, zs = positions[0::3], positions[1::3], positions[2::3]
+    sqrRadius = max((x - cx) * (x - cx) + (y - cy) * (y - cy) + (z - cz) * (z - cz) for x, y, z in zip(xs, ys, zs))
+    return (cx, cy, cz), math.sqrt(sqrRadius)
+
+#-------------------------------------------------------------------------------
+def _computeFaceNormals(mesh) :
+    '''
+    Computes the normalized face normals (3 floats per triangle),
+    zero-area triangles get a (0.0, 1.0, 0.0) normal, returns the
+    normals and a tuple of the zero-area triangle indices. The 
+    normals are computed in bulk over the whole index buffer (with
+    numpy if available).
+    '''
+    positions, indices = mesh.getPositionData()
+    normals = mesh.createArray(mesh.getPrecision(), mesh.getNumTriangles() * 3)
+    if len(indices) == 0 :
+        return normals, ()
+    if numpy is not None :
+        return _computeFaceNormalsNumpy(positions, indices, normals)
+
+    # gather the corner positions as separate x, y, z lanes
+    px = positions[0::3]
+    py = positions[1::3]
+    pz = positions[2::3]
+    nx = []
+    ny = []
+    nz = []
+    zeroArea = []
+    sqrt = math.sqrt
+    triIndex = 0
+    for i0, i1, i2 in zip(indices[0::3], indices[1::3], indices[2::3]) :
+        x0 = px[i0]
+        y0 = py[i0]
+        z0 = pz[i0]
+        ax = px[i1] - x0
+        ay = py[i1] - y0
+        az = pz[i1] - z0
+        bx = px[i2] - x0
+        by = py[i2] - y0
+        bz = pz[i2] - z0
+        cx = ay * bz - az * by
+        cy = az * bx - ax * bz
+        cz = ax * by - ay * bx
+        if cx != 0.0 or cy != 0.0 or cz != 0.0 :
+            l = sqrt(cx * cx + cy * cy + cz * cz)
+            nx.append(cx / l)
+            ny.append(cy / l)
+            nz.append(cz / l)
+        else :
+            nx.append(0.0)
+            ny.append(1.0)
+            nz.append(0.0)
+            zeroArea.append(triIndex)
+        triIndex += 1
+
+    # write back in one pass per lane
+    precision = mesh.getPrecision()
+    normals[0::3] = array(precision, nx)
+    normals[1::3] = array(precision, ny)
+    normals[2::3] = array(precision, nz)
+    return normals, tuple(zeroArea)
+
+#-------------------------------------------------------------------------------
+def _computeFaceNormalsNumpy(positions, indices, normals) :
+    '''
+    The numpy version of _computeFaceNormals, writes the normals
+    into the provided array
+    '''
+    pos = numpyView(positions).astype(numpy.float64).reshape(-1, 3)
+    corners = numpyView(indices).reshape(-1, 3)
+    p0 = pos[corners[:, 0]]
+    a = pos[corners[:, 1]] - p0
+    b = pos[corners[:, 2]] - p0
+    cx = a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1]
+    cy = a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2]
+    cz = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    zero = (cx == 0.0) & (cy == 0.0) & (cz == 0.0)
+    l = numpy.sqrt(cx * cx + cy * cy + cz * cz)
+    l[zero] = 1.0
+    cy[zero] = 1.0
+    out = numpyView(normals).reshape(-1, 3)
+    out[:, 0] = cx / l
+    out[:, 1] = cy / l
+    out[:, 2] = cz / l
+    return normals, tuple(int(triIndex) for triIndex in numpy.flatnonzero(zero))
+
+#-------------------------------------------------------------------------------
+def _computeACMR(mesh, cacheSize) :
+    '''
+    Simulates a FIFO vertex cache over the triangle indices and
+    returns the number of cache misses per triangle
+    '''
+    numTriangles = mesh.getNumTriangles()
+    if numTriangles == 0 :
+        return 0.0
+    fifo = [-1] * cacheSize
+    inCache = set()
+    head = 0
+    misses = 0
+    for vertexIndex in mesh.indices :
+        if vertexIndex not in inCache :
+            misses += 1
+            inCache.discard(fifo[head])
+            fifo[head] = vertexIndex
+            inCache.add(vertexIndex)
+            head = (head + 1) % cacheSize
+    return float(misses) / numTriangles
+
+#-------------------------------------------------------------------------------
+def _computeDegenerateTriangles(mesh) :
+    '''
+    Returns a tuple with the indices of all degenerate triangles
+    '''
+    mesh.checkSingleIndexed()
+    return tuple(triIndex for triIndex in xrange(0, mesh.getNumTriangles()) if mesh.isTriangleDegenerate(triIndex))
+
+#-------------------------------------------------------------------------------
+class Mesh(object) :
+
+    # vertex buffer precisions (these are array module type codes)
+    Float32 = 'f'
+    Float64 = 'd'
+
+    # type code of the triangle vertex- and group-index arrays
+    IndexType = 'I'
+
+    # the array attributes, these are shared copy-on-write between clones
+    ArrayNames = ('vertexBuffer', 'indices', 'groupIndices', 'triangleNormals')
+    # modifying these bumps the mesh version (invalidates cached derived data)
+    GeometryArrayNames = ('vertexBuffer', 'indices')
+
+    vertexBuffer = _sharedArrayProperty('vertexBuffer', True)
+    indices = _sharedArrayProperty('indices', True)
+    groupIndices = _sharedArrayProperty('groupIndices', False)
+    triangleNormals = _sharedArrayProperty('triangleNormals', False)
+
+    def __init__(self, layout=VertexLayout(), numVertices=0, numTriangles=0, precision=Float64, mapped=False) :
+        '''
+        Holds everything for describing geometry. The vertex buffer
+        is a contiguous array of 32- or 64-bit floats (selected with
+        the precision arg, Mesh.Float32 or Mesh.Float64).
+
+        Triangles are stored as flat arrays: 3 vertex indices per
+        triangle in indices, one group index per triangle in groupIndices,
+        and optionally 3 floats per triangle in triangleNormals (this is
+        None until triangle normals are computed or set).
+
+        If mapped is True, the arrays live in memory-mapped temporary
+        files (see MappedArray) for meshes which don't fit into memory.
+
+        Use clone() for cheap copies, the arrays are shared until
+        one of the meshes modifies them.
+
+        Optionally a mesh can be multi-indexed, with one separately
+        indexed VertexStream per vertex component instead of interleaved
+        vertices (see setStream()).
+
+        The version counter is incremented whenever the vertex layout,
+        vertex buffer, vertex indices or streams are modified through the
+        Mesh methods or replaced, it is used to invalidate cached derived
+        data (bounding box, face normals, ...). Call touch() after
+        modifying arrays or the vertex layout directly. Writes through
+        the numpy views (see vertexView()) are detected with a checksum.
+        '''
+        if precision != Mesh.Float32 and precision != Mesh.Float64 :
+            raise Exception('Invalid vertex buffer precision!')
+        self.version = 0
+        self._cache = dict()
+        self._shared = set()
+        self._viewed = False
+        self.mapped = mapped
+        self.vertexBuffer = self.createArray(precision, numVertices * layout.size)
         self.vertexLayout = layout
-        self.triangles    = [Triangle() for _ in xrange(0, numTriangles)]
+        self.indices = self.createArray(Mesh.IndexType, numTriangles * 3)
+        self.groupIndices = self.createArray(Mesh.IndexType, numTriangles)
+        self.triangleNormals = None
+        self.streams = dict()
+
+    def createArray(self, typecode, num=0) :
+        '''
+        Create a zero-initialized array with num items which matches the
+        storage of the mesh (an array.array or a MappedArray)
+        '''
+        if self.mapped :
+            return MappedArray.zeros(typecode, num)
+        else :
+            return array(typecode, [0]) * num
+
+    def copyArray(self, srcArray) :
+        '''
+        Return a copy of an array which matches the storage of the mesh
+        '''
+        dstArray = self.createArray(srcArray.typecode)
+        dstArray.extend(srcArray)
+        return dstArray
+
+    def adoptArray(self, srcArray, typecode) :
+        '''
+        Return srcArray if it already matches the storage of the mesh
+        and the typecode, otherwise a converted copy
+        '''
+        if self.mapped :
+            matches = isinstance(srcArray, MappedArray)
+        else :
+            matches = isinstance(srcArray, array)
+        if matches and srcArray.typecode == typecode :
+            return srcArray
+        if not isinstance(srcArray, array) or srcArray.typecode != typecode :
+            srcArray = array(typecode, srcArray)
+        return self.copyArray(srcArray)
+
+    def clone(self) :
+        '''
+        Return a cheap copy-on-write clone of the mesh. Both meshes
+        share the arrays until one of them modifies an array through
+        the Mesh methods, only then this array is copied. The vertex
+        layout object is shared as well and must not be modified in place.
+        The geometry arrays of a mesh with numpy views are copied, writes
+        through the views must not change the clone.
+        '''
+        dst = Mesh.__new__(type(self))
+        dst.version = 0
+        dst._shared = set()
+        dst.mapped = self.mapped
+        dst.vertexLayout = self.vertexLayout
+        dst.streams = dict()
+        for nameAndIndex, stream in self.streams.items() :
+            dst.streams[nameAndIndex] = VertexStream(stream.size, stream.values, stream.indices)
+            self._shared.add(nameAndIndex)
+            dst._shared.add(nameAndIndex)
+        for name in Mesh.ArrayNames :
+            buf = getattr(self, name)
+            if self._viewed and name in Mesh.GeometryArrayNames :
+                setattr(dst, name, self.copyArray(buf))
+            else :
+                setattr(dst, name, buf)
+                if buf is not None :
+                    self._shared.add(name)
+                    dst._shared.add(name)
+        # the cached derived data is valid for the clone as well
+        dst.version = self.version
+        dst._cache = dict()
+        checksum = None
+        if self._viewed :
+            checksum = self.getGeometryChecksum()
+        for key, entry in self._cache.items() :
+            if entry[0] == self.version and (checksum == None or entry[1] == checksum) :
+                dst._cache[key] = entry
+        dst._viewed = False
+        return dst
+
+    def isShared(self, name) :
+        '''
+        Return True if an array attribute (e.g. 'vertexBuffer') or the
+        arrays of a VertexStream (by nameAndIndex) may be shared with a clone
+        '''
+        return name in self._shared
+
+    def makeUnique(self, name) :
+        '''
+        Copy an array attribute (e.g. 'vertexBuffer') if it is shared
+        with a clone and return it, must be called before modifying
+        a mesh array in place (this also bumps the mesh version).
+        For the nameAndIndex of a VertexStream both stream arrays
+        are copied if shared, and the VertexStream is returned.
+        '''
+        if isinstance(name, tuple) :
+            stream = self.streams[name]
+            if name in self._shared :
+                stream.values = self.copyArray(stream.values)
+                stream.indices = self.copyArray(stream.indices)
+                self._shared.discard(name)
+            self.version += 1
+            return stream
+        if name in self._shared :
+            setattr(self, name, self.copyArray(getattr(self, name)))
+        if name in Mesh.GeometryArrayNames :
+            self.version += 1
+        return getattr(self, name)
+
+    def shareArray(self, name, srcArray) :
+        '''
+        Assign an array which is owned by someone else to an array
+        attribute, it will be copied before it is modified in place
+        '''
+        setattr(self, name, srcArray)
+        self._shared.add(name)
+
+    def _getVertexLayout(self) :
+        return self._vertexLayout
+    def _setVertexLayout(self, layout) :
+        self._vertexLayout = layout
+        self.version += 1
+
+    vertexLayout = property(_getVertexLayout, _setVertexLayout)
+
+    def touch(self) :
+        '''
+        Increment the version counter, this must be called after modifying
+        the geometry without going through the Mesh methods (e.g. by
+        writing to mesh.vertexBuffer directly or by modifying the vertex
+        layout in place)
+        '''
+        self.version += 1
+
+    def getGeometryChecksum(self) :
+        '''
+        Return a cheap checksum (adler32) of the vertex buffer and the
+        indices, this changes when the arrays are modified in place
+        '''
+        value = checksumArray(1, self.vertexBuffer)
+        return checksumArray(value, self.indices)
+
+    def getCached(self, key, compute) :
+        '''
+        Return derived data of the mesh geometry from the cache, compute(mesh)
+        is called to create the data if it isn't cached yet or the mesh 
+        has been modified since (version). Only meshes which have handed
+        out numpy views also validate the data with getGeometryChecksum().
+        Cached data must not be modified.
+        '''
+        version = self.version
+        checksum = None
+        if self._viewed :
+            checksum = self.getGeometryChecksum()
+        entry = self._cache.get(key)
+        if entry != None and entry[0] == version and (checksum == None or entry[1] == checksum) :
+            return entry[2]
+        value = compute(self)
+        self._cache[key] = (version, checksum, value)
+        return value
+
+    def getComponentMinMax(self, nameAndIndex) :
+        '''
+        Return the per-float minimum and maximum of a vertex component as
+        (mins, maxs) tuple of tuples, or None if the mesh has no vertices
+        (cached)
+        '''
+        return self.getCached(('minMax', nameAndIndex), lambda mesh: _computeComponentMinMax(mesh, nameAndIndex))
+
+    def getBoundingBox(self) :
+        '''
+        Return the axis-aligned bounding box of the positions as (min, max)
+        Vector objects, or None if the mesh has no vertices (cached)
+        '''
+        minMax = self.getComponentMinMax(('position', 0))
+        if minMax == None :
+            return None
+        return Vector(*minMax[0]), Vector(*minMax[1])
+
+    def getBoundingSphere(self) :
+        '''
+        Return a bounding sphere of the positions as (center, radius) with
+        center as Vector object, or None if the mesh has no vertices (cached)
+        '''
+        sphere = self.getCached('boundingSphere', _computeBoundingSphere)
+        if sphere == None :
+            return None
+        return Vector(*sphere[0]), sphere[1]
+
+    def getFaceNormals(self) :
+        '''
+        Return an array with the normalized face normals (3 floats per
+        triangle), triangles without area get (0.0, 1.0, 0.0) (cached, 
+        must not be modified)
+        '''
+        return self.getCached('faceNormals', _computeFaceNormals)[0]
+
+    def getZeroAreaTriangles(self) :
+        '''
+        Return a tuple with the indices of the triangles which got
+        no valid face normal in getFaceNormals() (cached)
+        '''
+        return self.getCached('faceNormals', _computeFaceNormals)[1]
+
+    def getDegenerateTriangles(self) :
+        '''
+        Return a tuple with the indices of all degenerate triangles (cached)
+        '''
+        return self.getCached('degenerateTriangles', _computeDegenerateTriangles)
+
+    def getACMR(self, cacheSize=32) :
+        '''
+        Return the average cache miss ratio (vertex cache misses per 
+        triangle) of a simulated FIFO post-transform vertex cache with
+        cacheSize entries (cached)
+        '''
+        return self.getCached(('acmr', cacheSize), lambda mesh: _computeACMR(mesh, cacheSize))
+
+    def getPositionData(self) :
+        '''
+        Return the position data as flat array with 3 floats per position
+        and the array of position indices (3 per triangle), works for
+        single- and multi-indexed meshes. The arrays must not be modified.
+        '''
+        stream = self.getStream(('position', 0))
+        if stream != None :
+            return stream.values, stream.indices
+        comp = self.vertexLayout.getComponent(('position', 0))
+        if comp == None :
+            raise Exception('Mesh has no position component!')
+        if comp.offset == 0 and self.vertexLayout.size == 3 :
+            return self.vertexBuffer, self.indices
+        positions = array(self.getPrecision(), [0.0]) * (self.getNumVertices() * 3)
+        stride = self.vertexLayout.size
+        for i in range(0, 3) :
+            positions[i::3] = self.vertexBuffer[comp.offset + i::stride]
+        return positions, self.indices
+
+    def gatherVertices(self, vertexIndices=None, layout=None) :
+        '''
+        Return a new vertex buffer with a copy of the vertex at each of
+        the given vertex indices (vertices may be repeated or dropped), 
+        all vertices if vertexIndices is None. If a different vertex 
+        layout is given, the components which exist in both layouts 
+        are copied and new components are zero.
+        '''
+        if layout == None :
+            layout = self.vertexLayout
+        if vertexIndices == None :
+            numVertices = self.getNumVertices()
+        else :
+            numVertices = len(vertexIndices)
+        srcSize = self.vertexLayout.size
+        dstSize = layout.size
+        precision = self.getPrecision()
+        vertexBuffer = self.createArray(precision, numVertices * dstSize)
+        for comp in self.vertexLayout.vertexComponents.values() :
+            dstComp = layout.getComponent(comp.nameAndIndex)
+            if dstComp == None :
+                continue
+            for i in range(0, min(comp.size, dstComp.size)) :
+                lane = self.vertexBuffer[comp.offset + i::srcSize]
+                if vertexIndices != None :
+                    lane = array(precision, [lane[vertexIndex] for vertexIndex in vertexIndices])
+                vertexBuffer[dstComp.offset + i::dstSize] = lane
+        return vertexBuffer
+
+    def updateHash(self, h) :
+        '''
+        Feed the vertex layout, vertex data and triangles into a 
+        hashlib object
+        '''
+        for comp in sorted(self.vertexLayout.vertexComponents.values(), key=lambda comp: comp.offset) :
+            h.update('{}{}:{}:{};'.format(comp.nameAndIndex[0], comp.nameAndIndex[1], comp.offset, comp.size))
+            if comp.format != VertexComponent.Float :
+                h.update('format{};'.format(comp.format))
+        for name in Mesh.ArrayNames :
+            buf = getattr(self, name)
+            if buf is not None :
+                updateHashWithArray(h, buf)
+            else :
+                h.update('None;')
+        for nameAndIndex in sorted(self.streams.keys()) :
+            stream = self.streams[nameAndIndex]
+            h.update('{}{};'.format(nameAndIndex[0], nameAndIndex[1]))
+            updateHashWithArray(h, stream.values)
+            updateHashWithArray(h, stream.indices)
+
+    def fingerprint(self) :
+        '''
+        Return a digest (hex string) of the mesh content which can be
+        used as key for caching conversion results. Meshes with identical
+        content have the same fingerprint, regardless of storage (mapped
+        or not) and cloning.
+        '''
+        h = hashlib.sha1()
+        self.updateHash(h)
+        return h.hexdigest()
+
+    def isMapped(self) :
+        '''
+        Return True if the mesh arrays live in memory-mapped files
+        '''
+        return self.mapped
+
+    def mapToFile(self, path=None) :
+        '''
+        Move the vertex buffer and triangle arrays into memory-mapped 
+        files. If path is given, the files are named path.vertices, 
+        path.indices, path.groups (and path.normals), otherwise
+        anonymous temporary files are used.
+        '''
+        def mapArray(buf, ext) :
+            return MappedArray(buf.typecode, buf, None if path == None else path + ext)
+        self.vertexBuffer = mapArray(self.vertexBuffer, '.vertices')
+        self.indices = mapArray(self.indices, '.indices')
+        self.groupIndices = mapArray(self.groupIndices, '.groups')
+        if self.triangleNormals is not None :
+            self.triangleNormals = mapArray(self.triangleNormals, '.normals')
+        for nameAndIndex, stream in self.streams.items() :
+            ext = '.{}{}'.format(nameAndIndex[0], nameAndIndex[1])
+            self.streams[nameAndIndex] = VertexStream(stream.size, mapArray(stream.values, ext), mapArray(stream.indices, ext + '.indices'))
+            self._shared.discard(nameAndIndex)
+        self.mapped = True
+
+    @property
+    def triangles(self) :
+        '''
+        Sequence of Triangle-compatible views into the triangle arrays
+        (convenient but slow).
+        '''
+        return TriangleList(self)
+
+    def getPrecision(self) :
+        '''
+        Get the vertex buffer precision (Mesh.Float32 or Mesh.Float64)
+        '''
+        return self.vertexBuffer.typecode
 
     def reserveVertices(self, num) :
         '''
         Make room for n vertices
         '''
-        for i in xrange(0, num * self.vertexLayout.size) :
-            self.vertexBuffer.append(0.0)
+        self.makeUnique('vertexBuffer').extend(array(self.getPrecision(), [0.0]) * (num * self.vertexLayout.size))
 
     def reserveTriangles(self, num) :
         '''
         Make room for n triangles
         '''
-        for i in xrange(0, num) :
-            self.triangles.append(Triangle())
+        self.checkSingleIndexed()
+        self.makeUnique('indices').extend(array(Mesh.IndexType, [0]) * (num * 3))
+        self.makeUnique('groupIndices').extend(array(Mesh.IndexType, [0]) * num)
+        if self.triangleNormals is not None :
+            self.makeUnique('triangleNormals').extend(array(self.getPrecision(), [0.0]) * (num * 3))
 
-    def setTriangle(self, triangleIndex, triangle) :
+    def allocTriangleNormals(self) :
         '''
-        Add a triangle to the mesh
+        Make sure that the triangle normal array exists
         '''
-        self.triangles[triangleIndex] = triangle
+        if self.triangleNormals is None :
+            self.triangleNormals = self.createArray(self.getPrecision(), self.getNumTriangles() * 3)
+
+    def setTriangle(self, triangleIndex, triangle) :
+        '''
+        Set a triangle in the mesh from a Triangle object
+        '''
+        i = triangleIndex * 3
+        indices = self.makeUnique('indices')
+        indices[i] = triangle.vertexIndex0
+        indices[i + 1] = triangle.vertexIndex1
+        indices[i + 2] = triangle.vertexIndex2
+        self.makeUnique('groupIndices')[triangleIndex] = triangle.groupIndex
+        if self.triangleNormals is not None or triangle.normalX != 0.0 or triangle.normalY != 0.0 or triangle.normalZ != 0.0 :
+            self.setTriangleNormal(triangleIndex, triangle.normalX, triangle.normalY, triangle.normalZ)
+
+    def getTriangle(self, triangleIndex) :
+        '''
+        Return a copy of a triangle as Triangle object
+        '''
+        i = triangleIndex * 3
+        tri = Triangle(self.indices[i], self.indices[i + 1], self.indices[i + 2], self.groupIndices[triangleIndex])
+        if self.triangleNormals is not None :
+            tri.normalX, tri.normalY, tri.normalZ = self.triangleNormals[i:i + 3]
+        return tri
+
+    def removeTriangle(self, triangleIndex) :
+        '''
+        Remove a single triangle (slow, use removeTriangles for bulk removal)
+        '''
+        self.checkSingleIndexed()
+        i = triangleIndex * 3
+        del self.makeUnique('indices')[i:i + 3]
+        del self.makeUnique('groupIndices')[triangleIndex]
+        if self.triangleNormals is not None :
+            del self.makeUnique('triangleNormals')[i:i + 3]
+
+    def removeTriangles(self, triangleIndices) :
+        '''
+        Remove a collection of triangles in a single pass.
+        '''
+        self.checkSingleIndexed()
+        removeSet = set(triangleIndices)
+        if not removeSet :
+            return
+        keep = [triIndex for triIndex in xrange(0, self.getNumTriangles()) if triIndex not in removeSet]
+        def compact(srcArray, itemsPerTriangle) :
+            return self.copyArray(array(srcArray.typecode, [srcArray[t * itemsPerTriangle + i] for t in keep for i in xrange(0, itemsPerTriangle)]))
+        self.indices = compact(self.indices, 3)
+        self.groupIndices = compact(self.groupIndices, 1)
+        if self.triangleNormals is not None :
+            self.triangleNormals = compact(self.triangleNormals, 3)
+
+    def reorderTriangles(self, order) :
+        '''
+        Reorder the triangles in a single pass, the new triangle at index
+        i is the triangle at index order[i] before the call, order must be
+        a permutation of all triangle indices.
+        '''
+        self.checkSingleIndexed()
+        if len(order) != self.getNumTriangles() :
+            raise Exception('Triangle order must contain all triangles!')
+        def permute(srcArray, itemsPerTriangle) :
+            dstArray = array(srcArray.typecode, [0]) * len(srcArray)
+            for i in xrange(0, itemsPerTriangle) :
+                lane = srcArray[i::itemsPerTriangle]
+                dstArray[i::itemsPerTriangle] = array(srcArray.typecode, [lane[t] for t in order])
+            return self.copyArray(dstArray)
+        self.indices = permute(self.indices, 3)
+        self.groupIndices = permute(self.groupIndices, 1)
+        if self.triangleNormals is not None :
+            self.triangleNormals = permute(self.triangleNormals, 3)
+
+    def groupRanges(self) :
+        '''
+        Return a list of (groupIndex, firstTriangle, numTriangles) tuples,
+        one for each run of consecutive triangles with the same group 
+        index. Use operators.sortTriangleGroups to get one range per group.
+        '''
+        ranges = []
+        groupIndices = self.groupIndices
+        first = 0
+        numTriangles = self.getNumTriangles()
+        for triIndex in xrange(1, numTriangles + 1) :
+            if triIndex == numTriangles or groupIndices[triIndex] != groupIndices[first] :
+                ranges.append((groupIndices[first], first, triIndex - first))
+                first = triIndex
+        return ranges
+
+    def setTriangleNormal(self, triangleIndex, x, y, z) :
+        '''
+        Set the face normal of a triangle
+        '''
+        self.allocTriangleNormals()
+        triangleNormals = self.makeUnique('triangleNormals')
+        i = triangleIndex * 3
+        triangleNormals[i] = x
+        triangleNormals[i + 1] = y
+        triangleNormals[i + 2] = z
+
+    def getTriangleNormal(self, triangleIndex) :
+        '''
+        Get the face normal of a triangle as tuple, (0.0, 0.0, 0.0)
+        if no triangle normals exist
+        '''
+        if self.triangleNormals is None :
+            return 0.0, 0.0, 0.0
+        i = triangleIndex * 3
+        return self.triangleNormals[i], self.triangleNormals[i + 1], self.triangleNormals[i + 2]
+
+    def isTriangleDegenerate(self, triangleIndex) :
+        '''
+        Checks whether a triangle is degenerate.
+        '''
+        i = triangleIndex * 3
+        return isDegenerateTriangle(self.vertexLayout, self.vertexBuffer, self.indices[i], self.indices[i + 1], self.indices[i + 2])
 
     def getNumVertices(self) :
         '''
@@ -251,7 +1569,7 @@ class Mesh :
         '''
         Get number of triangles
         '''
-        return len(self.triangles)
+        return len(self.groupIndices)
         
     def getComponent(self, nameAndIndex) :
         '''
@@ -279,13 +1597,14 @@ class Mesh :
         if self.vertexLayout.contains(nameAndIndex) :
             comp = self.vertexLayout.getComponent(nameAndIndex)
             vbOffset = comp.offset + vertexIndex * self.vertexLayout.size
-            self.vertexBuffer[vbOffset] = vec.x
+            vertexBuffer = self.makeUnique('vertexBuffer')
+            vertexBuffer[vbOffset] = vec.x
             if comp.size > 1 :
-                self.vertexBuffer[vbOffset + 1] = vec.y
+                vertexBuffer[vbOffset + 1] = vec.y
             if comp.size > 2 :
-                self.vertexBuffer[vbOffset + 2] = vec.z
+                vertexBuffer[vbOffset + 2] = vec.z
             if comp.size > 3 :
-                self.vertexBuffer[vbOffset + 3] = vec.w
+                vertexBuffer[vbOffset + 3] = vec.w
 
     def getVertex(self, vertexIndex, nameAndIndex) :
         '''
@@ -310,7 +1629,8 @@ class Mesh :
         Directly set 1D vertex data with component-offset.
         '''
         bufIndex = vertexIndex * self.vertexLayout.size + compOffset
-        self.vertexBuffer[bufIndex] = x
+        vertexBuffer = self.makeUnique('vertexBuffer')
+        vertexBuffer[bufIndex] = x
 
     def setData2(self, vertexIndex, compOffset, x, y) :
         '''
@@ -318,8 +1638,9 @@ class Mesh :
         This is faster but less convenient then setVertex()
         '''
         bufIndex = vertexIndex * self.vertexLayout.size + compOffset
-        self.vertexBuffer[bufIndex] = x
-        self.vertexBuffer[bufIndex + 1] = y
+        vertexBuffer = self.makeUnique('vertexBuffer')
+        vertexBuffer[bufIndex] = x
+        vertexBuffer[bufIndex + 1] = y
 
     def setData3(self, vertexIndex, compOffset, x, y, z) :
         '''
@@ -327,9 +1648,10 @@ class Mesh :
         This is faster but less convenient then setVertex()
         '''
         bufIndex = vertexIndex * self.vertexLayout.size + compOffset
-        self.vertexBuffer[bufIndex] = x
-        self.vertexBuffer[bufIndex + 1] = y
-        self.vertexBuffer[bufIndex + 2] = z
+        vertexBuffer = self.makeUnique('vertexBuffer')
+        vertexBuffer[bufIndex] = x
+        vertexBuffer[bufIndex + 1] = y
+        vertexBuffer[bufIndex + 2] = z
 
     def setData4(self, vertexIndex, compOffset, x, y, z, w) :
         '''
@@ -337,10 +1659,11 @@ class Mesh :
         This is faster but less convenient then setVertex()
         '''
         bufIndex = vertexIndex * self.vertexLayout.size + compOffset
-        self.vertexBuffer[bufIndex] = x
-        self.vertexBuffer[bufIndex + 1] = y
-        self.vertexBuffer[bufIndex + 2] = z
-        self.vertexBuffer[bufIndex + 4] = w
+        vertexBuffer = self.makeUnique('vertexBuffer')
+        vertexBuffer[bufIndex] = x
+        vertexBuffer[bufIndex + 1] = y
+        vertexBuffer[bufIndex + 2] = z
+        vertexBuffer[bufIndex + 3] = w
 
     def getData1(self, vertexIndex, compOffset) :
         '''
@@ -374,6 +1697,215 @@ class Mesh :
         bufIndex = vertexIndex * self.vertexLayout.size + compOffset
         return self.vertexBuffer[bufIndex], self.vertexBuffer[bufIndex+1], self.vertexBuffer[bufIndex+2], self.vertexBuffer[bufIndex+3]
 
+    def setComponent(self, nameAndIndex, values, start=0) :
+        '''
+        Bulk-set a vertex component from a flat sequence of floats
+        (component-size floats per vertex), beginning at vertex index
+        start. This does one strided copy per float of the component
+        instead of one method call per vertex.
+        '''
+        comp = self.vertexLayout.getComponent(nameAndIndex)
+        if comp == None :
+            raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+        if len(values) % comp.size != 0 :
+            raise Exception('Number of values must be a multiple of the component size!')
+        num = len(values) / comp.size
+        if start < 0 or start + num > self.getNumVertices() :
+            raise IndexError('Vertex range out of bounds')
+        if num == 0 :
+            return
+        typeCode = self.getPrecision()
+        if not isinstance(values, array) or values.typecode != typeCode :
+            values = array(typeCode, values)
+        stride = self.vertexLayout.size
+        base = start * stride + comp.offset
+        end = (start + num) * stride
+        vertexBuffer = self.makeUnique('vertexBuffer')
+        for i in range(0, comp.size) :
+            vertexBuffer[base + i:end:stride] = values[i::comp.size]
+
+    def getComponentData(self, nameAndIndex, start=0, num=None) :
+        '''
+        Bulk-get a vertex component as a flat array of floats (component-size
+        floats per vertex) for num vertices beginning at vertex index start
+        (num=None means all vertices up to the end).
+        '''
+        comp = self.vertexLayout.getComponent(nameAndIndex)
+        if comp == None :
+            raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+        if num == None :
+            num = self.getNumVertices() - start
+        if start < 0 or num < 0 or start + num > self.getNumVertices() :
+            raise IndexError('Vertex range out of bounds')
+        values = array(self.getPrecision(), [0.0]) * (num * comp.size)
+        if num == 0 :
+            return values
+        stride = self.vertexLayout.size
+        base = start * stride + comp.offset
+        end = (start + num) * stride
+        for i in range(0, comp.size) :
+            values[i::comp.size] = self.vertexBuffer[base + i:end:stride]
+        return values
+
+    def setTriangles(self, indices, groupIndex, start=0) :
+        '''
+        Bulk-set triangles from a flat sequence of vertex indices (3 per
+        triangle) beginning at triangle index start, all triangles get 
+        the same group index.
+        '''
+        if len(indices) % 3 != 0 :
+            raise Exception('Number of indices must be a multiple of 3!')
+        num = len(indices) / 3
+        if start < 0 or start + num > self.getNumTriangles() :
+            raise IndexError('Triangle range out of bounds')
+        if not isinstance(indices, array) or indices.typecode != Mesh.IndexType :
+            indices = array(Mesh.IndexType, indices)
+        self.makeUnique('indices')[start * 3:(start + num) * 3] = indices
+        self.makeUnique('groupIndices')[start:start + num] = array(Mesh.IndexType, [groupIndex]) * num
+
+    def setStream(self, nameAndIndex, values, indices) :
+        '''
+        Set the separately indexed stream of a vertex component, this
+        makes the mesh multi-indexed. values is a flat sequence of floats
+        (component-size floats per value), indices has one value index per 
+        triangle corner, so the triangle count must be set up before.
+        Matching arrays are taken over without copying. The vertex buffer
+        and index array of a multi-indexed mesh are unused, use the
+        flattenIndices operator to get interleaved vertices.
+        '''
+        comp = self.vertexLayout.getComponent(nameAndIndex)
+        if comp == None :
+            raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+        if len(values) % comp.size != 0 :
+            raise Exception('Number of values must be a multiple of the component size!')
+        if len(indices) != self.getNumTriangles() * 3 :
+            raise Exception('Number of stream indices must be 3 per triangle!')
+        values = self.adoptArray(values, self.getPrecision())
+        indices = self.adoptArray(indices, Mesh.IndexType)
+        if len(indices) > 0 and max(indices) >= len(values) / comp.size :
+            raise IndexError('Stream index out of range')
+        self.streams[nameAndIndex] = VertexStream(comp.size, values, indices)
+        self._shared.discard(nameAndIndex)
+        self.version += 1
+
+    def getStream(self, nameAndIndex) :
+        '''
+        Get the VertexStream of a vertex component, or None. Use
+        makeUnique(nameAndIndex) instead to modify the stream in place.
+        '''
+        return self.streams.get(nameAndIndex)
+
+    def isMultiIndexed(self) :
+        '''
+        Return True if the mesh has separately indexed vertex streams
+        '''
+        return len(self.streams) > 0
+
+    def checkSingleIndexed(self) :
+        '''
+        Raise an exception if the mesh is multi-indexed, must be called
+        by code which works on the interleaved vertex buffer.
+        '''
+        if self.isMultiIndexed() :
+            raise Exception('Mesh is multi-indexed, use operators.flattenIndices first!')
+
+    def _viewArray(self, name) :
+        '''
+        Return an array attribute for a writable numpy view, it is only
+        copied if shared with a clone. The version isn't bumped, writes
+        through the views are detected with a checksum in getCached().
+        '''
+        buf = getattr(self, '_' + name)
+        if name in self._shared :
+            buf = self.copyArray(buf)
+            setattr(self, '_' + name, buf)
+            self._shared.discard(name)
+        if not self._viewed :
+            # the cached data stays valid until written through a view
+            checksum = self.getGeometryChecksum()
+            for key, (version, oldChecksum, value) in self._cache.items() :
+                if version == self.version :
+                    self._cache[key] = (version, checksum, value)
+            self._viewed = True
+        return buf
+
+    def vertexView(self) :
+        '''
+        Return a zero-copy numpy view (numVertices x layoutSize) into
+        the vertex buffer. Requires numpy. The view shares memory with
+        the vertex buffer through the buffer protocol, it becomes
+        invalid when the vertex buffer is resized or replaced.
+        '''
+        return numpyView(self._viewArray('vertexBuffer')).reshape(self.getNumVertices(), self.vertexLayout.size)
+
+    def componentView(self, nameAndIndex) :
+        '''
+        Return a zero-copy, strided numpy view (numVertices x componentSize)
+        of one vertex component, e.g. componentView(('normal', 0)).
+        Writing to the view writes directly into the vertex buffer.
+        '''
+        comp = self.vertexLayout.getComponent(nameAndIndex)
+        if comp == None :
+            raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+        return self.vertexView()[:, comp.offset:comp.offset + comp.size]
+
+    def indexView(self) :
+        '''
+        Return a zero-copy numpy view (numTriangles x 3) into the
+        triangle index array. Requires numpy.
+        '''
+        return numpyView(self._viewArray('indices')).reshape(self.getNumTriangles(), 3)
+
+    def packVertices(self) :
+        '''
+        Return the vertices packed with the component formats of the
+        vertex layout as bytearray (vertexLayout.getPackedSize() bytes
+        per vertex, little-endian). Each component is converted at once
+        with packComponentData.
+        '''
+        self.checkSingleIndexed()
+        layout = self.vertexLayout
+        stride = layout.getPackedSize()
+        numVertices = self.getNumVertices()
+        data = bytearray(numVertices * stride)
+        if numVertices == 0 :
+            return data
+        for comp in layout.vertexComponents.values() :
+            lanes = [self.vertexBuffer[comp.offset + i::layout.size] for i in range(0, comp.size)]
+            compData = packComponentData(lanes, comp.format)
+            offset = layout.getPackedOffset(comp.nameAndIndex)
+            dataSize = comp.getDataSize()
+            for i in range(0, dataSize) :
+                data[offset + i::stride] = compData[i::dataSize]
+        return data
+
+    def unpackVertices(self, data) :
+        '''
+        Replace the vertex buffer with the vertices unpacked from data
+        as returned by packVertices(), the vertex layout describes the
+        packed formats.
+        '''
+        self.checkSingleIndexed()
+        data = bytearray(data)
+        layout = self.vertexLayout
+        stride = layout.getPackedSize()
+        if len(data) % stride != 0 :
+            raise Exception('Packed vertex data size must be a multiple of {} bytes!'.format(stride))
+        numVertices = len(data) / stride
+        precision = self.getPrecision()
+        vertexBuffer = self.createArray(precision, numVertices * layout.size)
+        if numVertices > 0 :
+            for comp in layout.vertexComponents.values() :
+                offset = layout.getPackedOffset(comp.nameAndIndex)
+                dataSize = comp.getDataSize()
+                compData = bytearray(numVertices * dataSize)
+                for i in range(0, dataSize) :
+                    compData[i::dataSize] = data[offset + i::stride]
+                lanes = unpackComponentData(compData, comp.size, comp.format)
+                for i in range(0, comp.size) :
+                    vertexBuffer[comp.offset + i::layout.size] = array(precision, lanes[i])
+        self.vertexBuffer = vertexBuffer
+
     def dumpVertices(self, nameAndIndex):
         '''
         Debug-print vertices
@@ -389,31 +1921,344 @@ class Mesh :
             sys.stdout.write('\n')
 
 #-------------------------------------------------------------------------------
-class VertexKey :
+class MeshBuilder :
+    '''
+    Builds a Mesh by appending vertices and triangles without knowing
+    the final counts up front. The arrays grow geometrically (capacity
+    is doubled when full), finalize() trims them to the actual size
+    and hands them over to a new Mesh object without copying.
+    Appending multi-indexed meshes builds a multi-indexed mesh.
+    Triangle normals are kept if all triangles come from meshes with
+    triangle normals (appendMesh), otherwise the built mesh has none.
+    In dedup mode, each vertex is hashed by its bytes when it is 
+    inserted, and a vertex identical to an existing vertex reuses 
+    the existing index (vertices must be inserted with appendVertex 
+    or insertVertices, since the new indices are not contiguous).
+    '''
+    def __init__(self, layout, precision=Mesh.Float64, mapped=False, dedup=False) :
+        if precision != Mesh.Float32 and precision != Mesh.Float64 :
+            raise Exception('Invalid vertex buffer precision!')
+        self.vertexLayout = layout
+        self.precision = precision
+        self.mapped = mapped
+        self.dedup = dedup
+        self._reset()
+
+    def _reset(self) :
+        if self.mapped :
+            self.vertexBuffer = MappedArray(self.precision)
+            self.indices = MappedArray(Mesh.IndexType)
+            self.groupIndices = MappedArray(Mesh.IndexType)
+        else :
+            self.vertexBuffer = array(self.precision)
+            self.indices = array(Mesh.IndexType)
+            self.groupIndices = array(Mesh.IndexType)
+        self.triangleNormals = self._createArray(self.precision)
+        self.hasTriangleNormals = True
+        self.streams = dict()
+        self.vertexMap = dict()
+        self.numVertices = 0
+        self.numTriangles = 0
+
+    def _createArray(self, typecode) :
+        if self.mapped :
+            return MappedArray(typecode)
+        else :
+            return array(typecode)
+
+    @staticmethod
+    def _typedArray(values, typecode) :
+        '''
+        Return values as array.array of typecode which can be assigned
+        to a slice of the builder arrays (converts lists, arrays of
+        other types and MappedArrays)
+        '''
+        if isinstance(values, array) and values.typecode == typecode :
+            return values
+        if isinstance(values, MappedArray) and values.typecode == typecode :
+            return values[0:len(values)]
+        return array(typecode, values)
+
+    @staticmethod
+    def _grow(buf, required) :
+        '''
+        Grow an array to at least the required number of items
+        by doubling its current capacity
+        '''
+        capacity = len(buf)
+        if required > capacity :
+            newCapacity = max(required, capacity * 2, 64)
+            if isinstance(buf, MappedArray) :
+                buf.resize(newCapacity)
+            else :
+                buf.extend(array(buf.typecode, [0]) * (newCapacity - capacity))
+
+    def getNumVertices(self) :
+        return self.numVertices
+
+    def getNumTriangles(self) :
+        return self.numTriangles
+
+    def appendVertex(self, values) :
+        '''
+        Append a single vertex from a sequence of floats (one
+        complete vertex as described by the vertex layout), returns
+        the new vertex index
+        '''
+        if len(values) != self.vertexLayout.size :
+            raise Exception('Vertex size mismatch!')
+        if self.dedup :
+            return self.insertVertices(values)[0]
+        return self.appendVertices(values)
+
+    def appendVertices(self, values) :
+        '''
+        Append vertices from a flat sequence of floats (a multiple
+        of the vertex layout size), returns the index of the first 
+        new vertex
+        '''
+        if self.dedup :
+            raise Exception('MeshBuilder in dedup mode, use insertVertices()!')
+        return self._appendVertices(values)
+
+    def insertVertices(self, values) :
+        '''
+        Insert vertices from a flat sequence of floats (a multiple
+        of the vertex layout size), returns an index array with the
+        vertex index of each inserted vertex. In dedup mode, identical
+        vertices are only stored once.
+        '''
+        vertexSize = self.vertexLayout.size
+        if len(values) % vertexSize != 0 :
+            raise Exception('Number of values must be a multiple of the vertex size!')
+        numValues = len(values)
+        if not self.dedup :
+            first = self._appendVertices(values)
+            return array(Mesh.IndexType, xrange(first, first + numValues / vertexSize))
+
+        values = MeshBuilder._typedArray(values, self.precision)
+        data = values.tostring()
+        stride = vertexSize * values.itemsize
+        vertexMap = self.vertexMap
+        indices = array(Mesh.IndexType, [0]) * (numValues / vertexSize)
+        uniqueValues = array(self.precision)
+        nextIndex = self.numVertices
+        for i in xrange(0, len(indices)) :
+            key = data[i * stride:(i + 1) * stride]
+            vertexIndex = vertexMap.get(key)
+            if vertexIndex == None :
+                vertexIndex = nextIndex
+                vertexMap[key] = vertexIndex
+                uniqueValues.extend(values[i * vertexSize:(i + 1) * vertexSize])
+                nextIndex += 1
+            indices[i] = vertexIndex
+        self._appendVertices(uniqueValues)
+        return indices
+
+    def _appendVertices(self, values) :
+        vertexSize = self.vertexLayout.size
+        if len(values) % vertexSize != 0 :
+            raise Exception('Number of values must be a multiple of the vertex size!')
+        first = self.numVertices
+        start = first * vertexSize
+        end = start + len(values)
+        MeshBuilder._grow(self.vertexBuffer, end)
+        self.vertexBuffer[start:end] = MeshBuilder._typedArray(values, self.precision)
+        self.numVertices += len(values) / vertexSize
+        return first
+
+    def appendComponents(self, numVertices, components) :
+        '''
+        Append numVertices vertices from separate vertex components,
+        a list of (nameAndIndex, values) with the component values of
+        each vertex one after another. The values are written directly
+        into the vertex buffer, missing components are zero. Returns
+        the index of the first new vertex.
+        '''
+        if self.dedup :
+            raise Exception('MeshBuilder in dedup mode, use insertVertices()!')
+        vertexSize = self.vertexLayout.size
+        first = self.numVertices
+        start = first * vertexSize
+        end = start + numVertices * vertexSize
+        MeshBuilder._grow(self.vertexBuffer, end)
+        for nameAndIndex, values in components :
+            comp = self.vertexLayout.getComponent(nameAndIndex)
+            if comp == None :
+                raise Exception('Vertex component {} not in vertex layout!'.format(nameAndIndex))
+            if len(values) != numVertices * comp.size :
+                raise Exception('Number of values of {} must be {}!'.format(nameAndIndex, numVertices * comp.size))
+            values = MeshBuilder._typedArray(values, self.precision)
+            for i in range(0, comp.size) :
+                self.vertexBuffer[start + comp.offset + i:end:vertexSize] = values[i::comp.size]
+        self.numVertices += numVertices
+        return first
+
+    def appendTriangle(self, vi0, vi1, vi2, groupIndex=0) :
+        '''
+        Append a triangle, returns the new triangle index
+        '''
+        triIndex = self.numTriangles
+        MeshBuilder._grow(self.indices, (triIndex + 1) * 3)
+        MeshBuilder._grow(self.groupIndices, triIndex + 1)
+        i = triIndex * 3
+        self.indices[i] = vi0
+        self.indices[i + 1] = vi1
+        self.indices[i + 2] = vi2
+        self.groupIndices[triIndex] = groupIndex
+        self.numTriangles += 1
+        self.hasTriangleNormals = False
+        return triIndex
+
+    def appendTriangles(self, indices, groupIndex=0) :
+        '''
+        Append triangles from a flat sequence of vertex indices (3 per
+        triangle) which all share the same group index, returns the index
+        of the first new triangle
+        '''
+        if len(indices) % 3 != 0 :
+            raise Exception('Number of indices must be a multiple of 3!')
+        first = self.numTriangles
+        num = len(indices) / 3
+        MeshBuilder._grow(self.indices, (first + num) * 3)
+        MeshBuilder._grow(self.groupIndices, first + num)
+        if not isinstance(indices, array) or indices.typecode != Mesh.IndexType :
+            indices = array(Mesh.IndexType, indices)
+        self.indices[first * 3:(first + num) * 3] = indices
+        self.groupIndices[first:first + num] = array(Mesh.IndexType, [groupIndex]) * num
+        self.numTriangles += num
+        self.hasTriangleNormals = False
+        return first
+
+    def appendMesh(self, mesh) :
+        '''
+        Append all vertices and triangles of a Mesh object with the
+        same vertex layout, the triangle vertex indices are rebased
+        (or remapped to the unique vertices in dedup mode)
+        '''
+        if mesh.vertexLayout.size != self.vertexLayout.size :
+            raise Exception('Vertex layout mismatch!')
+        if mesh.isMultiIndexed() :
+            return self._appendMultiIndexedMesh(mesh)
+        if self.streams :
+            raise Exception('Cannot mix single- and multi-indexed meshes!')
+        first = self.numTriangles
+        num = mesh.getNumTriangles()
+        MeshBuilder._grow(self.indices, (first + num) * 3)
+        MeshBuilder._grow(self.groupIndices, first + num)
+        if self.dedup :
+            vertexIndices = self.insertVertices(mesh.vertexBuffer)
+            self.indices[first * 3:(first + num) * 3] = array(Mesh.IndexType, [vertexIndices[i] for i in mesh.indices])
+        else :
+            base = self._appendVertices(mesh.vertexBuffer)
+            self.indices[first * 3:(first + num) * 3] = array(Mesh.IndexType, [i + base for i in mesh.indices])
+        self.groupIndices[first:first + num] = MeshBuilder._typedArray(mesh.groupIndices, Mesh.IndexType)
+        self._appendTriangleNormals(mesh)
+        self.numTriangles += num
+        return first
+
+    def _appendTriangleNormals(self, mesh) :
+        '''
+        Copy the triangle normals of an appended mesh, or drop
+        the triangle normals if the mesh has none
+        '''
+        if not self.hasTriangleNormals :
+            return
+        if mesh.triangleNormals is None :
+            self.hasTriangleNormals = False
+            del self.triangleNormals[:]
+            return
+        start = self.numTriangles * 3
+        end = start + mesh.getNumTriangles() * 3
+        MeshBuilder._grow(self.triangleNormals, end)
+        self.triangleNormals[start:end] = MeshBuilder._typedArray(mesh.triangleNormals, self.precision)
+
+    def _appendMultiIndexedMesh(self, mesh) :
+        '''
+        Append the vertex streams and triangles of a multi-indexed mesh,
+        the stream indices are rebased
+        '''
+        if self.numVertices > 0 :
+            raise Exception('Cannot mix single- and multi-indexed meshes!')
+        for comp in self.vertexLayout.vertexComponents.values() :
+            srcStream = mesh.getStream(comp.nameAndIndex)
+            if srcStream == None :
+                raise Exception('Vertex component {} has no stream!'.format(comp.nameAndIndex))
+            dstStream = self.streams.get(comp.nameAndIndex)
+            if dstStream == None :
+                dstStream = VertexStream(comp.size, self._createArray(self.precision), self._createArray(Mesh.IndexType))
+                self.streams[comp.nameAndIndex] = dstStream
+            values = MeshBuilder._typedArray(srcStream.values, self.precision)
+            base = dstStream.getNumValues()
+            dstStream.values.extend(values)
+            dstStream.indices.extend(array(Mesh.IndexType, [i + base for i in srcStream.indices]))
+        first = self.numTriangles
+        num = mesh.getNumTriangles()
+        MeshBuilder._grow(self.indices, (first + num) * 3)
+        MeshBuilder._grow(self.groupIndices, first + num)
+        self.groupIndices[first:first + num] = MeshBuilder._typedArray(mesh.groupIndices, Mesh.IndexType)
+        self._appendTriangleNormals(mesh)
+        self.numTriangles += num
+        return first
+
+    def finalize(self) :
+        '''
+        Trim the arrays to their actual size and return them as a new
+        Mesh object, the builder is empty afterwards
+        '''
+        del self.vertexBuffer[self.numVertices * self.vertexLayout.size:]
+        del self.indices[self.numTriangles * 3:]
+        del self.groupIndices[self.numTriangles:]
+        mesh = Mesh(self.vertexLayout, 0, 0, self.precision, self.mapped)
+        mesh.vertexBuffer = self.vertexBuffer
+        mesh.indices = self.indices
+        mesh.groupIndices = self.groupIndices
+        if self.hasTriangleNormals and self.numTriangles > 0 :
+            del self.triangleNormals[self.numTriangles * 3:]
+            mesh.triangleNormals = self.triangleNormals
+        mesh.streams = self.streams
+        self._reset()
+        return mesh
+
+#-------------------------------------------------------------------------------
+class VertexKeyContext(object) :
+    '''
+    The vertex data shared by all VertexKeys of one sort, each 
+    VertexKeyMap has its own context so that sorts are re-entrant
+    and can run in parallel threads.
+    '''
+    __slots__ = ('vertexBuffer', 'layoutSize', 'tolerance')
+
+    def __init__(self, mesh, tolerance=None) :
+        self.vertexBuffer = mesh.vertexBuffer
+        self.layoutSize = mesh.vertexLayout.size
+        if tolerance == None :
+            tolerance = DG_TOLERANCE
+        self.tolerance = tolerance
+
+#-------------------------------------------------------------------------------
+class VertexKey(object) :
     ''' 
     A key class for sorting vertices.
     ''' 
-    def __init__(self, index, vertexLayoutSize) :
-        self.vertexIndex = index
-        self.bufferIndex = index * vertexLayoutSize
+    __slots__ = ('vertexIndex', 'bufferIndex', 'context')
 
-    @staticmethod
-    def init(mesh) :
-        ''' 
-        this must be called before sorting to setup a few
-        static variables used in the cmp method
-        '''
-        VertexKey.vertexBuffer = mesh.vertexBuffer
-        VertexKey.layoutSize   = mesh.vertexLayout.size
+    def __init__(self, index, context) :
+        self.vertexIndex = index
+        self.bufferIndex = index * context.layoutSize
+        self.context = context
 
     def cmp(self, other) :
+        vertexBuffer = self.context.vertexBuffer
+        layoutSize = self.context.layoutSize
+        tolerance = self.context.tolerance
         i = 0
-        while i < VertexKey.layoutSize:
-            selfValue  = VertexKey.vertexBuffer[self.bufferIndex + i]
-            otherValue = VertexKey.vertexBuffer[other.bufferIndex + i]
-            if (selfValue+DG_TOLERANCE) < otherValue :
+        while i < layoutSize:
+            selfValue  = vertexBuffer[self.bufferIndex + i]
+            otherValue = vertexBuffer[other.bufferIndex + i]
+            if (selfValue+tolerance) < otherValue :
                 return -1
-            elif selfValue > (otherValue+DG_TOLERANCE) :
+            elif selfValue > (otherValue+tolerance) :
                 return 1
             i += 1
         # fallthrough: vertices are identical
@@ -421,13 +2266,16 @@ class VertexKey :
 
     def __lt__(self, other) :
         # inlined for performance (only __lt__ is called as sort hook)
+        vertexBuffer = self.context.vertexBuffer
+        layoutSize = self.context.layoutSize
+        tolerance = self.context.tolerance
         i = 0
-        while i < VertexKey.layoutSize:
-            selfValue  = VertexKey.vertexBuffer[self.bufferIndex + i]
-            otherValue = VertexKey.vertexBuffer[other.bufferIndex + i]
-            if (selfValue+DG_TOLERANCE) < otherValue :
+        while i < layoutSize:
+            selfValue  = vertexBuffer[self.bufferIndex + i]
+            otherValue = vertexBuffer[other.bufferIndex + i]
+            if (selfValue+tolerance) < otherValue :
                 return True
-            elif selfValue > (otherValue+DG_TOLERANCE) :
+            elif selfValue > (otherValue+tolerance) :
                 return False
             i += 1
         # fallthrough: vertices are identical
@@ -442,11 +2290,14 @@ class VertexKey :
         return self.cmp(other) >= 0
     def __ne__(self, other) :
         # inlined for performance
+        vertexBuffer = self.context.vertexBuffer
+        layoutSize = self.context.layoutSize
+        tolerance = self.context.tolerance
         i = 0
-        while i < VertexKey.layoutSize:
-            selfValue  = VertexKey.vertexBuffer[self.bufferIndex + i]
-            otherValue = VertexKey.vertexBuffer[other.bufferIndex + i]
-            if abs(selfValue - otherValue) >= DG_TOLERANCE :
+        while i < layoutSize:
+            selfValue  = vertexBuffer[self.bufferIndex + i]
+            otherValue = vertexBuffer[other.bufferIndex + i]
+            if selfValue != otherValue and abs(selfValue - otherValue) >= tolerance :
                 return True
             i += 1
         # fallthrough: vertices are identical
@@ -456,27 +2307,30 @@ class VertexKey :
 class VertexKeyMap :
     '''
     Holds a mesh reference and a list of (usually sorted) VertexKeys. Mainly
-    used to find and remove duplicate vertices from a mesh
+    used to find and remove duplicate vertices from a mesh. The keys
+    reference a per-map VertexKeyContext, there is no global state.
+    The tolerance defaults to DG_TOLERANCE.
     '''
-    def __init__(self, mesh) :
+    def __init__(self, mesh, tolerance=None) :
         self.mesh = mesh
-        vertexLayoutSize = mesh.vertexLayout.size
-        self.keys = [VertexKey(i, vertexLayoutSize) for i in xrange(0, mesh.getNumVertices())]
+        self.context = VertexKeyContext(mesh, tolerance)
+        self.keys = [VertexKey(i, self.context) for i in xrange(0, mesh.getNumVertices())]
 
     def sort(self) :
         '''
         Sort the contained vertex key
         '''
-        if len(self.keys) > 1 and self.keys[1].bufferIndex != self.mesh.vertexLayout.size :
+        if self.mesh.vertexLayout.size != self.context.layoutSize :
             raise Exception('Vertex layout size has changed!')
-        VertexKey.init(self.mesh)
+        self.context.vertexBuffer = self.mesh.vertexBuffer
         self.keys.sort()
 
 #-------------------------------------------------------------------------------
-class MatParam :
+class MatParam(object) :
     '''
     A material parameter (a key, a type and a value).
     '''
+    __slots__ = ('name', 'type', 'value')
 
     # param types
     Float = 1
@@ -549,6 +2403,7 @@ class Material :
         self.type = type
         self.shaderName = 'None'
         self.params = []
+        self.paramsByName = dict()
         self.useCount = 0
 
     @staticmethod
@@ -566,41 +2421,58 @@ class Material :
         mat.addParam(MatParam('DisplacementColor', MatParam.Float4, Vector(0.0, 0.0, 0.0)))
         return mat
 
+    def clone(self) :
+        '''
+        Return a deep copy of the material
+        '''
+        return copy.deepcopy(self)
+
+    def updateHash(self, h) :
+        '''
+        Feed the material attributes and params into a hashlib object
+        '''
+        h.update('{};{};{};'.format(self.name, self.type, self.shaderName))
+        for param in self.params :
+            h.update('{};{};{};'.format(param.name, param.type, param.valueAsString()))
+
     def hasParam(self, paramName) :
         '''
         Test if the material already contains a parameter
         '''
-        for param in self.params :
-            if param.name == paramName :
-                return True
-        else :
-            return False
+        return paramName in self.paramsByName
 
     def addParam(self, param) :
         '''
         Add a material param to the material
         '''
         if self.hasParam(param.name) :
-            dgLogger.warning('Param {} already exists on material {}'.format(self.name, param.name))
+            dgLogger.warning('Param {} already exists on material {}'.format(param.name, self.name))
         else :
             self.params.append(param)
+            self.paramsByName[param.name] = param
+
+    def removeParam(self, name) :
+        '''
+        Remove a param by name, returns the removed param or None
+        '''
+        param = self.paramsByName.pop(name, None)
+        if param != None :
+            self.params.remove(param)
+        return param
 
     def getParam(self, name) :
         '''
         Get a param by name, returns None if not found
         '''
-        for param in self.params :
-            if param.name == name :
-                return param
-        else :
-            return None
+        return self.paramsByName.get(name)
 
     def get(self, name) :
         '''
         Short-cut method to directly get the value of a param.
         '''
-        if self.hasParam(name) :
-            return self.getParam(name).value
+        param = self.paramsByName.get(name)
+        if param != None :
+            return param.value
         else :
             return None
 
@@ -631,6 +2503,46 @@ class Model :
         self.name = name
         self.mesh = None
         self.materials = []
+        self.materialIndices = dict()
+        self.sharedMaterials = False
+
+    def clone(self) :
+        '''
+        Return a cheap copy-on-write clone of the model, the mesh
+        is cloned with Mesh.clone(), and the Material objects are shared
+        until ownMaterials() is called by the side which wants to
+        modify them.
+        '''
+        dst = Model(self.name)
+        if self.mesh != None :
+            dst.mesh = self.mesh.clone()
+        dst.materials = list(self.materials)
+        dst.materialIndices = dict(self.materialIndices)
+        if self.materials :
+            self.sharedMaterials = True
+            dst.sharedMaterials = True
+        return dst
+
+    def fingerprint(self) :
+        '''
+        Return a digest (hex string) of the mesh and material content,
+        see Mesh.fingerprint()
+        '''
+        h = hashlib.sha1()
+        if self.mesh != None :
+            self.mesh.updateHash(h)
+        for mat in self.materials :
+            mat.updateHash(h)
+        return h.hexdigest()
+
+    def ownMaterials(self) :
+        '''
+        Make sure that the Material objects aren't shared with a clone,
+        must be called before modifying materials in place.
+        '''
+        if self.sharedMaterials :
+            self.materials = [mat.clone() for mat in self.materials]
+            self.sharedMaterials = False
 
     def getNumMaterials(self) :
         return len(self.materials)
@@ -639,9 +2551,9 @@ class Model :
         '''
         Return material by name, or None if not exists
         '''
-        for mat in self.materials :
-            if mat.name == name :
-                return mat
+        index = self.materialIndices.get(name)
+        if index != None :
+            return self.materials[index]
         else :
             return None
 
@@ -649,23 +2561,42 @@ class Model :
         '''
         Return material index by name, or None if not exists
         '''
-        i = 0
-        for mat in self.materials :
-            if mat.name == name :
-                return i
-            i += 1
-        else :
-            return None
+        return self.materialIndices.get(name)
 
     def addMaterial(self, material) :
         '''
         Add a new material, the material must not yet exist
         '''
-        if self.findMaterial(material.name) != None :
+        if material.name in self.materialIndices :
             dgLogger.warning('Material {} already exists on Model {}!'.format(material.name, self.name))
         else :
+            self.materialIndices[material.name] = len(self.materials)
             self.materials.append(material)
 
+    def removeMaterial(self, name) :
+        '''
+        Remove a material by name, the material must not be used
+        by any triangles. The triangle group indices of the following
+        materials are fixed. Returns the removed material or None.
+        '''
+        index = self.materialIndices.get(name)
+        if index == None :
+            return None
+        if self.mesh != None :
+            groupIndices = self.mesh.groupIndices
+            if index in groupIndices :
+                raise Exception('Material {} is still used by triangles!'.format(name))
+            if any(groupIndex > index for groupIndex in groupIndices) :
+                groupIndices = self.mesh.makeUnique('groupIndices')
+                for triIndex in xrange(0, len(groupIndices)) :
+                    if groupIndices[triIndex] > index :
+                        groupIndices[triIndex] -= 1
+        material = self.materials.pop(index)
+        del self.materialIndices[name]
+        for i in range(index, len(self.materials)) :
+            self.materialIndices[self.materials[i].name] = i
+        return material
+
     def dumpMaterials(self) :
         '''
         Dump materials to stdout for debugging
@@ -32,25 +32,28 @@ def generate(vertexLayout, size=Vector(1.0, 1.0, 1.0), origin=Vector(0.0, 0.0, 0
     uvMap = [ [3, 0, 1, 2], [0, 1, 2, 3], [1, 2, 3, 0],
               [0, 1, 2, 3], [3, 0, 1, 2], [0, 1, 2, 3] ]
 
-    mesh = Mesh(vertexLayout, 24, 12)
-
-    posOffset  = mesh.getComponentOffset(pos0)
-    normOffset = mesh.getComponentOffset(norm0)
-    uvOffset   = mesh.getComponentOffset(uv0)
+    positions = []
+    normals   = []
+    texcoords = []
+    indices   = []
     for i in range(0, 6) :
         for j in range(0, 4) :
-            vertIndex = i * 4 + j
             coord = coords[coordMap[i][j]] * size + origin
             norm  = norms[i]
             uv    = uvs[uvMap[i][j]]
-            mesh.setData3(vertIndex, posOffset, coord.x, coord.y, coord.z)
-            mesh.setData3(vertIndex, normOffset, norm.x, norm.y, norm.z)
-            mesh.setData2(vertIndex, uvOffset, uv.x, uv.y)
+            positions.extend((coord.x, coord.y, coord.z))
+            normals.extend((norm.x, norm.y, norm.z))
+            texcoords.extend((uv.x, uv.y))
 
-        triIndex = i * 2
         triVertIndex = i * 4
-        mesh.setTriangle(triIndex, Triangle(triVertIndex, triVertIndex+1, triVertIndex+2, 0))
-        mesh.setTriangle(triIndex + 1, Triangle(triVertIndex+2, triVertIndex+3, triVertIndex, 0))
+        indices.extend((triVertIndex, triVertIndex+1, triVertIndex+2))
+        indices.extend((triVertIndex+2, triVertIndex+3, triVertIndex))
+
+    mesh = Mesh(vertexLayout, 24, 12)
+    mesh.setComponent(pos0, positions)
+    mesh.setComponent(norm0, normals)
+    mesh.setComponent(uv0, texcoords)
+    mesh.setTriangles(indices, 0)
 
     # create a dummy model
     model = Model('cube')
@@ -32,19 +32,19 @@ def generate(vertexLayout, baseRadius, topRadius, length, numSlices, numStacks)
     numVerts = 2 * (numSlices+1) + (numStacks+1) * numSlices
     numTris  = 2 * numSlices + numSlices * numStacks * 2
     mesh = Mesh(vertexLayout, numVerts, numTris)
-    posOffset  = mesh.getComponentOffset(('position', 0))
-    normOffset = mesh.getComponentOffset(('normal', 0))
+    positions = []
+    normals   = []
 
     # base cap vertices
     curVertexIndex = 0
     baseZ = -0.5 * length
-    mesh.setData3(curVertexIndex, posOffset, 0.0, 0.0, baseZ)
-    mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, -1.0)
+    positions.extend((0.0, 0.0, baseZ))
+    normals.extend((0.0, 0.0, -1.0))
     curVertexIndex += 1
     for i in range(0, numSlices) :
         pos = Vector(baseRadius * sinTable[i], baseRadius * cosTable[i], baseZ)
-        mesh.setData3(curVertexIndex, posOffset, pos.x, pos.y, pos.z)
-        mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, -1.0)
+        positions.extend((pos.x, pos.y, pos.z))
+        normals.extend((0.0, 0.0, -1.0))
         curVertexIndex += 1
 
     # stack vertices
@@ -56,63 +56,58 @@ def generate(vertexLayout, baseRadius, topRadius, length, numSlices, numStacks)
         for i in range(0, numSlices) :
             pos  = Vector(radius * sinTable[i], radius * cosTable[i], z)
             norm = Vector(normalXY * sinTable[i], normalXY * cosTable[i], normalZ)  
-            mesh.setData3(curVertexIndex, posOffset, pos.x, pos.y, pos.z)
-            mesh.setData3(curVertexIndex, normOffset, norm.x, norm.y, norm.z)
+            positions.extend((pos.x, pos.y, pos.z))
+            normals.extend((norm.x, norm.y, norm.z))
             curVertexIndex += 1
 
     # top cap vertices
     topZ = 0.5 * length
     for i in range(0, numSlices) :
         pos = Vector(topRadius * sinTable[i], topRadius * cosTable[i], topZ)
-        mesh.setData3(curVertexIndex, posOffset, pos.x, pos.y, pos.z)
-        mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, 1.0)
+        positions.extend((pos.x, pos.y, pos.z))
+        normals.extend((0.0, 0.0, 1.0))
         curVertexIndex += 1
 
-    mesh.setData3(curVertexIndex, posOffset, 0.0, 0.0, topZ)
-    mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, 1.0)
+    positions.extend((0.0, 0.0, topZ))
+    normals.extend((0.0, 0.0, 1.0))
     curVertexIndex += 1
     if curVertexIndex != mesh.getNumVertices() :
         raise Exception("Vertex count mismatch!")
+    mesh.setComponent(('position', 0), positions)
+    mesh.setComponent(('normal', 0), normals)
 
     # generate triangles
-    triIndex = 0
+    indices = []
 
     # base cap triangles
     rowA = 0
     rowB = 1
     for i in range(0, numSlices-1) :
-        mesh.setTriangle(triIndex, Triangle(rowA, rowB+i, rowB+i+1, 0))
-        triIndex += 1
+        indices.extend((rowA, rowB+i, rowB+i+1))
     i += 1
-    mesh.setTriangle(triIndex, Triangle(rowA, rowB+i, rowB, 0))
-    triIndex += 1
+    indices.extend((rowA, rowB+i, rowB))
 
     # stack triangles
     for j in range(0, numStacks) :
         rowA = 1 + (j + 1) * numSlices
         rowB = rowA + numSlices
         for i in range(0, numSlices-1) :
-            mesh.setTriangle(triIndex, Triangle(rowA+i, rowB+i, rowA+i+1, 0))
-            triIndex += 1
-            mesh.setTriangle(triIndex, Triangle(rowA+i+1, rowB+i, rowB+i+1, 0))
-            triIndex += 1
+            indices.extend((rowA+i, rowB+i, rowA+i+1))
+            indices.extend((rowA+i+1, rowB+i, rowB+i+1))
         i += 1
-        mesh.setTriangle(triIndex, Triangle(rowA+i, rowB+i, rowA, 0))
-        triIndex += 1
-        mesh.setTriangle(triIndex, Triangle(rowA, rowB+i, rowB, 0))
-        triIndex += 1
+        indices.extend((rowA+i, rowB+i, rowA))
+        indices.extend((rowA, rowB+i, rowB))
 
     # top cap triangles
     rowA = 1 + (numStacks + 2) * numSlices
     rowB = rowA + numSlices
     for i in range(0, numSlices - 1) :
-        mesh.setTriangle(triIndex, Triangle(rowA+i, rowB, rowA+i+1, 0))
-        triIndex += 1
+        indices.extend((rowA+i, rowB, rowA+i+1))
     i += 1
-    mesh.setTriangle(triIndex, Triangle(rowA+i, rowB, rowA, 0))
-    triIndex += 1
-    if triIndex != mesh.getNumTriangles() :
+    indices.extend((rowA+i, rowB, rowA))
+    if len(indices) != mesh.getNumTriangles() * 3 :
         raise Exception("Triangle count mismatch")
+    mesh.setTriangles(indices, 0)
 
     # create a dummy model
     model = Model('cylinder')
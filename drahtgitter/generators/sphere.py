@@ -30,13 +30,13 @@ def generate(vertexLayout, radius, numSlices, numStacks) :
     numVerts = 2 + numSlices * (numStacks - 1)
     numTris  = 2 * numSlices + 2 * numSlices * (numStacks - 2)
     mesh = Mesh(vertexLayout, numVerts, numTris)
-    posOffset = mesh.getComponentOffset(('position', 0))
-    normOffset = mesh.getComponentOffset(('normal', 0))
+    positions = []
+    normals   = []
 
     # top pole vertex
     curVertexIndex = 0
-    mesh.setData3(curVertexIndex, posOffset, 0.0, 0.0, radius)
-    mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, 1.0)
+    positions.extend((0.0, 0.0, radius))
+    normals.extend((0.0, 0.0, 1.0))
     curVertexIndex += 1
 
     # stack vertices
@@ -47,56 +47,51 @@ def generate(vertexLayout, radius, numSlices, numStacks) :
             nz = cosTableJ[j]
             norm = Vector(nx, ny, nz)
             pos  = Vector.scale(norm, radius)
-            mesh.setData3(curVertexIndex, posOffset, pos.x, pos.y, pos.z)
-            mesh.setData3(curVertexIndex, normOffset, norm.x, norm.y, norm.z)
+            positions.extend((pos.x, pos.y, pos.z))
+            normals.extend((norm.x, norm.y, norm.z))
             curVertexIndex += 1
 
     # base pole index
-    mesh.setData3(curVertexIndex, posOffset, 0.0, 0.0, -radius)
-    mesh.setData3(curVertexIndex, normOffset, 0.0, 0.0, -1.0)
+    positions.extend((0.0, 0.0, -radius))
+    normals.extend((0.0, 0.0, -1.0))
     curVertexIndex += 1
     if curVertexIndex != mesh.getNumVertices() :
         raise Exception("Vertex count mismatch!")
+    mesh.setComponent(('position', 0), positions)
+    mesh.setComponent(('normal', 0), normals)
 
     # generate triangles
-    triIndex = 0
+    indices = []
 
     # top pole triangles
     rowA = 0
     rowB = 1
     for i in range(0, numSlices - 1) :
-        mesh.setTriangle(triIndex, Triangle(rowA, rowB+i+1, rowB+i, 0))
-        triIndex += 1
+        indices.extend((rowA, rowB+i+1, rowB+i))
     i += 1
-    mesh.setTriangle(triIndex, Triangle(rowA, rowB, rowB+i, 0))
-    triIndex += 1
+    indices.extend((rowA, rowB, rowB+i))
 
     # stack triangles
     for j in range(1, numStacks - 1) :
         rowA = 1 + (j - 1) * numSlices
         rowB = rowA + numSlices
         for i in range(0, numSlices - 1) :
-            mesh.setTriangle(triIndex, Triangle(rowA+i, rowA+i+1, rowB+i, 0))
-            triIndex += 1
-            mesh.setTriangle(triIndex, Triangle(rowA+i+1, rowB+i+1, rowB+i, 0))
-            triIndex += 1
+            indices.extend((rowA+i, rowA+i+1, rowB+i))
+            indices.extend((rowA+i+1, rowB+i+1, rowB+i))
         i += 1
-        mesh.setTriangle(triIndex, Triangle(rowA+i, rowA, rowB+i, 0))
-        triIndex += 1
-        mesh.setTriangle(triIndex, Triangle(rowA, rowB, rowB+i, 0))
-        triIndex += 1
+        indices.extend((rowA+i, rowA, rowB+i))
+        indices.extend((rowA, rowB, rowB+i))
 
     # base pole triangles
     rowA = 1 + (numStacks - 2) * numSlices
     rowB = rowA + numSlices
     for i in range(0, numSlices - 1) :
-        mesh.setTriangle(triIndex, Triangle(rowA+i, rowA+i+1, rowB, 0))
-        triIndex += 1
+        indices.extend((rowA+i, rowA+i+1, rowB))
     i += 1
-    mesh.setTriangle(triIndex, Triangle(rowA+i, rowA, rowB, 0))
-    triIndex += 1
-    if triIndex != mesh.getNumTriangles() :
+    indices.extend((rowA+i, rowA, rowB))
+    if len(indices) != mesh.getNumTriangles() * 3 :
         raise Exception("Triangle count mismatch")
+    mesh.setTriangles(indices, 0)
 
     # create a dummy model
     model = Model('sphere')
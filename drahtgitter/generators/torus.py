@@ -15,8 +15,8 @@ def generate(vertexLayout, innerRadius, outerRadius, numSides, numRings) :
     numVertices = numRings * numSides 
     numTriangles = (numRings-1) * numSides * 2 + numSides * 2
     mesh = Mesh(vertexLayout, numVertices, numTriangles)
-    posOffset = mesh.getComponentOffset(('position', 0))
-    normOffset = mesh.getComponentOffset(('normal', 0))
+    positions = []
+    normals   = []
 
     # generate vertices
     vertexIndex = 0
@@ -38,40 +38,35 @@ def generate(vertexLayout, innerRadius, outerRadius, numSides, numRings) :
             ny = -sinTheta * cosPhi
             nz = sinPhi
 
-            mesh.setData3(vertexIndex, posOffset, px, py, pz)
-            mesh.setData3(vertexIndex, normOffset, nx, ny, nz)
+            positions.extend((px, py, pz))
+            normals.extend((nx, ny, nz))
             vertexIndex += 1
 
     if vertexIndex != mesh.getNumVertices() :
         raise Exception('Vertex count mismatch!')
+    mesh.setComponent(('position', 0), positions)
+    mesh.setComponent(('normal', 0), normals)
 
     # generate numTriangles
-    triIndex = 0
+    indices = []
     for i in range(0, numRings - 1) :
         for j in range(0, numSides - 1) :
-            mesh.setTriangle(triIndex, Triangle(i*numSides+j, i*numSides+j+1, (i+1)*numSides+j, 0))
-            triIndex += 1
-            mesh.setTriangle(triIndex, Triangle((i+1)*numSides+j, i*numSides+j+1, (i+1)*numSides+j+1, 0))
-            triIndex += 1
+            indices.extend((i*numSides+j, i*numSides+j+1, (i+1)*numSides+j))
+            indices.extend(((i+1)*numSides+j, i*numSides+j+1, (i+1)*numSides+j+1))
         j += 1
-        mesh.setTriangle(triIndex, Triangle(i*numSides+j, i*numSides, (i+1)*numSides+j, 0))
-        triIndex += 1
-        mesh.setTriangle(triIndex, Triangle((i+1)*numSides+j, i*numSides, (i+1)*numSides, 0))
-        triIndex += 1
+        indices.extend((i*numSides+j, i*numSides, (i+1)*numSides+j))
+        indices.extend(((i+1)*numSides+j, i*numSides, (i+1)*numSides))
     i += 1
     for j in range(0, numSides - 1) :
-        mesh.setTriangle(triIndex, Triangle(i*numSides+j, i*numSides+j+1, j, 0))
-        triIndex += 1
-        mesh.setTriangle(triIndex, Triangle(j, i*numSides+j+1, j+1, 0))
-        triIndex += 1
+        indices.extend((i*numSides+j, i*numSides+j+1, j))
+        indices.extend((j, i*numSides+j+1, j+1))
     j += 1
-    mesh.setTriangle(triIndex, Triangle(i*numSides+j, i*numSides, j, 0))
-    triIndex += 1
-    mesh.setTriangle(triIndex, Triangle(j, i*numSides, 0, 0))
-    triIndex += 1
+    indices.extend((i*numSides+j, i*numSides, j))
+    indices.extend((j, i*numSides, 0))
 
-    if triIndex != mesh.getNumTriangles() :
+    if len(indices) != mesh.getNumTriangles() * 3 :
         raise Exception('Triangle count mismatch!')
+    mesh.setTriangles(indices, 0)
 
     # create a dummy model
     model = Model('torus')
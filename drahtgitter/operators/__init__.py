@@ -1,2 +1,2 @@
 # __init__.py
-__all__ = ['computeTriangleNormals', 'fixVertexComponents', 'deflate', 'randomMaterialColors', 'removeDegenerateTriangles']
+__all__ = ['computeTriangleNormals', 'fixVertexComponents', 'deflate', 'randomMaterialColors', 'removeDegenerateTriangles', 'flattenIndices', 'computeVertexNormals', 'computeTangents', 'optimizeVertexCache', 'optimizeOverdraw', 'optimizeVertexFetch', 'sortTriangleGroups', 'simplify', 'buildMeshlets', 'packVertexComponents']
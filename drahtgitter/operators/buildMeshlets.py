@@ -0,0 +1,188 @@
+'''
+Partition the triangles of each triangle group (material) into meshlets
+of at most maxVertices vertices and maxTriangles triangles for
+per-cluster GPU culling. A meshlet grows from a seed triangle by adding
+the adjacent triangle which adds the fewest new vertices, so the
+meshlets are compact and the build time is linear in the number of
+triangles. Run this after optimizeVertexCache, the seeds follow the
+triangle order. Each meshlet gets a local index buffer, a bounding
+sphere and a normal cone of its face normals for backface culling (see
+Meshlet.isBackfacing()). Returns a new Model, with the triangles
+reordered so that each meshlet is a contiguous range, and a list of
+Meshlet objects.
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel, maxVertices=64, maxTriangles=124) :
+
+    dgLogger.debug('operators.buildMeshlets: model={} maxVertices={} maxTriangles={}'.format(srcModel.name, maxVertices, maxTriangles))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    if maxVertices < 3 or maxVertices > 256 :
+        raise Exception('Meshlet vertex count must be between 3 and 256!')
+    if maxTriangles < 1 :
+        raise Exception('Meshlet triangle count must be at least 1!')
+
+    # the triangles of each vertex
+    indices = srcMesh.indices
+    groupIndices = srcMesh.groupIndices
+    numTriangles = srcMesh.getNumTriangles()
+    vertexTris = [[] for vertexIndex in xrange(0, srcMesh.getNumVertices())]
+    triIndex = 0
+    for i0, i1, i2 in zip(indices[0::3], indices[1::3], indices[2::3]) :
+        vertexTris[i0].append(triIndex)
+        vertexTris[i1].append(triIndex)
+        vertexTris[i2].append(triIndex)
+        triIndex += 1
+    liveTris = [len(tris) for tris in vertexTris]
+
+    groupTris = dict()
+    triIndex = 0
+    for groupIndex in groupIndices :
+        groupTris.setdefault(groupIndex, []).append(triIndex)
+        triIndex += 1
+
+    # build the meshlets, the new triangle order follows them
+    used = bytearray(numTriangles)
+    order = []
+    meshlets = []
+    for groupIndex in sorted(groupTris.keys()) :
+        tris = groupTris[groupIndex]
+        scanPos = 0
+        seed = -1
+        while True :
+            if seed == -1 :
+                while scanPos < len(tris) and used[tris[scanPos]] :
+                    scanPos += 1
+                if scanPos == len(tris) :
+                    break
+                seed = tris[scanPos]
+            meshlet = Meshlet(groupIndex, len(order))
+            localMap = dict()
+            lastTri = seed
+            seed = -1
+            while lastTri != -1 :
+                corners = indices[lastTri * 3:lastTri * 3 + 3]
+                numNew = len([vertexIndex for vertexIndex in set(corners) if vertexIndex not in localMap])
+                if len(localMap) + numNew > maxVertices or meshlet.numTriangles == maxTriangles :
+                    # the triangle starts the next meshlet
+                    seed = lastTri
+                    break
+                for vertexIndex in corners :
+                    localIndex = localMap.get(vertexIndex)
+                    if localIndex == None :
+                        localIndex = len(localMap)
+                        localMap[vertexIndex] = localIndex
+                        meshlet.vertices.append(vertexIndex)
+                    meshlet.localIndices.append(localIndex)
+                used[lastTri] = 1
+                for vertexIndex in corners :
+                    liveTris[vertexIndex] -= 1
+                order.append(lastTri)
+                meshlet.numTriangles += 1
+                lastTri = _nextTriangle(indices, groupIndices, vertexTris, liveTris, used, localMap, corners, groupIndex)
+            meshlets.append(meshlet)
+
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.reorderTriangles(order)
+    _computeBounds(dstMesh, meshlets)
+    dgLogger.info('operators.buildMeshlets: model={} {} triangles in {} meshlets'.format(srcModel.name, numTriangles, len(meshlets)))
+
+    return dstModel, meshlets
+
+#-------------------------------------------------------------------------------
+def _nextTriangle(indices, groupIndices, vertexTris, liveTris, used, localMap, corners, groupIndex) :
+    '''
+    Find the unused triangle with the fewest vertices outside of the
+    meshlet, first next to the last triangle, then next to all vertices
+    of the meshlet. Ties prefer vertices with few remaining triangles,
+    this finishes vertices off and keeps the meshlets round. Returns -1
+    if there's no adjacent triangle.
+    '''
+    bestTri = -1
+    bestScore = 4000
+    for vertices in (corners, localMap) :
+        for vertexIndex in vertices :
+            if liveTris[vertexIndex] == 0 :
+                continue
+            for triIndex in vertexTris[vertexIndex] :
+                if used[triIndex] or groupIndices[triIndex] != groupIndex :
+                    continue
+                score = 0
+                for otherIndex in indices[triIndex * 3:triIndex * 3 + 3] :
+                    if otherIndex not in localMap :
+                        score += 1000
+                    score += liveTris[otherIndex]
+                if score < bestScore :
+                    bestScore = score
+                    bestTri = triIndex
+        if bestScore < 1000 :
+            return bestTri
+    return bestTri
+
+#-------------------------------------------------------------------------------
+def _computeBounds(mesh, meshlets) :
+    '''
+    Compute the bounding sphere and the normal cone of each meshlet,
+    zero-area triangles have no meaningful normal and are ignored
+    for the cone
+    '''
+    positions = mesh.getPositionData()[0]
+    faceNormals = mesh.getFaceNormals()
+    zeroAreaTris = set(mesh.getZeroAreaTriangles())
+    indices = mesh.indices
+    for meshlet in meshlets :
+        # bounding sphere around the center of the bounding box
+        xs = [positions[vertexIndex * 3] for vertexIndex in meshlet.vertices]
+        ys = [positions[vertexIndex * 3 + 1] for vertexIndex in meshlet.vertices]
+        zs = [positions[vertexIndex * 3 + 2] for vertexIndex in meshlet.vertices]
+        cx = (min(xs) + max(xs)) * 0.5
+        cy = (min(ys) + max(ys)) * 0.5
+        cz = (min(zs) + max(zs)) * 0.5
+        sqrRadius = max((x - cx) * (x - cx) + (y - cy) * (y - cy) + (z - cz) * (z - cz) for x, y, z in zip(xs, ys, zs))
+        meshlet.center = Vector(cx, cy, cz)
+        meshlet.radius = math.sqrt(sqrRadius)
+
+        # the cone axis is the average face normal, the cutoff the
+        # largest angle to a face normal
+        triRange = [triIndex for triIndex in xrange(meshlet.firstTriangle, meshlet.firstTriangle + meshlet.numTriangles) if triIndex not in zeroAreaTris]
+        ax = ay = az = 0.0
+        for triIndex in triRange :
+            ax += faceNormals[triIndex * 3]
+            ay += faceNormals[triIndex * 3 + 1]
+            az += faceNormals[triIndex * 3 + 2]
+        l = math.sqrt(ax * ax + ay * ay + az * az)
+        if l == 0.0 :
+            continue
+        ax /= l
+        ay /= l
+        az /= l
+        minDot = 1.0
+        for triIndex in triRange :
+            nx, ny, nz = faceNormals[triIndex * 3:triIndex * 3 + 3]
+            minDot = min(minDot, ax * nx + ay * ny + az * nz)
+        meshlet.coneAxis = Vector(ax, ay, az)
+        if minDot <= 0.0 :
+            # the normals spread over more than a hemisphere
+            meshlet.coneCutoff = -1.0
+            continue
+        meshlet.coneCutoff = minDot
+
+        # the apex is on the axis behind the center, behind the
+        # planes of all triangles
+        maxT = 0.0
+        for triIndex in triRange :
+            nx, ny, nz = faceNormals[triIndex * 3:triIndex * 3 + 3]
+            dn = ax * nx + ay * ny + az * nz
+            if dn <= 0.0 :
+                continue
+            i0 = indices[triIndex * 3] * 3
+            dc = (cx - positions[i0]) * nx + (cy - positions[i0 + 1]) * ny + (cz - positions[i0 + 2]) * nz
+            maxT = max(maxT, dc / dn)
+        meshlet.coneApex = Vector(cx - ax * maxT, cy - ay * maxT, cz - az * maxT)
+
+#--- eof
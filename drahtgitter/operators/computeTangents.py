@@ -0,0 +1,193 @@
+'''
+Compute per-vertex tangents ('tangent', 0) and binormals ('binormal', 0)
+from the positions, normals and the first uv set ('texcoord', 0). The
+uv-derived tangent of each triangle is accumulated into its vertices
+and orthogonalized against the vertex normal, the binormal is the cross
+product of normal and tangent, flipped for mirrored uv mappings. A vertex
+shared by triangles with different uv handedness is split. Returns a new
+Model, the components are added to the vertex layout if necessary.
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel) :
+
+    dgLogger.debug('operators.computeTangents: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    srcLayout = srcMesh.vertexLayout
+    pos0 = ('position', 0)
+    norm0 = ('normal', 0)
+    uv0 = ('texcoord', 0)
+    for nameAndIndex in (pos0, norm0, uv0) :
+        if not srcLayout.contains(nameAndIndex) :
+            raise Exception('operators.computeTangents: vertex component {} required!'.format(nameAndIndex))
+
+    numVertices = srcMesh.getNumVertices()
+    indices = srcMesh.indices
+    vertexBuffer = srcMesh.vertexBuffer
+    size = srcLayout.size
+    pOffset = srcLayout.getComponent(pos0).offset
+    uvOffset = srcLayout.getComponent(uv0).offset
+    px = vertexBuffer[pOffset::size]
+    py = vertexBuffer[pOffset + 1::size]
+    pz = vertexBuffer[pOffset + 2::size]
+    us = vertexBuffer[uvOffset::size]
+    vs = vertexBuffer[uvOffset + 1::size]
+
+    # accumulate the triangle tangents, each vertex has a slot for
+    # right-handed (index v) and left-handed (index v + numVertices)
+    # uv mappings
+    tx = [0.0] * (numVertices * 2)
+    ty = [0.0] * (numVertices * 2)
+    tz = [0.0] * (numVertices * 2)
+    slotUsed = [False] * (numVertices * 2)
+    cornerSlots = []
+    for i0, i1, i2 in zip(indices[0::3], indices[1::3], indices[2::3]) :
+        du1 = us[i1] - us[i0]
+        dv1 = vs[i1] - vs[i0]
+        du2 = us[i2] - us[i0]
+        dv2 = vs[i2] - vs[i0]
+        det = du1 * dv2 - du2 * dv1
+        if det == 0.0 :
+            # degenerate uv mapping, doesn't contribute
+            cornerSlots.extend((-1, -1, -1))
+            continue
+        r = 1.0 / det
+        e1x = px[i1] - px[i0]
+        e1y = py[i1] - py[i0]
+        e1z = pz[i1] - pz[i0]
+        e2x = px[i2] - px[i0]
+        e2y = py[i2] - py[i0]
+        e2z = pz[i2] - pz[i0]
+        sx = (e1x * dv2 - e2x * dv1) * r
+        sy = (e1y * dv2 - e2y * dv1) * r
+        sz = (e1z * dv2 - e2z * dv1) * r
+        if det > 0.0 :
+            base = 0
+        else :
+            base = numVertices
+        for vertexIndex in (i0, i1, i2) :
+            slot = base + vertexIndex
+            tx[slot] += sx
+            ty[slot] += sy
+            tz[slot] += sz
+            slotUsed[slot] = True
+            cornerSlots.append(slot)
+
+    # the right-handed slot (or the only used slot) of each vertex stays
+    # in place, a second used slot becomes a new vertex
+    slotVertex = range(0, numVertices) + [-1] * numVertices
+    splitVertices = []
+    for vertexIndex in xrange(0, numVertices) :
+        leftSlot = vertexIndex + numVertices
+        if slotUsed[leftSlot] :
+            if slotUsed[vertexIndex] :
+                slotVertex[leftSlot] = numVertices + len(splitVertices)
+                splitVertices.append(vertexIndex)
+            else :
+                slotVertex[leftSlot] = vertexIndex
+                slotVertex[vertexIndex] = -1
+    slots = [-1] * (numVertices + len(splitVertices))
+    for slot in xrange(0, numVertices * 2) :
+        if slotVertex[slot] != -1 :
+            slots[slotVertex[slot]] = slot
+
+    # build the new vertex buffer, adding the components if needed
+    dstLayout = srcLayout
+    tan0 = ('tangent', 0)
+    binorm0 = ('binormal', 0)
+    if not dstLayout.contains(tan0) or not dstLayout.contains(binorm0) :
+        dstLayout = dstLayout.copy()
+        for nameAndIndex in (tan0, binorm0) :
+            if not dstLayout.contains(nameAndIndex) :
+                dstLayout.add(VertexComponent(nameAndIndex, 3))
+    if splitVertices :
+        dstVertexBuffer = srcMesh.gatherVertices(range(0, numVertices) + splitVertices, dstLayout)
+    else :
+        dstVertexBuffer = srcMesh.gatherVertices(None, dstLayout)
+
+    # orthogonalize the tangents against the normals
+    dstSize = dstLayout.size
+    nOffset = dstLayout.getComponent(norm0).offset
+    nxs = dstVertexBuffer[nOffset::dstSize]
+    nys = dstVertexBuffer[nOffset + 1::dstSize]
+    nzs = dstVertexBuffer[nOffset + 2::dstSize]
+    tangents = ([], [], [])
+    binormals = ([], [], [])
+    for slot in slots :
+        vertexIndex = slotVertex[slot]
+        nx = nxs[vertexIndex]
+        ny = nys[vertexIndex]
+        nz = nzs[vertexIndex]
+        if slotUsed[slot] :
+            x, y, z = _orthogonalize(nx, ny, nz, tx[slot], ty[slot], tz[slot])
+        else :
+            x, y, z = 0.0, 0.0, 0.0
+        if x == 0.0 and y == 0.0 and z == 0.0 :
+            x, y, z = _perpendicular(nx, ny, nz)
+        if slot < numVertices :
+            handedness = 1.0
+        else :
+            handedness = -1.0
+        tangents[0].append(x)
+        tangents[1].append(y)
+        tangents[2].append(z)
+        binormals[0].append((ny * z - nz * y) * handedness)
+        binormals[1].append((nz * x - nx * z) * handedness)
+        binormals[2].append((nx * y - ny * x) * handedness)
+    precision = srcMesh.getPrecision()
+    for nameAndIndex, lanes in ((tan0, tangents), (binorm0, binormals)) :
+        comp = dstLayout.getComponent(nameAndIndex)
+        for i in range(0, min(comp.size, 3)) :
+            dstVertexBuffer[comp.offset + i::dstSize] = array(precision, lanes[i])
+
+    # create a new model, the copy-on-write clone shares the
+    # triangle arrays (unless vertices were split)
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexLayout = dstLayout
+    dstMesh.vertexBuffer = dstVertexBuffer
+    if splitVertices :
+        dgLogger.debug('operators.computeTangents: {} vertices split at uv mirror seams'.format(len(splitVertices)))
+        dstIndices = array(Mesh.IndexType, indices)
+        for corner in xrange(0, len(cornerSlots)) :
+            slot = cornerSlots[corner]
+            if slot >= numVertices :
+                dstIndices[corner] = slotVertex[slot]
+        dstMesh.indices = srcMesh.copyArray(dstIndices)
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+def _orthogonalize(nx, ny, nz, x, y, z) :
+    '''
+    Gram-Schmidt orthogonalize a tangent against a normal and
+    normalize it, returns a null vector if this isn't possible
+    '''
+    d = nx * x + ny * y + nz * z
+    x -= nx * d
+    y -= ny * d
+    z -= nz * d
+    l = math.sqrt(x * x + y * y + z * z)
+    if l < DG_TOLERANCE :
+        return 0.0, 0.0, 0.0
+    return x / l, y / l, z / l
+
+#-------------------------------------------------------------------------------
+def _perpendicular(nx, ny, nz) :
+    '''
+    Return an arbitrary unit vector perpendicular to a normal
+    '''
+    if abs(nx) < 0.9 :
+        x, y, z = 0.0, nz, -ny
+    else :
+        x, y, z = -nz, 0.0, nx
+    l = math.sqrt(x * x + y * y + z * z)
+    if l == 0.0 :
+        return 1.0, 0.0, 0.0
+    return x / l, y / l, z / l
+
+#--- eof
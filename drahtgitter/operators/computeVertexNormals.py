@@ -0,0 +1,211 @@
+'''
+Compute smooth per-vertex normals ('normal', 0) from the triangle
+normals, weighted by the corner angle (Angle) or the triangle area
+(Area). By default the face normals are accumulated per vertex, so
+vertices which are already split in the input (e.g. the faces of a
+cube) keep their hard edges. If a crease angle (in degrees) is given,
+the face normals are accumulated over all vertices with the same
+position, but only faces with a normal within the crease angle of the
+corner's face normal contribute, and vertices are split across the
+hard edges. Returns a new Model, the normal component is added to the
+vertex layout if necessary.
+'''
+
+from ..core import *
+
+Angle = 'angle'
+Area = 'area'
+
+#-------------------------------------------------------------------------------
+def do(srcModel, weighting=Angle, creaseAngle=None) :
+
+    dgLogger.debug('operators.computeVertexNormals: model={} weighting={} creaseAngle={}'.format(srcModel.name, weighting, creaseAngle))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    if weighting != Angle and weighting != Area :
+        raise Exception('Invalid normal weighting {}'.format(weighting))
+
+    numVertices = srcMesh.getNumVertices()
+    numCorners = srcMesh.getNumTriangles() * 3
+    indices = srcMesh.indices
+    positions = srcMesh.getPositionData()[0]
+    px = positions[0::3]
+    py = positions[1::3]
+    pz = positions[2::3]
+
+    # with a crease angle vertices with identical positions are welded,
+    # otherwise each vertex has its own normal
+    if creaseAngle != None :
+        posIds = [0] * numVertices
+        posMap = dict()
+        vertexIndex = 0
+        for pos in zip(px, py, pz) :
+            posIds[vertexIndex] = posMap.setdefault(pos, len(posMap))
+            vertexIndex += 1
+        numPositions = len(posMap)
+        posMap = None
+    else :
+        posIds = range(0, numVertices)
+        numPositions = numVertices
+
+    # the weighted face normal of each triangle corner
+    faceNormals = srcMesh.getFaceNormals()
+    fnx = faceNormals[0::3]
+    fny = faceNormals[1::3]
+    fnz = faceNormals[2::3]
+    weights = _computeCornerWeights(srcMesh, px, py, pz, weighting)
+
+    # accumulate the smooth normal of each position (or vertex)
+    accX = [0.0] * numPositions
+    accY = [0.0] * numPositions
+    accZ = [0.0] * numPositions
+    for corner in xrange(0, numCorners) :
+        w = weights[corner]
+        if w != 0.0 :
+            posId = posIds[indices[corner]]
+            triIndex = corner / 3
+            accX[posId] += w * fnx[triIndex]
+            accY[posId] += w * fny[triIndex]
+            accZ[posId] += w * fnz[triIndex]
+    nx = []
+    ny = []
+    nz = []
+    for posId in posIds :
+        x, y, z = _normalize(accX[posId], accY[posId], accZ[posId])
+        nx.append(x)
+        ny.append(y)
+        nz.append(z)
+
+    # with a crease angle, each corner only sums the faces within the
+    # crease angle, corners with a different set of contributing faces
+    # get their own vertex
+    splitVertices = []
+    dstIndices = None
+    if creaseAngle != None :
+        cosLimit = math.cos(math.radians(creaseAngle))
+        cornersByPos = [[] for posId in xrange(0, numPositions)]
+        for corner in xrange(0, numCorners) :
+            if weights[corner] != 0.0 :
+                cornersByPos[posIds[indices[corner]]].append(corner)
+
+        dstIndices = array(Mesh.IndexType, [0]) * numCorners
+        vertexMap = dict()
+        usedVertices = set()
+        for corner in xrange(0, numCorners) :
+            vertexIndex = indices[corner]
+            triIndex = corner / 3
+            x0 = fnx[triIndex]
+            y0 = fny[triIndex]
+            z0 = fnz[triIndex]
+            faces = []
+            x = y = z = 0.0
+            for other in cornersByPos[posIds[vertexIndex]] :
+                otherTri = other / 3
+                if x0 * fnx[otherTri] + y0 * fny[otherTri] + z0 * fnz[otherTri] >= cosLimit :
+                    faces.append(otherTri)
+                    w = weights[other]
+                    x += w * fnx[otherTri]
+                    y += w * fny[otherTri]
+                    z += w * fnz[otherTri]
+            key = (vertexIndex, tuple(faces))
+            dstIndex = vertexMap.get(key)
+            if dstIndex == None :
+                if x == 0.0 and y == 0.0 and z == 0.0 :
+                    x, y, z = x0, y0, z0
+                x, y, z = _normalize(x, y, z)
+                if vertexIndex not in usedVertices :
+                    # the first normal of a vertex stays in place
+                    dstIndex = vertexIndex
+                    usedVertices.add(vertexIndex)
+                    nx[vertexIndex] = x
+                    ny[vertexIndex] = y
+                    nz[vertexIndex] = z
+                else :
+                    dstIndex = numVertices + len(splitVertices)
+                    splitVertices.append(vertexIndex)
+                    nx.append(x)
+                    ny.append(y)
+                    nz.append(z)
+                vertexMap[key] = dstIndex
+            dstIndices[corner] = dstIndex
+        if splitVertices :
+            dgLogger.debug('operators.computeVertexNormals: {} vertices split at crease edges'.format(len(splitVertices)))
+
+    # build the new vertex buffer, adding a normal component if needed
+    norm0 = ('normal', 0)
+    dstLayout = srcMesh.vertexLayout
+    if not dstLayout.contains(norm0) :
+        dstLayout = dstLayout.copy()
+        dstLayout.add(VertexComponent(norm0, 3))
+    if splitVertices :
+        dstVertexBuffer = srcMesh.gatherVertices(range(0, numVertices) + splitVertices, dstLayout)
+    else :
+        dstVertexBuffer = srcMesh.gatherVertices(None, dstLayout)
+    normComp = dstLayout.getComponent(norm0)
+    lanes = (nx, ny, nz)
+    for i in range(0, min(normComp.size, 3)) :
+        dstVertexBuffer[normComp.offset + i::dstLayout.size] = array(srcMesh.getPrecision(), lanes[i])
+
+    # create a new model, the copy-on-write clone shares the
+    # triangle arrays (unless vertices were split)
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexLayout = dstLayout
+    dstMesh.vertexBuffer = dstVertexBuffer
+    if splitVertices :
+        dstMesh.indices = srcMesh.copyArray(dstIndices)
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+def _computeCornerWeights(mesh, px, py, pz, weighting) :
+    '''
+    Returns the weight of each triangle corner, the corner angle
+    or twice the triangle area, 0.0 for zero-area triangles
+    '''
+    indices = mesh.indices
+    sqrt = math.sqrt
+    acos = math.acos
+    weights = []
+    for i0, i1, i2 in zip(indices[0::3], indices[1::3], indices[2::3]) :
+        ax = px[i1] - px[i0]
+        ay = py[i1] - py[i0]
+        az = pz[i1] - pz[i0]
+        bx = px[i2] - px[i0]
+        by = py[i2] - py[i0]
+        bz = pz[i2] - pz[i0]
+        cx = ay * bz - az * by
+        cy = az * bx - ax * bz
+        cz = ax * by - ay * bx
+        area = sqrt(cx * cx + cy * cy + cz * cz)
+        if area == 0.0 :
+            weights.extend((0.0, 0.0, 0.0))
+        elif weighting == Area :
+            weights.extend((area, area, area))
+        else :
+            # the angles at corner 0 and 1, the third is the remainder
+            ex = px[i2] - px[i1]
+            ey = py[i2] - py[i1]
+            ez = pz[i2] - pz[i1]
+            la = sqrt(ax * ax + ay * ay + az * az)
+            lb = sqrt(bx * bx + by * by + bz * bz)
+            le = sqrt(ex * ex + ey * ey + ez * ez)
+            angle0 = acos(max(-1.0, min(1.0, (ax * bx + ay * by + az * bz) / (la * lb))))
+            angle1 = acos(max(-1.0, min(1.0, -(ax * ex + ay * ey + az * ez) / (la * le))))
+            angle2 = max(0.0, math.pi - angle0 - angle1)
+            weights.extend((angle0, angle1, angle2))
+    return weights
+
+#-------------------------------------------------------------------------------
+def _normalize(x, y, z) :
+    '''
+    Normalize a 3D vector given as floats, a null vector
+    becomes (0.0, 1.0, 0.0)
+    '''
+    l = math.sqrt(x * x + y * y + z * z)
+    if l == 0.0 :
+        return 0.0, 1.0, 0.0
+    return x / l, y / l, z / l
+
+#--- eof
@@ -1,52 +1,197 @@
 '''
 Returns a new Model object with duplicate vertices removed and
 also returns a integer array which maps vertices in the
-source mesh to vertices in the returned mesh. 
+source mesh to vertices in the returned mesh.
 NOTE that the global DG_TOLERANCE variable defines the
-precision with which the equality test is performed!
+precision with which the equality test is performed, unless
+an explicit tolerance is given!
+
+Two welding modes are available:
+Sort: sort the vertices with VertexKeys and merge neighbours,
+      O(n log n) Python-level compares, the resulting vertices
+      are in sorted order
+Hash: quantize the vertices to a grid and find duplicates through
+      a dictionary, O(n), the resulting vertices keep the order
+      of their first occurrence, with a tolerance of 0.0 vertices
+      are compared by their raw bytes
 '''
+import itertools
 from ..core import *
 
+Sort = 'sort'
+Hash = 'hash'
+
+# the hash grid cells are this many times the tolerance, so that
+# only values close to a cell border need to probe the neighbour cell
+CellScale = 16.0
+
 #-------------------------------------------------------------------------------
-def do(srcModel) :
+def do(srcModel, mode=Sort, tolerance=None) :
 
-    dgLogger.debug('operators.deflate: model={}'.format(srcModel.name))
+    dgLogger.debug('operators.deflate: model={} mode={}'.format(srcModel.name, mode))
 
     srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
 
-    # create a sorted key map
-    keyMap = VertexKeyMap(srcMesh)
-    keyMap.sort()
+    if tolerance == None :
+        tolerance = DG_TOLERANCE
+    if mode == Sort :
+        uniqueVertices, outIndexMap = _weldSorted(srcMesh, tolerance)
+    elif mode == Hash :
+        if tolerance == 0.0 :
+            uniqueVertices, outIndexMap = _weldExact(srcMesh)
+        else :
+            uniqueVertices, outIndexMap = _weldHashed(srcMesh, tolerance)
+    else :
+        raise Exception('Invalid deflate mode {}'.format(mode))
 
     # create a new vertex buffer with duplicates removed
-    outIndexMap = [-1] * len(keyMap.keys)
     vertexSize = srcMesh.vertexLayout.size
-    dstVertexBuffer = []
-    lastUniqueIndex = -1
-    curDstVertexIndex = 0
-    for vertexIndex in xrange(0, len(keyMap.keys)):
-        # copy unique vertices and skip duplicate vertices
-        if lastUniqueIndex == -1 or keyMap.keys[vertexIndex] != keyMap.keys[lastUniqueIndex] :
+    srcVertexBuffer = srcMesh.vertexBuffer
+    dstVertexBuffer = srcMesh.createArray(srcMesh.getPrecision())
+    for vertexIndex in uniqueVertices :
+        bufferIndex = vertexIndex * vertexSize
+        dstVertexBuffer.extend(srcVertexBuffer[bufferIndex:bufferIndex + vertexSize])
+
+    # create a new model, the copy-on-write clone shares the
+    # untouched triangle group indices and normals with the source
+    dstModel = srcModel.clone()
+    dstModel.mesh.vertexBuffer = dstVertexBuffer
+
+    # create a new index array for the dst mesh with mapped vertex indices
+    dstModel.mesh.indices = srcMesh.copyArray(array(Mesh.IndexType, [outIndexMap[i] for i in srcMesh.indices]))
+
+    return dstModel, outIndexMap
+
+#-------------------------------------------------------------------------------
+def _weldSorted(srcMesh, tolerance) :
+    '''
+    Returns the source indices of the unique vertices and the
+    index map, using a sorted VertexKeyMap.
+    '''
+    keyMap = VertexKeyMap(srcMesh, tolerance)
+    keyMap.sort()
+
+    keys = keyMap.keys
+    outIndexMap = [-1] * len(keys)
+    uniqueVertices = []
+    lastUniqueKey = None
+    for key in keys :
+        # skip duplicate vertices
+        if lastUniqueKey is None or key != lastUniqueKey :
             # new vertex encountered
-            lastUniqueIndex = vertexIndex
-            # copy the vertex data
-            for valueIndex in range(0, vertexSize) :
-                dstVertexBuffer.append(srcMesh.vertexBuffer[keyMap.keys[vertexIndex].bufferIndex + valueIndex])
-            curDstVertexIndex += 1            
+            lastUniqueKey = key
+            uniqueVertices.append(key.vertexIndex)
 
         # map original vertex index to new vertex index
-        outIndexMap[keyMap.keys[vertexIndex].vertexIndex] = curDstVertexIndex - 1
+        outIndexMap[key.vertexIndex] = len(uniqueVertices) - 1
 
-    # create a new model
-    dstModel = copy.deepcopy(srcModel)
-    dstModel.mesh.vertexBuffer = dstVertexBuffer
+    return uniqueVertices, outIndexMap
 
-    # create a new triangle array for the dst mesh with mapped vertex indices
-    for tri in dstModel.mesh.triangles :
-        tri.vertexIndex0 = outIndexMap[tri.vertexIndex0]
-        tri.vertexIndex1 = outIndexMap[tri.vertexIndex1]
-        tri.vertexIndex2 = outIndexMap[tri.vertexIndex2]
+#-------------------------------------------------------------------------------
+def _weldExact(srcMesh) :
+    '''
+    Welds vertices with identical bytes, the raw bytes of each
+    vertex are the dictionary key.
+    '''
+    vertexBuffer = srcMesh.vertexBuffer
+    if isinstance(vertexBuffer, array) :
+        data = vertexBuffer.tostring()
+    else :
+        data = ''.join(vertexBuffer.chunks())
+    stride = srcMesh.vertexLayout.size * vertexBuffer.itemsize
 
-    return dstModel, outIndexMap
+    numVertices = srcMesh.getNumVertices()
+    outIndexMap = [-1] * numVertices
+    uniqueVertices = []
+    vertexMap = dict()
+    for vertexIndex in xrange(0, numVertices) :
+        key = data[vertexIndex * stride:(vertexIndex + 1) * stride]
+        dstIndex = vertexMap.get(key)
+        if dstIndex == None :
+            dstIndex = len(uniqueVertices)
+            vertexMap[key] = dstIndex
+            uniqueVertices.append(vertexIndex)
+        outIndexMap[vertexIndex] = dstIndex
+
+    return uniqueVertices, outIndexMap
+
+#-------------------------------------------------------------------------------
+def _weldHashed(srcMesh, tolerance) :
+    '''
+    Welds vertices where all components are closer than tolerance. Each
+    vertex is quantized to a grid cell, a vertex is only stored in its
+    own cell, but the neighbour cells are probed for components which
+    are within tolerance of a cell border.
+    '''
+    vertexBuffer = srcMesh.vertexBuffer
+    vertexSize = srcMesh.vertexLayout.size
+    invCellSize = 1.0 / (tolerance * CellScale)
+    border = 1.0 / CellScale
+
+    numVertices = srcMesh.getNumVertices()
+    outIndexMap = [-1] * numVertices
+    uniqueVertices = []
+    uniqueValues = []
+    cells = dict()
+    for vertexIndex in xrange(0, numVertices) :
+        bufferIndex = vertexIndex * vertexSize
+        values = vertexBuffer[bufferIndex:bufferIndex + vertexSize]
+
+        # the half cell offset puts round values (0.0, 0.5, 1.0)
+        # in the middle of a cell
+        cell = []
+        neighbours = []
+        for i in xrange(0, vertexSize) :
+            scaled = values[i] * invCellSize + 0.5
+            c = math.floor(scaled)
+            fraction = scaled - c
+            cell.append(int(c))
+            if fraction < border :
+                neighbours.append((i, -1))
+            elif fraction > 1.0 - border :
+                neighbours.append((i, 1))
+        cell = tuple(cell)
+
+        dstIndex = _findInCell(cells.get(cell), uniqueValues, values, tolerance)
+        if dstIndex == None and neighbours :
+            for num in xrange(1, len(neighbours) + 1) :
+                for combination in itertools.combinations(neighbours, num) :
+                    probe = list(cell)
+                    for i, offset in combination :
+                        probe[i] += offset
+                    dstIndex = _findInCell(cells.get(tuple(probe)), uniqueValues, values, tolerance)
+                    if dstIndex != None :
+                        break
+                if dstIndex != None :
+                    break
+
+        if dstIndex == None :
+            dstIndex = len(uniqueVertices)
+            uniqueVertices.append(vertexIndex)
+            uniqueValues.append(values)
+            cells.setdefault(cell, []).append(dstIndex)
+        outIndexMap[vertexIndex] = dstIndex
+
+    return uniqueVertices, outIndexMap
+
+#-------------------------------------------------------------------------------
+def _findInCell(cellIndices, uniqueValues, values, tolerance) :
+    '''
+    Returns the first unique vertex in the cell which is equal
+    to values within tolerance, or None.
+    '''
+    if cellIndices == None :
+        return None
+    for dstIndex in cellIndices :
+        other = uniqueValues[dstIndex]
+        i = 0
+        for value in values :
+            if value != other[i] and abs(value - other[i]) >= tolerance :
+                break
+            i += 1
+        else :
+            return dstIndex
+    return None
 
-#--- eof
\ No newline at end of file
+#--- eof
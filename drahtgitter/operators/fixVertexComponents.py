@@ -13,6 +13,7 @@ def do(srcModel, dstVertexLayout) :
     # one entry per float, -1 for new components (will be
     # filled with 0.0)
     srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
     srcVertexLayout = srcMesh.vertexLayout
     mapping = []
     for dstComp in dstVertexLayout.vertexComponents.values() :
@@ -34,21 +35,19 @@ def do(srcModel, dstVertexLayout) :
     # and -1 for each new float (will be set to 0.0)
     # copy over old values, and fill new values to 0.0
     numVertices  = srcMesh.getNumVertices()
-    numTriangles = srcMesh.getNumTriangles()
-    dstMesh = Mesh(dstVertexLayout, numVertices, numTriangles)
+    dstVertexBuffer = srcMesh.createArray(srcMesh.getPrecision(), numVertices * dstVertexLayout.size)
     for vertexIndex in xrange(0, numVertices) :
         for mapIndex in range(0, len(mapping)) :
             dstIndex = vertexIndex * dstVertexLayout.size + mapIndex
             if mapping[mapIndex] >= 0 :
                 srcIndex = vertexIndex * srcVertexLayout.size + mapping[mapIndex]
-                dstMesh.vertexBuffer[dstIndex] = srcMesh.vertexBuffer[srcIndex]
-            else :
-                dstMesh.vertexBuffer[dstIndex] = 0.0
-    dstMesh.triangles = copy.deepcopy(srcMesh.triangles)
-
-    # create a new Model
-    dstModel = copy.deepcopy(srcModel)
-    dstModel.mesh = dstMesh
+                dstVertexBuffer[dstIndex] = srcMesh.vertexBuffer[srcIndex]
+
+    # create a new Model, the copy-on-write clone shares the 
+    # triangle arrays and materials with the source model
+    dstModel = srcModel.clone()
+    dstModel.mesh.vertexLayout = dstVertexLayout
+    dstModel.mesh.vertexBuffer = dstVertexBuffer
 
     return dstModel
 
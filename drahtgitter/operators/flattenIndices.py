@@ -0,0 +1,86 @@
+'''
+Convert a multi-indexed Model (one separately indexed stream per
+vertex component) into a single-indexed Model with interleaved
+vertices. Each unique combination of stream indices becomes one
+vertex, so no float compares are necessary. Returns the source
+model if it isn't multi-indexed.
+'''
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel) :
+
+    dgLogger.debug('operators.flattenIndices: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    if not srcMesh.isMultiIndexed() :
+        return srcModel
+
+    # gather the streams in vertex layout order
+    vertexLayout = srcMesh.vertexLayout
+    comps = sorted(vertexLayout.vertexComponents.values(), key=lambda comp: comp.offset)
+    streams = []
+    for comp in comps :
+        stream = srcMesh.getStream(comp.nameAndIndex)
+        if stream == None :
+            raise Exception('Vertex component {} has no stream!'.format(comp.nameAndIndex))
+        streams.append(stream)
+
+    # map each unique tuple of stream indices to a new vertex
+    numCorners = srcMesh.getNumTriangles() * 3
+    indices = array(Mesh.IndexType, [0]) * numCorners
+    vertexMap = dict()
+    uniqueKeys = []
+    corner = 0
+    for key in zip(*[stream.indices for stream in streams]) :
+        vertexIndex = vertexMap.get(key)
+        if vertexIndex == None :
+            vertexIndex = len(uniqueKeys)
+            vertexMap[key] = vertexIndex
+            uniqueKeys.append(key)
+        indices[corner] = vertexIndex
+        corner += 1
+
+    # build the interleaved vertex buffer, one strided copy per float
+    vertexSize = vertexLayout.size
+    precision = srcMesh.getPrecision()
+    vertexBuffer = srcMesh.createArray(precision, len(uniqueKeys) * vertexSize)
+    for streamIndex in range(0, len(streams)) :
+        comp = comps[streamIndex]
+        stream = streams[streamIndex]
+        valueIndices = [key[streamIndex] * comp.size for key in uniqueKeys]
+        for i in range(0, comp.size) :
+            values = stream.values
+            vertexBuffer[comp.offset + i::vertexSize] = array(precision, [values[valueIndex + i] for valueIndex in valueIndices])
+
+    # create the new model, triangle group indices and normals are shared
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexBuffer = vertexBuffer
+    dstMesh.indices = srcMesh.copyArray(indices)
+    dstMesh.streams = dict()
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+def extractStream(srcModel, nameAndIndex) :
+    '''
+    Returns a single-indexed Model with only the given vertex component
+    from one stream of a multi-indexed model, the stream values become
+    the vertices (not deduplicated).
+    '''
+    srcMesh = srcModel.mesh
+    stream = srcMesh.getStream(nameAndIndex)
+    if stream == None :
+        raise Exception('Vertex component {} has no stream!'.format(nameAndIndex))
+    vertexLayout = VertexLayout()
+    vertexLayout.add(VertexComponent(nameAndIndex, stream.size))
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexLayout = vertexLayout
+    dstMesh.shareArray('vertexBuffer', stream.values)
+    dstMesh.shareArray('indices', stream.indices)
+    dstMesh.streams = dict()
+    return dstModel
+
+#--- eof
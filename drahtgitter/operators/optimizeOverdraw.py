@@ -0,0 +1,181 @@
+'''
+Reorder the triangles within each triangle group (material) to reduce
+overdraw, following the cluster sorting of "Fast Triangle Reordering for
+Vertex Locality and Reduced Overdraw" (Sander, Nehab, Barczak 2007,
+Tipsify). Run this after optimizeVertexCache: the current triangle order
+of each group is split into clusters where the vertex cache restarts
+(hard boundaries) and where the cache miss ratio of the cluster so far
+is within threshold times the miss ratio of the enclosing hard cluster
+(soft boundaries). The clusters are then sorted front-to-back by their
+view-independent occlusion potential, the distance of the cluster
+centroid from the mesh centroid along the cluster normal. A higher
+threshold gives smaller clusters (less overdraw, worse vertex cache
+efficiency). The vertex data isn't changed. Returns a new Model.
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel, threshold=1.05, cacheSize=32) :
+
+    dgLogger.debug('operators.optimizeOverdraw: model={} threshold={}'.format(srcModel.name, threshold))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    if threshold < 1.0 :
+        raise Exception('Overdraw threshold must be >= 1.0!')
+
+    # gather the triangle slots of each group
+    groupSlots = dict()
+    triIndex = 0
+    for groupIndex in srcMesh.groupIndices :
+        groupSlots.setdefault(groupIndex, []).append(triIndex)
+        triIndex += 1
+
+    positions, indices = srcMesh.getPositionData()
+    order = [0] * srcMesh.getNumTriangles()
+    numClusters = 0
+    for groupIndex in sorted(groupSlots.keys()) :
+        tris = groupSlots[groupIndex]
+        clusters = _buildClusters(indices, tris, threshold, cacheSize)
+        clusters = _sortClusters(positions, indices, tris, clusters)
+        numClusters += len(clusters)
+        slotIndex = 0
+        for start, end in clusters :
+            for triIndex in tris[start:end] :
+                order[tris[slotIndex]] = triIndex
+                slotIndex += 1
+    dgLogger.debug('operators.optimizeOverdraw: {} clusters'.format(numClusters))
+
+    dstModel = srcModel.clone()
+    dstModel.mesh.reorderTriangles(order)
+    dgLogger.info('operators.optimizeOverdraw: model={} ACMR {:.3f} -> {:.3f}'.format(srcModel.name, srcMesh.getACMR(cacheSize), dstModel.mesh.getACMR(cacheSize)))
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+def _countMisses(indices, triIndex, fifo, inCache, head) :
+    '''
+    Feed the vertices of a triangle into a simulated FIFO cache, returns
+    the number of cache misses and the new head position
+    '''
+    misses = 0
+    cacheSize = len(fifo)
+    for vertexIndex in indices[triIndex * 3:triIndex * 3 + 3] :
+        if vertexIndex not in inCache :
+            misses += 1
+            inCache.discard(fifo[head])
+            fifo[head] = vertexIndex
+            inCache.add(vertexIndex)
+            head = (head + 1) % cacheSize
+    return misses, head
+
+#-------------------------------------------------------------------------------
+def _buildClusters(indices, tris, threshold, cacheSize) :
+    '''
+    Split the triangles into clusters, returns a list of
+    (start, end) ranges into tris
+    '''
+    # hard boundaries: the cache misses all 3 vertices
+    hardBoundaries = []
+    fifo = [-1] * cacheSize
+    inCache = set()
+    head = 0
+    for i in xrange(0, len(tris)) :
+        misses, head = _countMisses(indices, tris[i], fifo, inCache, head)
+        if misses == 3 :
+            hardBoundaries.append(i)
+    hardBoundaries.append(len(tris))
+
+    # soft boundaries: split where the cluster's ACMR is good enough,
+    # the cache is assumed to be cold at the start of each cluster
+    clusters = []
+    for hardIndex in xrange(0, len(hardBoundaries) - 1) :
+        hardStart = hardBoundaries[hardIndex]
+        hardEnd = hardBoundaries[hardIndex + 1]
+        fifo = [-1] * cacheSize
+        inCache = set()
+        head = 0
+        hardMisses = 0
+        for i in xrange(hardStart, hardEnd) :
+            misses, head = _countMisses(indices, tris[i], fifo, inCache, head)
+            hardMisses += misses
+        limit = threshold * hardMisses / (hardEnd - hardStart)
+
+        start = hardStart
+        fifo = [-1] * cacheSize
+        inCache = set()
+        head = 0
+        clusterMisses = 0
+        for i in xrange(hardStart, hardEnd) :
+            misses, head = _countMisses(indices, tris[i], fifo, inCache, head)
+            clusterMisses += misses
+            if i + 1 < hardEnd and float(clusterMisses) / (i + 1 - start) <= limit :
+                clusters.append((start, i + 1))
+                start = i + 1
+                fifo = [-1] * cacheSize
+                inCache = set()
+                head = 0
+                clusterMisses = 0
+        clusters.append((start, hardEnd))
+    return clusters
+
+#-------------------------------------------------------------------------------
+def _sortClusters(positions, indices, tris, clusters) :
+    '''
+    Sort the clusters by descending occlusion potential
+    '''
+    # the mesh centroid (of the group's triangle corners)
+    mx = my = mz = 0.0
+    for triIndex in tris :
+        for vertexIndex in indices[triIndex * 3:triIndex * 3 + 3] :
+            mx += positions[vertexIndex * 3]
+            my += positions[vertexIndex * 3 + 1]
+            mz += positions[vertexIndex * 3 + 2]
+    numCorners = len(tris) * 3
+    mx /= numCorners
+    my /= numCorners
+    mz /= numCorners
+
+    # the area-weighted centroid and normal of each cluster
+    keys = []
+    for start, end in clusters :
+        cx = cy = cz = 0.0
+        nx = ny = nz = 0.0
+        area = 0.0
+        for triIndex in tris[start:end] :
+            i0 = indices[triIndex * 3] * 3
+            i1 = indices[triIndex * 3 + 1] * 3
+            i2 = indices[triIndex * 3 + 2] * 3
+            x0, y0, z0 = positions[i0], positions[i0 + 1], positions[i0 + 2]
+            x1, y1, z1 = positions[i1], positions[i1 + 1], positions[i1 + 2]
+            x2, y2, z2 = positions[i2], positions[i2 + 1], positions[i2 + 2]
+            ax, ay, az = x1 - x0, y1 - y0, z1 - z0
+            bx, by, bz = x2 - x0, y2 - y0, z2 - z0
+            crossX = ay * bz - az * by
+            crossY = az * bx - ax * bz
+            crossZ = ax * by - ay * bx
+            triArea = math.sqrt(crossX * crossX + crossY * crossY + crossZ * crossZ)
+            cx += (x0 + x1 + x2) * triArea
+            cy += (y0 + y1 + y2) * triArea
+            cz += (z0 + z1 + z2) * triArea
+            nx += crossX
+            ny += crossY
+            nz += crossZ
+            area += triArea
+        if area == 0.0 :
+            keys.append(0.0)
+            continue
+        cx /= area * 3.0
+        cy /= area * 3.0
+        cz /= area * 3.0
+        l = math.sqrt(nx * nx + ny * ny + nz * nz)
+        if l == 0.0 :
+            keys.append(0.0)
+            continue
+        keys.append(((cx - mx) * nx + (cy - my) * ny + (cz - mz) * nz) / l)
+
+    clusterOrder = sorted(xrange(0, len(clusters)), key=lambda clusterIndex: -keys[clusterIndex])
+    return [clusters[clusterIndex] for clusterIndex in clusterOrder]
+
+#--- eof
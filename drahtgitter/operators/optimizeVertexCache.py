@@ -0,0 +1,182 @@
+'''
+Reorder the triangles within each triangle group (material) for
+post-transform vertex cache efficiency, using Tom Forsyth's "Linear-Speed
+Vertex Cache Optimisation" algorithm: vertices are scored by their
+position in a simulated LRU cache and by the number of triangles still
+using them, and the highest scoring triangle of the vertices in the cache
+is emitted next. The triangles of each group keep their slots in the
+triangle list, so the group structure doesn't change. Returns a new Model
+and logs the ACMR (average cache miss ratio) before and after.
+'''
+
+from ..core import *
+
+# the scoring parameters from Forsyth's article
+CacheDecayPower = 1.5
+LastTriScore = 0.75
+ValenceBoostScale = 2.0
+ValenceBoostPower = 0.5
+
+#-------------------------------------------------------------------------------
+def do(srcModel, cacheSize=32) :
+
+    dgLogger.debug('operators.optimizeVertexCache: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    if cacheSize < 4 :
+        raise Exception('Vertex cache size must be at least 4!')
+
+    # gather the triangle slots of each group
+    groupSlots = dict()
+    triIndex = 0
+    for groupIndex in srcMesh.groupIndices :
+        groupSlots.setdefault(groupIndex, []).append(triIndex)
+        triIndex += 1
+
+    optimizer = _Optimizer(srcMesh, cacheSize)
+    order = [0] * srcMesh.getNumTriangles()
+    for groupIndex in sorted(groupSlots.keys()) :
+        slots = groupSlots[groupIndex]
+        for slot, triIndex in zip(slots, optimizer.optimize(slots)) :
+            order[slot] = triIndex
+
+    dstModel = srcModel.clone()
+    dstModel.mesh.reorderTriangles(order)
+    dgLogger.info('operators.optimizeVertexCache: model={} ACMR {:.3f} -> {:.3f}'.format(srcModel.name, srcMesh.getACMR(cacheSize), dstModel.mesh.getACMR(cacheSize)))
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+class _Optimizer :
+    '''
+    Holds the per-vertex and per-triangle state of the optimization,
+    the arrays are sized for the whole mesh and reused for each group.
+    '''
+    def __init__(self, mesh, cacheSize) :
+        self.cacheSize = cacheSize
+        self.indices = mesh.indices
+        numVertices = mesh.getNumVertices()
+        numTriangles = mesh.getNumTriangles()
+        self.vertexTris = [None] * numVertices
+        # cacheSize means 'not in the cache'
+        self.cachePos = [cacheSize] * numVertices
+        self.vertexScore = [0.0] * numVertices
+        self.triScore = [0.0] * numTriangles
+        self.emitted = bytearray(numTriangles)
+
+        # precomputed score tables, indexed by cache position (with
+        # a 0.0 entry for vertices outside of the cache) and by the
+        # number of remaining triangles
+        self.cacheScores = [0.0] * (cacheSize + 1)
+        for pos in range(0, cacheSize) :
+            if pos < 3 :
+                self.cacheScores[pos] = LastTriScore
+            else :
+                self.cacheScores[pos] = (1.0 - float(pos - 3) / (cacheSize - 3)) ** CacheDecayPower
+        self.valenceScores = [0.0]
+
+    def _growValenceScores(self, maxValence) :
+        '''
+        Extend the valence score table up to maxValence
+        '''
+        for valence in range(len(self.valenceScores), maxValence + 1) :
+            self.valenceScores.append(ValenceBoostScale * (valence ** -ValenceBoostPower))
+
+    def optimize(self, tris) :
+        '''
+        Returns the triangles (indices into the mesh) in optimized order
+        '''
+        indices = self.indices
+        vertexTris = self.vertexTris
+        cachePos = self.cachePos
+        vertexScore = self.vertexScore
+        triScore = self.triScore
+        emitted = self.emitted
+        cacheSize = self.cacheSize
+        cacheScores = self.cacheScores
+        getTriScore = triScore.__getitem__
+
+        # build the vertex-triangle adjacency and the initial scores,
+        # the adjacency lists only hold the remaining triangles
+        vertices = []
+        for triIndex in tris :
+            for vertexIndex in indices[triIndex * 3:triIndex * 3 + 3] :
+                if vertexTris[vertexIndex] == None :
+                    vertexTris[vertexIndex] = []
+                    vertices.append(vertexIndex)
+                vertexTris[vertexIndex].append(triIndex)
+        self._growValenceScores(max(len(vertexTris[vertexIndex]) for vertexIndex in vertices) if vertices else 0)
+        valenceScores = self.valenceScores
+        for vertexIndex in vertices :
+            vertexScore[vertexIndex] = valenceScores[len(vertexTris[vertexIndex])]
+        for triIndex in tris :
+            i = triIndex * 3
+            triScore[triIndex] = vertexScore[indices[i]] + vertexScore[indices[i + 1]] + vertexScore[indices[i + 2]]
+
+        result = []
+        cache = []
+        scanPos = 0
+        bestTri = -1
+        while len(result) < len(tris) :
+            if bestTri == -1 :
+                # no candidate in the cache, continue with the next
+                # triangle which hasn't been emitted yet
+                while emitted[tris[scanPos]] :
+                    scanPos += 1
+                bestTri = tris[scanPos]
+
+            # emit the triangle
+            result.append(bestTri)
+            emitted[bestTri] = 1
+            i = bestTri * 3
+            a = indices[i]
+            b = indices[i + 1]
+            c = indices[i + 2]
+            vertexTris[a].remove(bestTri)
+            vertexTris[b].remove(bestTri)
+            vertexTris[c].remove(bestTri)
+
+            # move the triangle's vertices to the front of the LRU cache,
+            # their cache positions are known, so no search is needed
+            corners = [a]
+            if b != a :
+                corners.append(b)
+            if c != a and c != b :
+                corners.append(c)
+            numCorners = len(corners)
+            for pos in sorted((cachePos[vertexIndex] for vertexIndex in corners), reverse=True) :
+                if pos < cacheSize :
+                    del cache[pos]
+            cache = corners + cache
+
+            # only rescore vertices whose cache position or number of
+            # remaining triangles changed, vertices pushed out of the
+            # cache get the cacheSize position
+            pos = 0
+            for vertexIndex in cache :
+                if pos < numCorners or cachePos[vertexIndex] != pos :
+                    newPos = pos if pos < cacheSize else cacheSize
+                    cachePos[vertexIndex] = newPos
+                    liveTris = vertexTris[vertexIndex]
+                    if liveTris :
+                        score = valenceScores[len(liveTris)] + cacheScores[newPos]
+                        delta = score - vertexScore[vertexIndex]
+                        vertexScore[vertexIndex] = score
+                        for triIndex in liveTris :
+                            triScore[triIndex] += delta
+                pos += 1
+            del cache[cacheSize:]
+
+            # the best remaining triangle using a vertex in the cache is next
+            candidates = [triIndex for vertexIndex in cache for triIndex in vertexTris[vertexIndex]]
+            bestTri = max(candidates, key=getTriScore) if candidates else -1
+
+        # reset the per-vertex state for the next group
+        for vertexIndex in cache :
+            cachePos[vertexIndex] = cacheSize
+        for vertexIndex in vertices :
+            vertexTris[vertexIndex] = None
+        return result
+
+#--- eof
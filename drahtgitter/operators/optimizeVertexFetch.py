@@ -0,0 +1,46 @@
+'''
+Renumber the vertices of a Model in the order of their first reference
+by a triangle and drop vertices which aren't referenced by any triangle
+(for instance after removeDegenerateTriangles), this improves the
+locality of GPU vertex fetches. Run this after the triangle order has
+been optimized. Returns a new Model and a list which maps vertices in
+the source mesh to vertices in the returned mesh (-1 for vertices
+which have been dropped).
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel) :
+
+    dgLogger.debug('operators.optimizeVertexFetch: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+
+    # assign new vertex indices in first reference order
+    outIndexMap = [-1] * srcMesh.getNumVertices()
+    vertexOrder = []
+    dstIndices = array(Mesh.IndexType, [0]) * len(srcMesh.indices)
+    corner = 0
+    for vertexIndex in srcMesh.indices :
+        dstIndex = outIndexMap[vertexIndex]
+        if dstIndex == -1 :
+            dstIndex = len(vertexOrder)
+            outIndexMap[vertexIndex] = dstIndex
+            vertexOrder.append(vertexIndex)
+        dstIndices[corner] = dstIndex
+        corner += 1
+    numDropped = srcMesh.getNumVertices() - len(vertexOrder)
+    if numDropped > 0 :
+        dgLogger.debug('operators.optimizeVertexFetch: {} unreferenced vertices removed'.format(numDropped))
+
+    # create a new model, the copy-on-write clone shares the
+    # triangle group indices and normals with the source
+    dstModel = srcModel.clone()
+    dstModel.mesh.vertexBuffer = srcMesh.gatherVertices(vertexOrder)
+    dstModel.mesh.indices = srcMesh.copyArray(dstIndices)
+
+    return dstModel, outIndexMap
+
+#--- eof
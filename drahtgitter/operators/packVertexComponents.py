@@ -0,0 +1,48 @@
+'''
+Set the packed formats of vertex components (see VertexComponent), e.g.
+octahedral SNORM16 normals and tangents, half-float uvs and UNORM8
+colors. formats is a dictionary of nameAndIndex to format, components
+which aren't in the vertex layout are ignored and VertexComponent.Float
+unpacks a component. The data of the packed components is quantized
+(packed and unpacked, a whole component at once), so their floats in
+the resulting Model are exactly the values written by
+Mesh.packVertices(). Returns a new Model.
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel, formats) :
+
+    dgLogger.debug('operators.packVertexComponents: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    srcLayout = srcMesh.vertexLayout
+
+    dstLayout = srcLayout.copy()
+    for nameAndIndex, format in formats.items() :
+        comp = dstLayout.getComponent(nameAndIndex)
+        if comp != None :
+            comp.format = format
+            comp.validate()
+
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexLayout = dstLayout
+    packedComps = [comp for comp in dstLayout.vertexComponents.values() if comp.format != VertexComponent.Float]
+    if packedComps and dstMesh.getNumVertices() > 0 :
+        vertexBuffer = srcMesh.copyArray(srcMesh.vertexBuffer)
+        precision = srcMesh.getPrecision()
+        for comp in packedComps :
+            lanes = [vertexBuffer[comp.offset + i::dstLayout.size] for i in range(0, comp.size)]
+            lanes = unpackComponentData(packComponentData(lanes, comp.format), comp.size, comp.format)
+            for i in range(0, comp.size) :
+                vertexBuffer[comp.offset + i::dstLayout.size] = array(precision, lanes[i])
+        dstMesh.vertexBuffer = vertexBuffer
+
+    dgLogger.info('operators.packVertexComponents: model={} vertex size {} -> {} bytes'.format(srcModel.name, srcLayout.getPackedSize(), dstLayout.getPackedSize()))
+
+    return dstModel
+
+#--- eof
@@ -9,9 +9,10 @@ def do(model) :
 
     dgLogger.debug('operators.randomMaterialColors: model={}'.format(model.name))
 
+    model.ownMaterials()
     for mat in model.materials :
-        if mat.hasParam('Diffuse') :
-            val = mat.get('Diffuse')
+        val = mat.get('Diffuse')
+        if val != None :
             val.x = random.uniform(0.5, 1.0)
             val.y = random.uniform(0.5, 1.0)
             val.z = random.uniform(0.5, 1.0)
@@ -0,0 +1,990 @@
+'''
+Simplify a Model to a target triangle count and/or a maximum error with
+quadric error metrics (Garland and Heckbert, "Surface Simplification
+Using Quadric Error Metrics"). Edges are collapsed in order of their
+error through a priority queue, or with numpy in passes of independent
+collapses over the whole mesh. The collapses are half-edge collapses (a
+vertex is merged into a neighbouring vertex which doesn't move), so the
+vertex attributes (normals, uvs, ...) of the remaining vertices stay
+valid.
+
+Vertices at the same position are handled together. Edges where the
+two sides reference different vertices (attribute seams, e.g. hard
+normals or uv borders), where the triangle groups (materials) differ,
+or which only have one triangle (mesh borders) are boundary edges: a
+position with 2 boundary edges may only be collapsed along them, and
+positions with more (corners) are locked. Boundary edges get additional
+quadrics which keep them in place.
+
+The error is measured as distance (the square root of the quadric
+error, the summed squared distances to the original planes). Returns a
+new Model.
+'''
+
+import heapq
+from ..core import *
+
+# the weight of the boundary edge quadrics
+BoundaryWeight = 10.0
+
+# the maximum number of selection rounds of a collapse pass
+MaxSelectRounds = 8
+
+# the priority of positions without a collapse
+_NoPriority = 1 << 32
+
+# position kinds
+_Interior = 0
+_Boundary = 1
+_Locked = 2
+
+#-------------------------------------------------------------------------------
+def do(srcModel, targetTriangles=None, maxError=None) :
+
+    dgLogger.debug('operators.simplify: model={} targetTriangles={} maxError={}'.format(srcModel.name, targetTriangles, maxError))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    if targetTriangles == None and maxError == None :
+        raise Exception('operators.simplify: targetTriangles or maxError required!')
+
+    if numpy is not None :
+        simplifier = _BatchSimplifier(srcMesh)
+    else :
+        simplifier = _Simplifier(srcMesh)
+    maxCost = None
+    if maxError != None :
+        maxCost = maxError * maxError
+    simplifier.run(targetTriangles or 0, maxCost)
+
+    # build the new triangle arrays and drop unreferenced vertices
+    corners = simplifier.corners
+    alive = simplifier.alive
+    vertexMap = [-1] * srcMesh.getNumVertices()
+    vertexOrder = []
+    dstIndices = array(Mesh.IndexType)
+    dstGroupIndices = array(Mesh.IndexType)
+    for triIndex in xrange(0, srcMesh.getNumTriangles()) :
+        if alive[triIndex] :
+            for vertexIndex in corners[triIndex * 3:triIndex * 3 + 3] :
+                if vertexMap[vertexIndex] == -1 :
+                    vertexMap[vertexIndex] = len(vertexOrder)
+                    vertexOrder.append(vertexIndex)
+                dstIndices.append(vertexMap[vertexIndex])
+            dstGroupIndices.append(srcMesh.groupIndices[triIndex])
+
+    dstModel = srcModel.clone()
+    dstMesh = dstModel.mesh
+    dstMesh.vertexBuffer = srcMesh.gatherVertices(vertexOrder)
+    dstMesh.indices = srcMesh.copyArray(dstIndices)
+    dstMesh.groupIndices = srcMesh.copyArray(dstGroupIndices)
+    if srcMesh.triangleNormals is not None :
+        dstMesh.triangleNormals = dstMesh.copyArray(dstMesh.getFaceNormals())
+
+    dgLogger.info('operators.simplify: model={} triangles {} -> {}, vertices {} -> {}, error {:.6f}'.format(
+        srcModel.name, srcMesh.getNumTriangles(), dstMesh.getNumTriangles(),
+        srcMesh.getNumVertices(), dstMesh.getNumVertices(), math.sqrt(simplifier.maxCost)))
+
+    return dstModel
+
+#-------------------------------------------------------------------------------
+def _planeQuadric(a, b, c, d, w) :
+    '''
+    Return the quadric (10 floats) of the plane ax + by + cz + d = 0
+    '''
+    return [w * a * a, w * a * b, w * a * c, w * a * d,
+            w * b * b, w * b * c, w * b * d,
+            w * c * c, w * c * d,
+            w * d * d]
+
+#-------------------------------------------------------------------------------
+def _addQuadric(q, other) :
+    for i in range(0, 10) :
+        q[i] += other[i]
+
+#-------------------------------------------------------------------------------
+def _evalQuadric(q, x, y, z) :
+    '''
+    Return the quadric error at a point
+    '''
+    return (q[0] * x * x + 2.0 * q[1] * x * y + 2.0 * q[2] * x * z + 2.0 * q[3] * x +
+            q[4] * y * y + 2.0 * q[5] * y * z + 2.0 * q[6] * y +
+            q[7] * z * z + 2.0 * q[8] * z +
+            q[9])
+
+#-------------------------------------------------------------------------------
+def _evalQuadrics(q, px, py, pz, candidates) :
+    '''
+    Return a list of (error, posId) of the quadric at the candidate
+    positions
+    '''
+    q0, q1, q2, q3, q4, q5, q6, q7, q8, q9 = q
+    return [(q0 * px[v] * px[v] + 2.0 * q1 * px[v] * py[v] + 2.0 * q2 * px[v] * pz[v] + 2.0 * q3 * px[v] +
+             q4 * py[v] * py[v] + 2.0 * q5 * py[v] * pz[v] + 2.0 * q6 * py[v] +
+             q7 * pz[v] * pz[v] + 2.0 * q8 * pz[v] +
+             q9, v) for v in candidates]
+
+#-------------------------------------------------------------------------------
+class _Simplifier :
+    '''
+    The state of the simplification: the triangle corners (vertex
+    indices) and their positions (vertices at the same position share
+    a position index), and the triangles, quadric and kind of each
+    position.
+    '''
+    def __init__(self, mesh) :
+        self.corners = corners = list(mesh.indices)
+        numTriangles = mesh.getNumTriangles()
+        self.numAlive = numTriangles
+        self.maxCost = 0.0
+        self.alive = alive = [True] * numTriangles
+
+        # weld the vertex positions
+        positions = mesh.getPositionData()[0]
+        posMap = dict()
+        posIds = []
+        px = self.px = []
+        py = self.py = []
+        pz = self.pz = []
+        for pos in zip(positions[0::3], positions[1::3], positions[2::3]) :
+            posId = posMap.get(pos)
+            if posId == None :
+                posId = len(posMap)
+                posMap[pos] = posId
+                px.append(pos[0])
+                py.append(pos[1])
+                pz.append(pos[2])
+            posIds.append(posId)
+        numPositions = len(posMap)
+        posMap = None
+        self.dead = [False] * numPositions
+
+        # the position of each triangle corner, and the triangles of each
+        # position, triangles with 2 corners at the same position are
+        # ignored (they have no area)
+        cornerPos = self.cornerPos = [posIds[vertexIndex] for vertexIndex in corners]
+        posTris = self.posTris = [[] for posId in xrange(0, numPositions)]
+        triIndex = 0
+        for p0, p1, p2 in zip(cornerPos[0::3], cornerPos[1::3], cornerPos[2::3]) :
+            if p0 == p1 or p1 == p2 or p0 == p2 :
+                alive[triIndex] = False
+                self.numAlive -= 1
+            else :
+                posTris[p0].append(triIndex)
+                posTris[p1].append(triIndex)
+                posTris[p2].append(triIndex)
+            triIndex += 1
+
+        # the triangles and the vertex pair of each edge, keyed by
+        # the position pair
+        edgeTris = dict()
+        for triIndex in xrange(0, numTriangles) :
+            if alive[triIndex] :
+                i = triIndex * 3
+                for k0, k1 in ((i, i + 1), (i + 1, i + 2), (i + 2, i)) :
+                    pa = cornerPos[k0]
+                    pb = cornerPos[k1]
+                    if pa < pb :
+                        edgeTris.setdefault(pa * numPositions + pb, []).append((triIndex, corners[k0], corners[k1]))
+                    else :
+                        edgeTris.setdefault(pb * numPositions + pa, []).append((triIndex, corners[k1], corners[k0]))
+
+        # find the boundary edges (mesh borders, attribute seams and
+        # triangle group borders), non-manifold edges are locked
+        locked = [False] * numPositions
+        boundaryNeighbours = self.boundaryNeighbours = [[] for posId in xrange(0, numPositions)]
+        groupIndices = mesh.groupIndices
+        edges = []
+        boundaryEdges = []
+        for key, tris in edgeTris.iteritems() :
+            pa = key // numPositions
+            pb = key % numPositions
+            edges.append((pa, pb))
+            if len(tris) > 2 :
+                locked[pa] = True
+                locked[pb] = True
+                continue
+            isBoundary = len(tris) == 1
+            if not isBoundary :
+                t0, t1 = tris
+                isBoundary = groupIndices[t0[0]] != groupIndices[t1[0]] or t0[1:] != t1[1:]
+            if isBoundary :
+                boundaryNeighbours[pa].append(pb)
+                boundaryNeighbours[pb].append(pa)
+                boundaryEdges.append((pa, pb, tris[0][0]))
+        edgeTris = None
+
+        # positions with more than one referenced vertex
+        firstVertex = [-1] * numPositions
+        multiVertex = [False] * numPositions
+        for triIndex in xrange(0, numTriangles) :
+            if alive[triIndex] :
+                for k in xrange(triIndex * 3, triIndex * 3 + 3) :
+                    posId = cornerPos[k]
+                    if firstVertex[posId] == -1 :
+                        firstVertex[posId] = corners[k]
+                    elif firstVertex[posId] != corners[k] :
+                        multiVertex[posId] = True
+
+        kind = self.kind = [_Interior] * numPositions
+        for posId in xrange(0, numPositions) :
+            numBoundary = len(boundaryNeighbours[posId])
+            if locked[posId] or (numBoundary == 0 and multiVertex[posId]) :
+                kind[posId] = _Locked
+            elif numBoundary == 2 :
+                kind[posId] = _Boundary
+            elif numBoundary != 0 :
+                kind[posId] = _Locked
+
+        # the quadrics of the triangle planes and the boundary edges,
+        # and the collapse candidates (all neighbours of interior
+        # positions, the boundary neighbours of boundary positions)
+        faceNormals = mesh.getFaceNormals()
+        zeroArea = set(mesh.getZeroAreaTriangles())
+        candidateEdges = []
+        for pa, pb in edges :
+            if kind[pa] == _Interior :
+                candidateEdges.append((pa, pb))
+            if kind[pb] == _Interior :
+                candidateEdges.append((pb, pa))
+        for pa, pb, triIndex in boundaryEdges :
+            if kind[pa] == _Boundary :
+                candidateEdges.append((pa, pb))
+            if kind[pb] == _Boundary :
+                candidateEdges.append((pb, pa))
+        self._setupQuadrics(faceNormals, zeroArea, boundaryEdges, candidateEdges)
+
+    def _setupQuadrics(self, faceNormals, zeroArea, boundaryEdges, candidateEdges) :
+        '''
+        Compute the quadrics and the lowest collapse cost of each position
+        '''
+        px = self.px
+        py = self.py
+        pz = self.pz
+        cornerPos = self.cornerPos
+        numPositions = len(px)
+        quadrics = self.quadrics = [[0.0] * 10 for posId in xrange(0, numPositions)]
+        for triIndex in xrange(0, len(self.alive)) :
+            if self.alive[triIndex] and triIndex not in zeroArea :
+                nx, ny, nz = faceNormals[triIndex * 3:triIndex * 3 + 3]
+                p0 = cornerPos[triIndex * 3]
+                d = -(nx * px[p0] + ny * py[p0] + nz * pz[p0])
+                q = _planeQuadric(nx, ny, nz, d, 1.0)
+                for posId in cornerPos[triIndex * 3:triIndex * 3 + 3] :
+                    _addQuadric(quadrics[posId], q)
+        for pa, pb, triIndex in boundaryEdges :
+            if triIndex in zeroArea :
+                continue
+            ex = px[pb] - px[pa]
+            ey = py[pb] - py[pa]
+            ez = pz[pb] - pz[pa]
+            nx, ny, nz = faceNormals[triIndex * 3:triIndex * 3 + 3]
+            bx = ey * nz - ez * ny
+            by = ez * nx - ex * nz
+            bz = ex * ny - ey * nx
+            l = math.sqrt(bx * bx + by * by + bz * bz)
+            if l == 0.0 :
+                continue
+            bx /= l
+            by /= l
+            bz /= l
+            d = -(bx * px[pa] + by * py[pa] + bz * pz[pa])
+            q = _planeQuadric(bx, by, bz, d, BoundaryWeight)
+            _addQuadric(quadrics[pa], q)
+            _addQuadric(quadrics[pb], q)
+
+        self.lowestCost = [None] * numPositions
+        self.lowestTarget = [-1] * numPositions
+        for u, v in candidateEdges :
+            cost = max(_evalQuadric(quadrics[u], px[v], py[v], pz[v]), 0.0)
+            lowest = self.lowestCost[u]
+            if lowest == None or cost < lowest or (cost == lowest and v < self.lowestTarget[u]) :
+                self.lowestCost[u] = cost
+                self.lowestTarget[u] = v
+
+    def _trianglesAt(self, posId) :
+        '''
+        Return the alive triangles of a position (and drop the dead ones)
+        '''
+        alive = self.alive
+        tris = [triIndex for triIndex in self.posTris[posId] if alive[triIndex]]
+        self.posTris[posId] = tris
+        return tris
+
+    def _neighbours(self, tris, posId) :
+        cornerPos = self.cornerPos
+        neighbours = set([p for triIndex in tris for p in cornerPos[triIndex * 3:triIndex * 3 + 3]])
+        neighbours.discard(posId)
+        return neighbours
+
+    def _collapseMapping(self, u, v, tris, neighbours) :
+        '''
+        Check whether u can be collapsed into v, and return a dictionary
+        which maps the vertices at u to the vertices at v, or None
+        '''
+        corners = self.corners
+        cornerPos = self.cornerPos
+        px = self.px
+        py = self.py
+        pz = self.pz
+        ux = px[u]
+        uy = py[u]
+        uz = pz[u]
+        vx = px[v]
+        vy = py[v]
+        vz = pz[v]
+        mapping = dict()
+        vertices = []
+        numShared = 0
+        for triIndex in tris :
+            i = triIndex * 3
+            p0, p1, p2 = cornerPos[i:i + 3]
+            if p0 == u :
+                k = i
+                b = p1
+                c = p2
+            elif p1 == u :
+                k = i + 1
+                b = p2
+                c = p0
+            else :
+                k = i + 2
+                b = p0
+                c = p1
+            if b == v or c == v :
+                numShared += 1
+                a = corners[k]
+                other = corners[i + (p1 == v) + 2 * (p2 == v)]
+                if mapping.setdefault(a, other) != other :
+                    return None
+            else :
+                vertices.append(corners[k])
+                # the triangle must not flip when u is moved to v
+                bx = px[b]
+                by = py[b]
+                bz = pz[b]
+                cx = px[c]
+                cy = py[c]
+                cz = pz[c]
+                e0x, e0y, e0z = bx - ux, by - uy, bz - uz
+                e1x, e1y, e1z = cx - ux, cy - uy, cz - uz
+                f0x, f0y, f0z = bx - vx, by - vy, bz - vz
+                f1x, f1y, f1z = cx - vx, cy - vy, cz - vz
+                if ((e0y * e1z - e0z * e1y) * (f0y * f1z - f0z * f1y) +
+                    (e0z * e1x - e0x * e1z) * (f0z * f1x - f0x * f1z) +
+                    (e0x * e1y - e0y * e1x) * (f0x * f1y - f0y * f1x)) <= 0.0 :
+                    return None
+        for vertexIndex in vertices :
+            if vertexIndex not in mapping :
+                return None
+
+        # link condition: u and v must only share the neighbours
+        # of the triangles at the edge, otherwise the collapse
+        # creates non-manifold geometry
+        numCommon = 0
+        for p in self._neighbours(self._trianglesAt(v), v) :
+            if p in neighbours :
+                numCommon += 1
+        if numCommon != numShared :
+            return None
+
+        # don't collapse a boundary loop of 3 edges
+        if self.kind[u] == _Boundary :
+            w = self.boundaryNeighbours[u][0] if self.boundaryNeighbours[u][1] == v else self.boundaryNeighbours[u][1]
+            if w in self.boundaryNeighbours[v] :
+                return None
+        return mapping
+
+    def _candidateList(self, u, neighbours) :
+        if self.kind[u] == _Boundary :
+            return self.boundaryNeighbours[u]
+        return neighbours
+
+    def _updateLowestCost(self, u, tris=None, neighbours=None) :
+        '''
+        Find the lowest collapse cost of u and its target without checking
+        the collapse (in lowestCost and lowestTarget), returns the cost
+        or None if u can't collapse
+        '''
+        self.lowestCost[u] = None
+        if self.dead[u] or self.kind[u] == _Locked :
+            return None
+        if tris == None :
+            tris = self._trianglesAt(u)
+            if tris :
+                neighbours = self._neighbours(tris, u)
+        if not tris :
+            return None
+        cost, v = min(_evalQuadrics(self.quadrics[u], self.px, self.py, self.pz, self._candidateList(u, neighbours)))
+        cost = max(cost, 0.0)
+        self.lowestCost[u] = cost
+        self.lowestTarget[u] = v
+        return cost
+
+    def _lowerCost(self, w, u, v) :
+        '''
+        Update the lowest cost of w after u (a neighbour of w) has been
+        merged into v, only the candidate v is new and u is gone
+        '''
+        cost = self.lowestCost[w]
+        if cost == None or self.lowestTarget[w] == u :
+            return self._updateLowestCost(w)
+        if self.kind[w] == _Boundary and v not in self.boundaryNeighbours[w] :
+            return cost
+        vCost = max(_evalQuadric(self.quadrics[w], self.px[v], self.py[v], self.pz[v]), 0.0)
+        if vCost < cost or (vCost == cost and v < self.lowestTarget[w]) :
+            self.lowestCost[w] = vCost
+            self.lowestTarget[w] = v
+            return vCost
+        return cost
+
+    def _bestCollapse(self, u) :
+        '''
+        Return the (cost, v, mapping, neighbours) of the cheapest valid
+        collapse of u, or None. The lowest cost target is tried first,
+        the other candidates are only sorted if it is invalid.
+        '''
+        if self.dead[u] or self.kind[u] == _Locked :
+            return None
+        tris = self._trianglesAt(u)
+        if not tris :
+            return None
+        neighbours = self._neighbours(tris, u)
+        target = self.lowestTarget[u]
+        mapping = self._collapseMapping(u, target, tris, neighbours)
+        if mapping != None :
+            return self.lowestCost[u], target, mapping, neighbours
+        costs = _evalQuadrics(self.quadrics[u], self.px, self.py, self.pz, self._candidateList(u, neighbours))
+        costs.sort()
+        for cost, v in costs :
+            if v == target :
+                continue
+            mapping = self._collapseMapping(u, v, tris, neighbours)
+            if mapping != None :
+                return max(cost, 0.0), v, mapping, neighbours
+        return None
+
+    def _collapse(self, u, v, mapping) :
+        '''
+        Merge position u into v
+        '''
+        corners = self.corners
+        cornerPos = self.cornerPos
+        alive = self.alive
+        vTris = self.posTris[v]
+        for triIndex in self._trianglesAt(u) :
+            i = triIndex * 3
+            p0, p1, p2 = cornerPos[i:i + 3]
+            if p0 == v or p1 == v or p2 == v :
+                alive[triIndex] = False
+                self.numAlive -= 1
+            else :
+                k = i + (p1 == u) + 2 * (p2 == u)
+                corners[k] = mapping[corners[k]]
+                cornerPos[k] = v
+                vTris.append(triIndex)
+        self.dead[u] = True
+        self.posTris[u] = []
+        _addQuadric(self.quadrics[v], self.quadrics[u])
+        if self.kind[u] == _Boundary :
+            w = self.boundaryNeighbours[u][0] if self.boundaryNeighbours[u][1] == v else self.boundaryNeighbours[u][1]
+            self.boundaryNeighbours[v][self.boundaryNeighbours[v].index(u)] = w
+            self.boundaryNeighbours[w][self.boundaryNeighbours[w].index(u)] = v
+
+    def run(self, targetTriangles, maxCost) :
+        '''
+        Collapse edges until the target triangle count or the
+        maximum cost is reached
+        '''
+        # the queue holds the lowest cost of each position, the
+        # collapse is only checked when it comes up (the cost of
+        # a valid collapse can be higher)
+        numPositions = len(self.dead)
+        stamps = [0] * numPositions
+        failed = [False] * numPositions
+        heap = [(cost, posId, 0) for posId, cost in enumerate(self.lowestCost) if cost != None]
+        heapq.heapify(heap)
+        def push(posId, cost) :
+            stamps[posId] += 1
+            failed[posId] = False
+            if cost != None :
+                heapq.heappush(heap, (cost, posId, stamps[posId]))
+
+        lowestCost = self.lowestCost
+        while heap and self.numAlive > targetTriangles :
+            cost, u, stamp = heapq.heappop(heap)
+            if self.dead[u] or stamp != stamps[u] :
+                continue
+            if maxCost != None and cost > maxCost :
+                break
+            collapse = self._bestCollapse(u)
+            if collapse == None :
+                # retried when the neighbourhood changes
+                stamps[u] += 1
+                failed[u] = True
+                continue
+            cost, v, mapping, neighbours = collapse
+            if heap and cost > heap[0][0] :
+                heapq.heappush(heap, (cost, u, stamp))
+                continue
+            if maxCost != None and cost > maxCost :
+                break
+            self._collapse(u, v, mapping)
+            self.maxCost = max(self.maxCost, cost)
+
+            # v has a new quadric and new neighbours, the former
+            # neighbours of u have v as new candidate, and collapses
+            # which failed next to v are retried
+            vTris = self._trianglesAt(v)
+            vNeighbours = self._neighbours(vTris, v)
+            push(v, self._updateLowestCost(v, vTris, vNeighbours))
+            for posId in neighbours :
+                if posId != v :
+                    oldCost = lowestCost[posId]
+                    newCost = self._lowerCost(posId, u, v)
+                    if newCost != oldCost or failed[posId] :
+                        push(posId, newCost)
+            for posId in vNeighbours :
+                if failed[posId] and posId not in neighbours :
+                    push(posId, lowestCost[posId])
+
+#-------------------------------------------------------------------------------
+def _runStarts(keys) :
+    '''
+    Return the start of each run of equal values in a sorted numpy array
+    '''
+    first = numpy.ones(len(keys), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    return numpy.flatnonzero(first)
+
+#-------------------------------------------------------------------------------
+def _expandRanges(starts, counts) :
+    '''
+    Return (owner, index) for all indices of the ranges
+    [starts[i], starts[i] + counts[i]), owner is the range index i
+    '''
+    owner = numpy.repeat(numpy.arange(len(counts)), counts)
+    offsets = numpy.arange(len(owner)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return owner, starts[owner] + offsets
+
+#-------------------------------------------------------------------------------
+def _findKeys(sortedKeys, keys) :
+    '''
+    Return which keys are in the sorted numpy array sortedKeys, and
+    their index
+    '''
+    index = numpy.searchsorted(sortedKeys, keys)
+    if len(sortedKeys) == 0 :
+        return numpy.zeros(len(keys), dtype=bool), index
+    index[index == len(sortedKeys)] = 0
+    return sortedKeys[index] == keys, index
+
+#-------------------------------------------------------------------------------
+def _quadricMonomials(p) :
+    '''
+    Return the monomials of the points p (a numpy array of 3 columns),
+    the dot product with a quadric is the quadric error at the point
+    '''
+    x, y, z = p.T
+    return numpy.column_stack((x * x, 2.0 * x * y, 2.0 * x * z, 2.0 * x,
+                               y * y, 2.0 * y * z, 2.0 * y,
+                               z * z, 2.0 * z,
+                               numpy.ones(len(p))))
+
+#-------------------------------------------------------------------------------
+class _BatchSimplifier :
+    '''
+    The numpy version of _Simplifier. The collapses are done in passes
+    over the whole mesh: each pass finds the cheapest valid collapse of
+    every position (with the same rules as _Simplifier) and performs a
+    set of them which don't conflict with each other (see _conflictMin),
+    so the checks of a pass stay valid. A pass only considers collapses
+    up to the lowest cost of the number of collapses which are still
+    needed, so the collapses happen in about the same order as in
+    _Simplifier.
+    '''
+    def __init__(self, mesh) :
+        self.corners = numpyView(mesh.indices).astype(numpy.int64)
+        self.groupIndices = numpyView(mesh.groupIndices).astype(numpy.int64)
+        self.numVertices = mesh.getNumVertices()
+        self.maxCost = 0.0
+
+        # weld the vertex positions, numbered by first occurrence
+        # (adding 0.0 turns -0.0 into 0.0)
+        positions = numpyView(mesh.getPositionData()[0]).astype(numpy.float64).reshape(-1, 3) + 0.0
+        keys = numpy.ascontiguousarray(positions).view(numpy.dtype((numpy.void, 24))).ravel()
+        unique, firstIndex, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+        order = numpy.argsort(firstIndex, kind='mergesort')
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        pos = positions[firstIndex[order]]
+        self.numPositions = len(pos)
+        self.px, self.py, self.pz = [numpy.ascontiguousarray(values) for values in pos.T]
+        self.monomials = _quadricMonomials(pos)
+
+        # triangles with 2 corners at the same position are ignored
+        self.cornerPos = rank[inverse][self.corners]
+        triPos = self.cornerPos.reshape(-1, 3)
+        self.alive = (triPos[:, 0] != triPos[:, 1]) & (triPos[:, 1] != triPos[:, 2]) & (triPos[:, 0] != triPos[:, 2])
+        self.numAlive = int(self.alive.sum())
+        self.halfEdges = numpy.arange(0, 2 * len(self.corners))
+        self._updateTopology()
+
+        # the quadrics of the triangle planes and the boundary edges
+        faceNormals = numpyView(mesh.getFaceNormals()).astype(numpy.float64).reshape(-1, 3)
+        hasNormal = self.alive.copy()
+        zeroArea = list(mesh.getZeroAreaTriangles())
+        if zeroArea :
+            hasNormal[zeroArea] = False
+        planeTris = numpy.flatnonzero(hasNormal)
+        nx, ny, nz = faceNormals[planeTris].T
+        planeTriPos = triPos[planeTris]
+        x, y, z = pos[planeTriPos[:, 0]].T
+        planes = [nx, ny, nz, -(nx * x + ny * y + nz * z), numpy.ones(len(planeTris))]
+        planePos = planeTriPos.ravel()
+
+        edgeTris = self.boundaryTris[hasNormal[self.boundaryTris]]
+        edgeLo = self.boundaryLo[hasNormal[self.boundaryTris]]
+        edgeHi = self.boundaryHi[hasNormal[self.boundaryTris]]
+        ex, ey, ez = (pos[edgeHi] - pos[edgeLo]).T
+        nx, ny, nz = faceNormals[edgeTris].T
+        bx = ey * nz - ez * ny
+        by = ez * nx - ex * nz
+        bz = ex * ny - ey * nx
+        l = numpy.sqrt(bx * bx + by * by + bz * bz)
+        withPlane = l != 0.0
+        bx = bx[withPlane] / l[withPlane]
+        by = by[withPlane] / l[withPlane]
+        bz = bz[withPlane] / l[withPlane]
+        x, y, z = pos[edgeLo[withPlane]].T
+        d = -(bx * x + by * y + bz * z)
+        for k, value in enumerate((bx, by, bz, d, numpy.full(len(bx), BoundaryWeight))) :
+            planes[k] = numpy.concatenate((numpy.repeat(planes[k], 3), numpy.repeat(value, 2)))
+        planePos = numpy.concatenate((planePos, numpy.column_stack((edgeLo[withPlane], edgeHi[withPlane])).ravel()))
+        a, b, c, d, w = planes
+        self.quadrics = numpy.column_stack([numpy.bincount(planePos, q, self.numPositions) for q in
+                                            (w * a * a, w * a * b, w * a * c, w * a * d,
+                                             w * b * b, w * b * c, w * b * d,
+                                             w * c * c, w * c * d,
+                                             w * d * d)])
+
+    def _updateTopology(self) :
+        '''
+        Find the corners, the neighbours, the boundary edges and the
+        kind of each position from the alive triangles
+        '''
+        numPositions = self.numPositions
+        numCorners = len(self.corners)
+        corners = self.corners
+        cornerPos = self.cornerPos
+
+        # the half edges of the alive triangles in both directions (i
+        # goes from corner i to the next corner of its triangle, i +
+        # numCorners the other way round) sorted by their position
+        # pair, they stay almost sorted from one pass to the next
+        halfEdges = self.halfEdges
+        k = halfEdges % numCorners
+        alive = self.alive[k // 3]
+        halfEdges = halfEdges[alive]
+        k = k[alive]
+        forward = halfEdges < numCorners
+        kNext = k - k % 3 + (k % 3 + 1) % 3
+        kSrc = numpy.where(forward, k, kNext)
+        kDst = numpy.where(forward, kNext, k)
+        keys = cornerPos[kSrc] * numPositions + cornerPos[kDst]
+        order = numpy.argsort(keys)
+        self.halfEdges = halfEdges[order]
+        keys = keys[order]
+        kSrc = kSrc[order]
+        kDst = kDst[order]
+        forward = forward[order]
+        src = cornerPos[kSrc]
+
+        # the alive corners grouped by position
+        self.posCorners = kSrc[forward]
+        self.cornerCount = numpy.bincount(src[forward], minlength=numPositions)
+        self.cornerStart = numpy.cumsum(self.cornerCount) - self.cornerCount
+
+        # positions with more than one referenced vertex
+        multiVertex = numpy.zeros(numPositions, dtype=bool)
+        used = self.cornerCount > 0
+        if len(k) > 0 :
+            vertices = corners[self.posCorners]
+            multiVertex[used] = (numpy.minimum.reduceat(vertices, self.cornerStart[used]) !=
+                                 numpy.maximum.reduceat(vertices, self.cornerStart[used]))
+
+        # the neighbours of each position are the runs of equal keys,
+        # with one half edge per triangle at the edge; boundary edges
+        # are mesh borders, attribute seams and triangle group borders,
+        # non-manifold edges are locked
+        runs = _runStarts(keys)
+        second = numpy.minimum(runs + 1, len(keys) - 1)
+        counts = numpy.diff(numpy.append(runs, len(keys)))
+        groupIndices = self.groupIndices
+        isBoundary = (counts == 1) | ((counts == 2) & ((groupIndices[kSrc[runs] // 3] != groupIndices[kSrc[second] // 3]) |
+                                                       (corners[kSrc[runs]] != corners[kSrc[second]]) |
+                                                       (corners[kDst[runs]] != corners[kDst[second]])))
+        self.nbrKeys = keys[runs]
+        self.nbrSrc = src[runs]
+        self.nbrDst = self.nbrKeys % numPositions
+        self.nbrBoundary = isBoundary
+        self.nbrCount = numpy.bincount(self.nbrSrc, minlength=numPositions)
+        self.nbrStart = numpy.cumsum(self.nbrCount) - self.nbrCount
+        self.nbrRuns = _runStarts(self.nbrSrc)
+        self.boundaryKeys = self.nbrKeys[isBoundary]
+        lower = isBoundary & (self.nbrSrc < self.nbrDst)
+        self.boundaryLo = self.nbrSrc[lower]
+        self.boundaryHi = self.nbrDst[lower]
+        self.boundaryTris = kSrc[runs][lower] // 3
+
+        kind = numpy.full(numPositions, _Interior, dtype=numpy.int64)
+        numBoundary = numpy.bincount(self.nbrSrc[isBoundary], minlength=numPositions)
+        kind[numBoundary == 2] = _Boundary
+        kind[(numBoundary != 0) & (numBoundary != 2)] = _Locked
+        kind[(numBoundary == 0) & multiVertex] = _Locked
+        kind[self.nbrSrc[counts > 2]] = _Locked
+        self.kind = kind
+
+    def _neighbourMin(self, values) :
+        '''
+        Return the minimum of each position's value and its neighbours' values
+        '''
+        result = values.copy()
+        if len(self.nbrSrc) > 0 :
+            src = self.nbrSrc[self.nbrRuns]
+            result[src] = numpy.minimum(result[src], numpy.minimum.reduceat(values[self.nbrDst], self.nbrRuns))
+        return result
+
+    def _conflictMin(self, values, targets, none) :
+        '''
+        Return the minimum value of the collapses x -> targets[x] which
+        conflict with the collapse of each position u -> v: x or its
+        target is a neighbour of u (or u), or v is a neighbour of x.
+        Positions without a collapse have the value none.
+        '''
+        byTarget = numpy.full(self.numPositions, none, dtype=numpy.int64)
+        hasCollapse = values != none
+        numpy.minimum.at(byTarget, targets[hasCollapse], values[hasCollapse])
+        near = self._neighbourMin(values)
+        return numpy.minimum(numpy.minimum(near, near[targets]), self._neighbourMin(byTarget))
+
+    def _collapseCorners(self, u, v) :
+        '''
+        Return the corners at the positions u of the collapses u -> v:
+        the collapse index, the corner, the corner at v of the triangle
+        (or -1) and the other 2 positions of the triangle
+        '''
+        cornerPos = self.cornerPos
+        collapse, index = _expandRanges(self.cornerStart[u], self.cornerCount[u])
+        k = self.posCorners[index]
+        j = k % 3
+        kb = k - j + (j + 1) % 3
+        kc = k - j + (j + 2) % 3
+        b = cornerPos[kb]
+        c = cornerPos[kc]
+        target = v[collapse]
+        kv = numpy.where(b == target, kb, numpy.where(c == target, kc, -1))
+        return collapse, k, kv, b, c
+
+    def _vertexMapping(self, collapse, k, kv) :
+        '''
+        Return the mapping of the vertices at u to the vertices at v of
+        the collapses u -> v from their corners (see _collapseCorners):
+        the sorted keys collapse * numVertices + vertex at u, the vertices
+        at v, and the collapses which map a vertex to 2 vertices
+        '''
+        numVertices = self.numVertices
+        shared = kv != -1
+        keys = collapse[shared] * numVertices + self.corners[k[shared]]
+        targets = self.corners[kv[shared]]
+        order = numpy.argsort(keys)
+        keys = keys[order]
+        targets = targets[order]
+        conflict = (keys[1:] == keys[:-1]) & (targets[1:] != targets[:-1])
+        first = _runStarts(keys)
+        return keys[first], targets[first], keys[1:][conflict] // numVertices
+
+    def _checkCollapses(self, u, v) :
+        '''
+        Check the collapses u -> v (see _Simplifier._collapseMapping),
+        returns whether they are valid and their number of removed
+        triangles
+        '''
+        numPositions = self.numPositions
+        numVertices = self.numVertices
+        corners = self.corners
+        valid = self.kind[u] != _Locked
+        collapse, k, kv, b, c = self._collapseCorners(u, v)
+        shared = kv != -1
+
+        # the triangles must not flip when u is moved to v
+        n = ~shared
+        pu = u[collapse[n]]
+        pv = v[collapse[n]]
+        pb = b[n]
+        pc = c[n]
+        px = self.px
+        py = self.py
+        pz = self.pz
+        ux = px[pu]
+        uy = py[pu]
+        uz = pz[pu]
+        vx = px[pv]
+        vy = py[pv]
+        vz = pz[pv]
+        bx = px[pb]
+        by = py[pb]
+        bz = pz[pb]
+        cx = px[pc]
+        cy = py[pc]
+        cz = pz[pc]
+        e0x, e0y, e0z = bx - ux, by - uy, bz - uz
+        e1x, e1y, e1z = cx - ux, cy - uy, cz - uz
+        f0x, f0y, f0z = bx - vx, by - vy, bz - vz
+        f1x, f1y, f1z = cx - vx, cy - vy, cz - vz
+        flipped = ((e0y * e1z - e0z * e1y) * (f0y * f1z - f0z * f1y) +
+                   (e0z * e1x - e0x * e1z) * (f0z * f1x - f0x * f1z) +
+                   (e0x * e1y - e0y * e1x) * (f0x * f1y - f0y * f1x)) <= 0.0
+        valid[collapse[n][flipped]] = False
+
+        # the vertices at u must map to one vertex at v each
+        mapKeys, mapTargets, conflicts = self._vertexMapping(collapse, k, kv)
+        valid[conflicts] = False
+        found, index = _findKeys(mapKeys, collapse[n] * numVertices + corners[k[n]])
+        valid[collapse[n][~found]] = False
+
+        # link condition: u and v must only share the neighbours
+        # of the triangles at the edge
+        numShared = numpy.bincount(collapse[shared], minlength=len(u))
+        owner, index = _expandRanges(self.nbrStart[u], self.nbrCount[u])
+        w = self.nbrDst[index]
+        other = w != v[owner]
+        found, index = _findKeys(self.nbrKeys, v[owner[other]] * numPositions + w[other])
+        numCommon = numpy.bincount(owner[other][found], minlength=len(u))
+        valid &= numCommon == numShared
+
+        # don't collapse a boundary loop of 3 edges
+        boundary = numpy.flatnonzero(self.kind[u] == _Boundary)
+        first = numpy.searchsorted(self.boundaryKeys, u[boundary] * numPositions)
+        w0 = self.boundaryKeys[first] % numPositions
+        w1 = self.boundaryKeys[first + 1] % numPositions
+        w = numpy.where(w0 == v[boundary], w1, w0)
+        found, index = _findKeys(self.boundaryKeys, v[boundary] * numPositions + w)
+        valid[boundary[found]] = False
+        return valid, numShared
+
+    def _cheapestCollapses(self, numNeeded, maxCost) :
+        '''
+        Return (u, v, cost, numRemoved) of the cheapest valid collapse
+        of the positions, ties go to the lower target. Only collapses up
+        to the lowest cost of the number of collapses which are still
+        needed (and maxCost) are considered, the number is doubled until
+        a valid collapse is found.
+        '''
+        kind = self.kind
+        src = self.nbrSrc
+        isCandidate = (kind[src] == _Interior) | ((kind[src] == _Boundary) & self.nbrBoundary)
+        allU = src[isCandidate]
+        allV = self.nbrDst[isCandidate]
+        allCosts = numpy.maximum(numpy.einsum('ij,ij->i', self.quadrics[allU], self.monomials[allV]), 0.0)
+        if maxCost != None :
+            cheap = allCosts <= maxCost
+            allU = allU[cheap]
+            allV = allV[cheap]
+            allCosts = allCosts[cheap]
+        if len(allU) == 0 :
+            return allU, allV, allCosts, allU
+        minCosts = numpy.minimum.reduceat(allCosts, _runStarts(allU))
+        numCollapses = (numNeeded + 1) // 2
+        while True :
+            k = min(len(minCosts), numCollapses) - 1
+            cheap = allCosts <= numpy.partition(minCosts, k)[k]
+            u = allU[cheap]
+            v = allV[cheap]
+            costs = allCosts[cheap]
+
+            # the cheapest target of each position (the candidates are
+            # sorted by position and target), and the other targets in
+            # cost order where it is invalid
+            first = _runStarts(u)
+            lowest = numpy.repeat(numpy.minimum.reduceat(costs, first), numpy.diff(numpy.append(first, len(u))))
+            best = numpy.flatnonzero(costs == lowest)
+            best = best[_runStarts(u[best])]
+            valid, numRemoved = self._checkCollapses(u[best], v[best])
+            result = [(u[best][valid], v[best][valid], costs[best][valid], numRemoved[valid])]
+            retry = numpy.zeros(self.numPositions, dtype=bool)
+            retry[u[best][~valid]] = True
+            retry = retry[u]
+            retry[best] = False
+            retry = numpy.flatnonzero(retry)
+            if len(retry) > 0 :
+                retry = retry[numpy.lexsort((v[retry], costs[retry], u[retry]))]
+                u = u[retry]
+                v = v[retry]
+                costs = costs[retry]
+                valid, numRemoved = self._checkCollapses(u, v)
+                first = _runStarts(u[valid])
+                result.append((u[valid][first], v[valid][first], costs[valid][first], numRemoved[valid][first]))
+            result = [numpy.concatenate(values) for values in zip(*result)]
+            if len(result[0]) > 0 or k == len(minCosts) - 1 :
+                return result
+            numCollapses *= 2
+
+    def _collapse(self, u, v) :
+        '''
+        Merge the positions u into v
+        '''
+        collapse, k, kv, b, c = self._collapseCorners(u, v)
+        mapKeys, mapTargets, conflicts = self._vertexMapping(collapse, k, kv)
+        shared = kv != -1
+        self.alive[k[shared] // 3] = False
+        self.numAlive -= int(shared.sum())
+        n = ~shared
+        found, index = _findKeys(mapKeys, collapse[n] * self.numVertices + self.corners[k[n]])
+        self.corners[k[n]] = mapTargets[index]
+        self.cornerPos[k[n]] = v[collapse[n]]
+        self.quadrics[v] += self.quadrics[u]
+
+    def run(self, targetTriangles, maxCost) :
+        '''
+        Collapse edges until the target triangle count or the maximum
+        cost is reached, corners and alive are lists afterwards
+        '''
+        numPositions = self.numPositions
+        while self.numAlive > targetTriangles :
+            numNeeded = self.numAlive - targetTriangles
+            u, v, costs, numRemoved = self._cheapestCollapses(numNeeded, maxCost)
+            if len(u) == 0 :
+                break
+
+            # select collapses in rounds, a collapse is selected if it
+            # comes first (in a pseudo random order) among the active
+            # collapses it conflicts with, which are deactivated
+            priority = numpy.full(numPositions, _NoPriority, dtype=numpy.int64)
+            priority[u] = (u * 2654435761) % _NoPriority
+            targets = numpy.arange(0, numPositions)
+            targets[u] = v
+            selected = numpy.zeros(numPositions, dtype=bool)
+            active = priority != _NoPriority
+            for i in range(0, MaxSelectRounds) :
+                first = active & (priority == self._conflictMin(numpy.where(active, priority, _NoPriority), targets, _NoPriority))
+                selected |= first
+                active &= self._conflictMin(numpy.where(first, 0, 1), targets, 1) == 1
+                if not active.any() :
+                    break
+
+            # the cheapest collapses first, ties go to the lower position
+            # like in _Simplifier, the last collapse may remove one
+            # triangle more than needed
+            chosen = numpy.flatnonzero(selected[u])
+            chosen = chosen[numpy.lexsort((u[chosen], costs[chosen]))]
+            numRemoved = numRemoved[chosen]
+            chosen = chosen[numpy.cumsum(numRemoved) - numRemoved < numNeeded]
+            self._collapse(u[chosen], v[chosen])
+            self.maxCost = max(self.maxCost, float(costs[chosen].max()))
+            self._updateTopology()
+
+        self.corners = self.corners.tolist()
+        self.alive = self.alive.tolist()
+
+#--- eof
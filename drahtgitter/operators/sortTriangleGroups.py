@@ -0,0 +1,46 @@
+'''
+Sort the triangles of a Model by their group index (material) with a
+stable counting sort, so that each group is a contiguous range of
+triangles (see Mesh.groupRanges()) which can be rendered with a single
+draw call. The order of the triangles within a group is preserved.
+Returns a new Model.
+'''
+
+from ..core import *
+
+#-------------------------------------------------------------------------------
+def do(srcModel) :
+
+    dgLogger.debug('operators.sortTriangleGroups: model={}'.format(srcModel.name))
+
+    srcMesh = srcModel.mesh
+    srcMesh.checkSingleIndexed()
+    groupIndices = srcMesh.groupIndices
+    if len(groupIndices) == 0 :
+        return srcModel.clone()
+
+    # count the triangles per group, and compute the first
+    # destination slot of each group
+    counts = [0] * (max(groupIndices) + 1)
+    for groupIndex in groupIndices :
+        counts[groupIndex] += 1
+    nextSlot = [0] * len(counts)
+    first = 0
+    for groupIndex in xrange(0, len(counts)) :
+        nextSlot[groupIndex] = first
+        first += counts[groupIndex]
+
+    # scatter the triangle indices into their slots
+    order = [0] * len(groupIndices)
+    triIndex = 0
+    for groupIndex in groupIndices :
+        order[nextSlot[groupIndex]] = triIndex
+        nextSlot[groupIndex] += 1
+        triIndex += 1
+
+    dstModel = srcModel.clone()
+    dstModel.mesh.reorderTriangles(order)
+
+    return dstModel
+
+#--- eof
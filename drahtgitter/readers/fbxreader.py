@@ -20,6 +20,14 @@ class config :
     '''
     def __init__(self) :
         self.materialParsers = [ hwShaderMaterialParser(), phongMaterialParser(), lambertMaterialParser()  ]
+        # set to True to store the resulting mesh in memory-mapped files
+        self.mapped = False
+        # set to True to read a multi-indexed mesh (positions indexed by
+        # control point, separate indices for normals, uvs, ...)
+        self.multiIndexed = False
+        # set to True to merge identical vertices while reading
+        # (makes a separate deflate pass unnecessary)
+        self.dedup = False
 
 #-------------------------------------------------------------------------------
 def read(config, path, name) :
@@ -35,13 +43,12 @@ def read(config, path, name) :
     outModel = Model(name)
     extractMaterials(config, context.fbxScene, outModel)
 
-    # detect the required vertex layout and setup a mesh object
+    # detect the required vertex layout and stream the geometry 
+    # into a mesh builder (no need to count triangles up front)
     vertexLayout = buildVertexLayout(context.fbxScene)
-    numTriangles = countTriangles(context.fbxScene)
-    outModel.mesh = Mesh(vertexLayout, numTriangles * 3, numTriangles)
+    meshBuilder = MeshBuilder(vertexLayout, Mesh.Float64, config.mapped, config.dedup)
 
     # iterate over nodes
-    curTriIndex = 0
     for nodeIndex in range(0, context.fbxScene.GetNodeCount()) :
         fbxNode = context.fbxScene.GetNode(nodeIndex)
         fbxMesh = fbxNode.GetMesh()
@@ -49,10 +56,13 @@ def read(config, path, name) :
             materialIndex = lookupMaterialIndex(outModel, fbxNode, fbxMesh)
             if materialIndex != None :                
                 outModel.materials[materialIndex].useCount += 1
-                extractGeometry(outModel.mesh, fbxNode, fbxMesh, materialIndex, curTriIndex)
-                curTriIndex += fbxMesh.GetPolygonCount()
+                if config.multiIndexed :
+                    extractIndexedGeometry(meshBuilder, fbxNode, fbxMesh, materialIndex)
+                else :
+                    extractGeometry(meshBuilder, fbxNode, fbxMesh, materialIndex)
             else :
                 dgLogger.warning('FBX mesh {} has no material assigned, ignored!'.format(fbxMesh.GetName()))
+    outModel.mesh = meshBuilder.finalize()
 
     context.Discard()
 
@@ -18,26 +18,18 @@ def getPropVector(fbxVec, fbxScale) :
     return vec
 
 #-------------------------------------------------------------------------------
-def extractLayerElement(fbxMesh, fbxLayer, polyIndex, pointIndex, controlPointIndex) :
+def extractLayerElementIndex(fbxMesh, fbxLayer, polyIndex, pointIndex, controlPointIndex) :
     '''
-    Extracts a layer element (normal, uv, ...) and returns the
-    element as FbxVector4 or FbxVector2 (the latter for uvs)
+    Returns the index of a layer element (normal, uv, ...) in 
+    the direct array of the layer
     '''
     vertexIndex = polyIndex * 3 + pointIndex
     mapMode = fbxLayer.GetMappingMode()
     refMode = fbxLayer.GetReferenceMode()
     if mapMode == FbxLayerElement.eByControlPoint :
-        if refMode == FbxLayerElement.eDirect :
-            fbxVec = fbxLayer.GetDirectArray().GetAt(controlPointIndex)
-        elif refMode == FbxLayerElement.eIndexToDirect :
-            id = fbxLayer.GetIndexArray().GetAt(controlPointIndex)
-            fbxVec = fbxLayer.GetDirectArray().GetAt(id)
+        index = controlPointIndex
     elif mapMode == FbxLayerElement.eByPolygonVertex :
-        if refMode == FbxLayerElement.eDirect :
-            fbxVec = fbxLayer.GetDirectArray().GetAt(vertexIndex)
-        elif refMode == FbxLayerElement.eIndexToDirect :
-            id = fbxLayer.GetIndexArray().GetAt(vertexIndex)
-            fbxVec = fbxLayer.GetDirectArray().GetAt(id)
+        index = vertexIndex
     elif mapMode == FbxLayerElement.eByPolygon :
         raise Exception('Mapping mode is eByPolygon')
     elif mapMode == FbxLayerElement.eAllSame :
@@ -45,7 +37,21 @@ def extractLayerElement(fbxMesh, fbxLayer, polyIndex, pointIndex, controlPointIn
     elif mapMode == FbxLayerElement.eNone :
         raise Exception('Mapping mode is eNone')
 
-    return fbxVec
+    if refMode == FbxLayerElement.eIndexToDirect :
+        index = fbxLayer.GetIndexArray().GetAt(index)
+    elif refMode != FbxLayerElement.eDirect :
+        raise Exception('Unsupported reference mode')
+
+    return index
+
+#-------------------------------------------------------------------------------
+def extractLayerElement(fbxMesh, fbxLayer, polyIndex, pointIndex, controlPointIndex) :
+    '''
+    Extracts a layer element (normal, uv, ...) and returns the
+    element as FbxVector4 or FbxVector2 (the latter for uvs)
+    '''
+    index = extractLayerElementIndex(fbxMesh, fbxLayer, polyIndex, pointIndex, controlPointIndex)
+    return fbxLayer.GetDirectArray().GetAt(index)
  
 #-------------------------------------------------------------------------------
 def dumpUserProperties(fbxObject) :
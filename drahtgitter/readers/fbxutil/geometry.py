@@ -3,7 +3,7 @@ Geometry export related FBX utility functions.
 '''
 
 from ...core import *
-from ..fbxutil.general import extractLayerElement
+from ..fbxutil.general import extractLayerElement, extractLayerElementIndex
 from fbx import *
 
 #-------------------------------------------------------------------------------
@@ -94,10 +94,11 @@ def countTriangles(fbxScene) :
     return numTriangles
 
 #-------------------------------------------------------------------------------
-def extractGeometry(mesh, fbxNode, fbxMesh, materialIndex, curTriIndex) :
+def extractGeometry(meshBuilder, fbxNode, fbxMesh, materialIndex) :
     '''
-    Takes an FbxMesh and it's parent node, and extracts the geometry
-    in the mesh to the provided drahtgitter Mesh object.
+    Takes an FbxMesh and it's parent node, and appends the geometry
+    in the mesh to the provided drahtgitter MeshBuilder object.
+    If the MeshBuilder is in dedup mode, identical vertices are merged.
     NOTE: It is assumed that the FBX mesh has been triangulated and
     that each mesh has only one material assigned (the 
     FbxGeometryConverter.SplitMeshesPerMaterial method can be used for this)
@@ -109,9 +110,14 @@ def extractGeometry(mesh, fbxNode, fbxMesh, materialIndex, curTriIndex) :
     affineMatrix.SetT(FbxVector4(0.0, 0.0, 0.0, 0.0))
     normalTransform = FbxMatrix(affineMatrix)
 
+    # the vertex components of this FBX mesh are gathered per triangle
+    # corner and appended to the mesh builder at the end
+    numPolygons = fbxMesh.GetPolygonCount()
+    components = []
+
     # extract positions; for each polygon:
-    posOffset = mesh.getComponentOffset(('position', 0))
-    for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+    positions = []
+    for polyIndex in xrange(0, numPolygons) :
         # for each point in polygon
         numPoints = fbxMesh.GetPolygonSize(polyIndex)
         if numPoints != 3 :
@@ -122,15 +128,10 @@ def extractGeometry(mesh, fbxNode, fbxMesh, materialIndex, curTriIndex) :
             posIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
             fbxPos = fbxMesh.GetControlPointAt(posIndex)
             fbxPos = pointTransform.MultNormalize(fbxPos)
-            vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-            mesh.setData3(vertexIndex, posOffset, fbxPos[0], fbxPos[1], fbxPos[2])
-
-        # add a new triangles
-        startIndex = (curTriIndex + polyIndex) * 3
-        mesh.setTriangle(curTriIndex + polyIndex, Triangle(startIndex, startIndex+1, startIndex+2, materialIndex))
+            positions.extend((fbxPos[0], fbxPos[1], fbxPos[2]))
+    components.append((('position', 0), positions))
 
     # extract additional vertex elements
-    # FIXME: handle vertex color
     normalLayerCount = 0
     tangentLayerCount = 0
     binormalLayerCount = 0
@@ -141,67 +142,188 @@ def extractGeometry(mesh, fbxNode, fbxMesh, materialIndex, curTriIndex) :
         # extract normals
         lNormals = fbxMesh.GetLayer(layerIndex).GetNormals()
         if lNormals :
-            normalOffset = mesh.getComponentOffset(('normal', normalLayerCount))
-            normalLayerCount += 1
-            for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+            normals = []
+            for polyIndex in xrange(0, numPolygons) :
                 for pointIndex in range(0, fbxMesh.GetPolygonSize(polyIndex)) :
                     cpIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
                     fbxNorm = extractLayerElement(fbxMesh, lNormals, polyIndex, pointIndex, cpIndex)
                     fbxNorm = normalTransform.MultNormalize(fbxNorm)
                     fbxNorm.Normalize()
-                    vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-                    mesh.setData3(vertexIndex, normalOffset, fbxNorm[0], fbxNorm[1], fbxNorm[2])
+                    normals.extend((fbxNorm[0], fbxNorm[1], fbxNorm[2]))
+            components.append((('normal', normalLayerCount), normals))
+            normalLayerCount += 1
 
         # extract tangents
         lTangents = fbxMesh.GetLayer(layerIndex).GetTangents()
         if lTangents :
-            tangentOffset = mesh.getComponentOffset(('tangent', tangentLayerCount))
-            tangentLayerCount += 1
-            for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+            tangents = []
+            for polyIndex in xrange(0, numPolygons) :
                 for pointIndex in range(0, fbxMesh.GetPolygonSize(polyIndex)) :
                     cpIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
                     fbxTang = extractLayerElement(fbxMesh, lTangents, polyIndex, pointIndex, cpIndex)
                     fbxTang = normalTransform.MultNormalize(fbxTang)
                     fbxTang.Normalize()
-                    vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-                    mesh.setData3(vertexIndex, tangentOffset, fbxTang[0], fbxTang[1], fbxTang[2])
+                    tangents.extend((fbxTang[0], fbxTang[1], fbxTang[2]))
+            components.append((('tangent', tangentLayerCount), tangents))
+            tangentLayerCount += 1
 
         # extract binormals
         lBinormals = fbxMesh.GetLayer(layerIndex).GetBinormals()
         if lBinormals :
-            binormalOffset = mesh.getComponentOffset(('binormal', binormalLayerCount))
-            binormalLayerCount += 1
-            for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+            binormals = []
+            for polyIndex in xrange(0, numPolygons) :
                 for pointIndex in range(0, fbxMesh.GetPolygonSize(polyIndex)) :
                     cpIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
                     fbxBinorm = extractLayerElement(fbxMesh, lBinormals, polyIndex, pointIndex, cpIndex)
-                    fbxBinorm = normalTransform.MultNormalize(fbxNorm)
-                    fbxNorm.Normalize()
-                    vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-                    mesh.setData3(vertexIndex, binormalOffset, fbxBinorm[0], fbxBinorm[1], fbxBinorm[2])
+                    fbxBinorm = normalTransform.MultNormalize(fbxBinorm)
+                    fbxBinorm.Normalize()
+                    binormals.extend((fbxBinorm[0], fbxBinorm[1], fbxBinorm[2]))
+            components.append((('binormal', binormalLayerCount), binormals))
+            binormalLayerCount += 1
 
         # extract UVs
         lUVs = fbxMesh.GetLayer(layerIndex).GetUVs()
         if lUVs :
-            uvOffset = mesh.getComponentOffset(('texcoord', uvLayerCount))
-            uvLayerCount += 1
-            for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+            uvs = []
+            for polyIndex in xrange(0, numPolygons) :
                 for pointIndex in range(0, fbxMesh.GetPolygonSize(polyIndex)) :
                     cpIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
                     fbxUV = extractLayerElement(fbxMesh, lUVs, polyIndex, pointIndex, cpIndex)
-                    vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-                    mesh.setData2(vertexIndex, uvOffset, fbxUV[0], fbxUV[1])
+                    uvs.extend((fbxUV[0], fbxUV[1]))
+            components.append((('texcoord', uvLayerCount), uvs))
+            uvLayerCount += 1
 
         # extract vertex colors
         lColors = fbxMesh.GetLayer(layerIndex).GetVertexColors()
         if lColors :
-            colorOffset = mesh.getComponentOffset(('color', colorLayerCount))
-            colorLayerCount += 1
-            for polyIndex in xrange(0, fbxMesh.GetPolygonCount()) :
+            colors = []
+            for polyIndex in xrange(0, numPolygons) :
                 for pointIndex in range(0, fbxMesh.GetPolygonSize(polyIndex)) :
                     cpIndex = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
                     fbxColor = extractLayerElement(fbxMesh, lColors, polyIndex, pointIndex, cpIndex)
-                    vertexIndex = (curTriIndex + polyIndex) * 3 + pointIndex
-                    mesh.setData4(vertexIndex, colorOffset, fbxColor[0], fbxColor[1], fbxColor[2], fbxColor[3])
+                    colors.extend((fbxColor[0], fbxColor[1], fbxColor[2], fbxColor[3]))
+            components.append((('color', colorLayerCount), colors))
+            colorLayerCount += 1
+
+    if meshBuilder.dedup :
+        _insertDedupVertices(meshBuilder, components, numPolygons, materialIndex)
+    else :
+        # each triangle has its own 3 vertices, written directly
+        # into the mesh builder's vertex buffer
+        first = meshBuilder.appendComponents(numPolygons * 3, components)
+        meshBuilder.appendTriangles(array(Mesh.IndexType, xrange(first, first + numPolygons * 3)), materialIndex)
+
+#-------------------------------------------------------------------------------
+def _insertDedupVertices(meshBuilder, components, numPolygons, materialIndex) :
+    '''
+    Interleaves the gathered vertex components in batches of triangles 
+    and inserts them into a deduplicating mesh builder, so that the 
+    3 vertices per triangle are never stored in a vertex buffer.
+    '''
+    vertexLayout = meshBuilder.vertexLayout
+    vertexSize = vertexLayout.size
+    precision = meshBuilder.precision
+    batchSize = 4096
+    for firstPoly in xrange(0, numPolygons, batchSize) :
+        firstCorner = firstPoly * 3
+        endCorner = min(firstPoly + batchSize, numPolygons) * 3
+        vertices = array(precision, [0.0]) * ((endCorner - firstCorner) * vertexSize)
+        for nameAndIndex, values in components :
+            comp = vertexLayout.getComponent(nameAndIndex)
+            for i in range(0, comp.size) :
+                vertices[comp.offset + i::vertexSize] = array(precision, values[firstCorner * comp.size + i:endCorner * comp.size:comp.size])
+        meshBuilder.appendTriangles(meshBuilder.insertVertices(vertices), materialIndex)
+
+#-------------------------------------------------------------------------------
+def extractLayerStream(fbxMesh, fbxLayer, cpIndices, size, transform=None) :
+    '''
+    Extracts the direct array of an FBX layer element (normals, uvs, ...)
+    as flat list of floats and the index into it for each triangle corner.
+    If a transform is given, the elements are transformed and normalized.
+    '''
+    indices = array(Mesh.IndexType, [0]) * len(cpIndices)
+    for cornerIndex in xrange(0, len(cpIndices)) :
+        indices[cornerIndex] = extractLayerElementIndex(fbxMesh, fbxLayer, cornerIndex / 3, cornerIndex % 3, cpIndices[cornerIndex])
+    values = []
+    fbxDirectArray = fbxLayer.GetDirectArray()
+    for elementIndex in xrange(0, fbxDirectArray.GetCount()) :
+        fbxVec = fbxDirectArray.GetAt(elementIndex)
+        if transform != None :
+            fbxVec = transform.MultNormalize(fbxVec)
+            fbxVec.Normalize()
+        values.extend([fbxVec[i] for i in range(0, size)])
+    return values, indices
+
+#-------------------------------------------------------------------------------
+def extractIndexedGeometry(meshBuilder, fbxNode, fbxMesh, materialIndex) :
+    '''
+    Like extractGeometry, but appends a multi-indexed mesh to the mesh
+    builder: positions are indexed by control point, and each layer
+    element has its own index stream, so vertices aren't expanded
+    to 3 per triangle.
+    '''
+
+    # get the current node's global transform
+    affineMatrix = fbxNode.EvaluateGlobalTransform()
+    pointTransform = FbxMatrix(affineMatrix)
+    affineMatrix.SetT(FbxVector4(0.0, 0.0, 0.0, 0.0))
+    normalTransform = FbxMatrix(affineMatrix)
+
+    numPolygons = fbxMesh.GetPolygonCount()
+    vertexLayout = meshBuilder.vertexLayout
+    mesh = Mesh(vertexLayout, 0, numPolygons, meshBuilder.precision)
+    mesh.groupIndices = array(Mesh.IndexType, [materialIndex]) * numPolygons
+
+    # gather the control point index of each triangle corner
+    cpIndices = array(Mesh.IndexType, [0]) * (numPolygons * 3)
+    for polyIndex in xrange(0, numPolygons) :
+        if fbxMesh.GetPolygonSize(polyIndex) != 3 :
+            raise Exception('FBX mesh not triangulated!')
+        for pointIndex in range(0, 3) :
+            cpIndices[polyIndex * 3 + pointIndex] = fbxMesh.GetPolygonVertex(polyIndex, pointIndex)
+
+    # the position stream is indexed by control point
+    positions = []
+    for cpIndex in xrange(0, fbxMesh.GetControlPointsCount()) :
+        fbxPos = pointTransform.MultNormalize(fbxMesh.GetControlPointAt(cpIndex))
+        positions.extend((fbxPos[0], fbxPos[1], fbxPos[2]))
+    mesh.setStream(('position', 0), positions, cpIndices)
+
+    # extract additional vertex elements
+    normalLayerCount = 0
+    tangentLayerCount = 0
+    binormalLayerCount = 0
+    colorLayerCount = 0
+    uvLayerCount = 0
+    for layerIndex in range(0, fbxMesh.GetLayerCount()) :
+        fbxLayer = fbxMesh.GetLayer(layerIndex)
+        if fbxLayer.GetNormals() :
+            values, indices = extractLayerStream(fbxMesh, fbxLayer.GetNormals(), cpIndices, 3, normalTransform)
+            mesh.setStream(('normal', normalLayerCount), values, indices)
+            normalLayerCount += 1
+        if fbxLayer.GetTangents() :
+            values, indices = extractLayerStream(fbxMesh, fbxLayer.GetTangents(), cpIndices, 3, normalTransform)
+            mesh.setStream(('tangent', tangentLayerCount), values, indices)
+            tangentLayerCount += 1
+        if fbxLayer.GetBinormals() :
+            values, indices = extractLayerStream(fbxMesh, fbxLayer.GetBinormals(), cpIndices, 3, normalTransform)
+            mesh.setStream(('binormal', binormalLayerCount), values, indices)
+            binormalLayerCount += 1
+        if fbxLayer.GetUVs() :
+            values, indices = extractLayerStream(fbxMesh, fbxLayer.GetUVs(), cpIndices, 2)
+            mesh.setStream(('texcoord', uvLayerCount), values, indices)
+            uvLayerCount += 1
+        if fbxLayer.GetVertexColors() :
+            values, indices = extractLayerStream(fbxMesh, fbxLayer.GetVertexColors(), cpIndices, 4)
+            mesh.setStream(('color', colorLayerCount), values, indices)
+            colorLayerCount += 1
+
+    # vertex components which don't exist in this FBX mesh get 
+    # a single zero value
+    for comp in vertexLayout.vertexComponents.values() :
+        if mesh.getStream(comp.nameAndIndex) == None :
+            mesh.setStream(comp.nameAndIndex, [0.0] * comp.size, array(Mesh.IndexType, [0]) * (numPolygons * 3))
 
+    meshBuilder.appendMesh(mesh)
 
+#--- eof
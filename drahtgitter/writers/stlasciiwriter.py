@@ -9,14 +9,21 @@ def write(model, path) :
     dgLogger.debug('writers.stlasciiwriter.writeMesh: model={}, path={}'.format(model.name, path))
 
     mesh = model.mesh
+    mesh.checkSingleIndexed()
     f = open(path, 'w')
     pos0 = ('position', 0)
     f.write('solid mesh\n')
-    for tri in mesh.triangles :
-        v0 = mesh.getVertex(tri.vertexIndex0, pos0)
-        v1 = mesh.getVertex(tri.vertexIndex1, pos0)
-        v2 = mesh.getVertex(tri.vertexIndex2, pos0)
-        f.write('facet normal {0} {1} {2}\n'.format(tri.normalX, tri.normalY, tri.normalZ))
+    indices = mesh.indices
+    # use the cached face normals if no triangle normals have been computed
+    normals = mesh.triangleNormals
+    if normals is None :
+        normals = mesh.getFaceNormals()
+    for triIndex in xrange(0, mesh.getNumTriangles()) :
+        i = triIndex * 3
+        v0 = mesh.getVertex(indices[i], pos0)
+        v1 = mesh.getVertex(indices[i + 1], pos0)
+        v2 = mesh.getVertex(indices[i + 2], pos0)
+        f.write('facet normal {0} {1} {2}\n'.format(normals[i], normals[i + 1], normals[i + 2]))
         f.write('\touter loop\n')
         f.write('\t\tvertex {0} {1} {2}\n'.format(v0.x, v0.y, v0.z))
         f.write('\t\tvertex {0} {1} {2}\n'.format(v1.x, v1.y, v1.z))
@@ -5,6 +5,7 @@ https://github.com/mrdoob/three.js/wiki/JSON-Model-format-3.1
 from ..core import *
 from ..operators import fixVertexComponents as fixVertexComponents
 from ..operators import deflate as deflate
+from ..operators import flattenIndices as flattenIndices
 import uuid
 
 NormalBit = 1<<5
@@ -35,14 +36,25 @@ def getFaceMask(model, withFaceMaterial) :
     return faceMask
 
 #-------------------------------------------------------------------------------
-def reducePositions(model) :
-    posVertexLayout = VertexLayout()
-    posVertexLayout.add(VertexComponent(pos0, 3))
-    posModel = fixVertexComponents.do(model, posVertexLayout)
-    posModel, posIndexMap = deflate.do(posModel)
-    if posModel.mesh.getNumTriangles() != model.mesh.getNumTriangles() :
+def reduceComponent(model, nameAndIndex, size) :
+    '''
+    Returns a model with only one vertex component and separate 
+    indices for it. Multi-indexed models already have separately indexed
+    streams, otherwise the component is extracted and deduplicated.
+    '''
+    if model.mesh.isMultiIndexed() :
+        return flattenIndices.extractStream(model, nameAndIndex)
+    compVertexLayout = VertexLayout()
+    compVertexLayout.add(VertexComponent(nameAndIndex, size))
+    compModel = fixVertexComponents.do(model, compVertexLayout)
+    compModel, compIndexMap = deflate.do(compModel)
+    if compModel.mesh.getNumTriangles() != model.mesh.getNumTriangles() :
         raise Exception('Triangle count mismatch!')
-    return posModel
+    return compModel
+
+#-------------------------------------------------------------------------------
+def reducePositions(model) :
+    return reduceComponent(model, pos0, 3)
 
 #-------------------------------------------------------------------------------
 def writePositions(f, posModel) :
@@ -57,13 +69,7 @@ def writePositions(f, posModel) :
 
 #-------------------------------------------------------------------------------
 def reduceNormals(model) :
-    normVertexLayout = VertexLayout()
-    normVertexLayout.add(VertexComponent(norm0, 3))
-    normModel = fixVertexComponents.do(model, normVertexLayout)
-    normModel, normIndexMap = deflate.do(normModel)
-    if normModel.mesh.getNumTriangles() != model.mesh.getNumTriangles() :
-        raise Exception('Triangle count mismatch!')
-    return normModel    
+    return reduceComponent(model, norm0, 3)
 
 #-------------------------------------------------------------------------------
 def writeNormals(f, normModel) :
@@ -78,13 +84,7 @@ def writeNormals(f, normModel) :
 
 #-------------------------------------------------------------------------------
 def reduceUvs(model) :
-    uvVertexLayout = VertexLayout()
-    uvVertexLayout.add(VertexComponent(uv0, 2))
-    uvModel = fixVertexComponents.do(model, uvVertexLayout)
-    uvModel, uvIndexMap = deflate.do(uvModel)
-    if uvModel.mesh.getNumTriangles() != model.mesh.getNumTriangles() :
-        raise Exception('Triangle count mismatch!')
-    return uvModel
+    return reduceComponent(model, uv0, 2)
 
 #-------------------------------------------------------------------------------
 def writeUvs(f, uvModel) :
@@ -99,13 +99,7 @@ def writeUvs(f, uvModel) :
 
 #-------------------------------------------------------------------------------
 def reduceColors(model) :
-    colorVertexLayout = VertexLayout()
-    colorVertexLayout.add(VertexComponent(color0, 4))
-    colorModel = fixVertexComponents.do(model, colorVertexLayout)
-    colorModel, colorIndexMap = deflate.do(colorModel)
-    if colorModel.mesh.getNumTriangles() != model.mesh.getNumTriangles() :
-        raise Exception('Triangle count mismatch')
-    return colorModel
+    return reduceComponent(model, color0, 4)
 
 #-------------------------------------------------------------------------------
 def writeColors(f, colorModel) :
@@ -123,29 +117,33 @@ def writeFaceIndices(f, faceMask, srcModel, posModel, normModel, uvModel, colorM
 
     f.write('\t"faces": [ ')
     numFaces = srcModel.mesh.getNumTriangles()
+    posIndices = posModel.mesh.indices
+    groupIndices = srcModel.mesh.groupIndices
+    if faceMask & UvBit :
+        uvIndices = uvModel.mesh.indices
+    if faceMask & NormalBit :
+        normIndices = normModel.mesh.indices
+    if faceMask & ColorBit :
+        colorIndices = colorModel.mesh.indices
     for faceIndex in range(0, numFaces) :
 
+        i = faceIndex * 3
         # lead byte
         f.write('{}'.format(faceMask))
         # 3 position vertex indices
-        tri = posModel.mesh.triangles[faceIndex]
-        f.write(',{},{},{}'.format(tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2))
+        f.write(',{},{},{}'.format(posIndices[i], posIndices[i + 1], posIndices[i + 2]))
         # write material index 
         if faceMask & MaterialBit :
-            tri = srcModel.mesh.triangles[faceIndex]
-            f.write(',{}'.format(tri.groupIndex))
+            f.write(',{}'.format(groupIndices[faceIndex]))
         # write uv indices
         if faceMask & UvBit :
-            tri = uvModel.mesh.triangles[faceIndex]
-            f.write(',{},{},{}'.format(tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2))
+            f.write(',{},{},{}'.format(uvIndices[i], uvIndices[i + 1], uvIndices[i + 2]))
         # write normal indices
         if faceMask & NormalBit :
-            tri = normModel.mesh.triangles[faceIndex]
-            f.write(',{},{},{}'.format(tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2))
+            f.write(',{},{},{}'.format(normIndices[i], normIndices[i + 1], normIndices[i + 2]))
         # write color indices
         if faceMask & ColorBit :
-            tri = normModel.mesh.triangles[faceIndex]
-            f.write(',{},{},{}'.format(tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2))
+            f.write(',{},{},{}'.format(colorIndices[i], colorIndices[i + 1], colorIndices[i + 2]))
         if faceIndex < numFaces - 1 :
             f.write(',')
     f.write(' ]')
@@ -4,14 +4,34 @@
 '''
 
 import unittest
+import os
+import sys
+import random
+import threading
+import shutil
+import tempfile
+try :
+    import numpy
+except ImportError :
+    numpy = None
 from drahtgitter.core import *
 import drahtgitter.generators.cube as cube
 import drahtgitter.generators.cylinder as cylinder
 import drahtgitter.generators.sphere as sphere
 import drahtgitter.generators.torus as torus
 import drahtgitter.operators.computeTriangleNormals as computeTriangleNormals
+import drahtgitter.operators.computeVertexNormals as computeVertexNormals
+import drahtgitter.operators.computeTangents as computeTangents
+import drahtgitter.operators.optimizeVertexCache as optimizeVertexCache
+import drahtgitter.operators.optimizeOverdraw as optimizeOverdraw
+import drahtgitter.operators.optimizeVertexFetch as optimizeVertexFetch
+import drahtgitter.operators.sortTriangleGroups as sortTriangleGroups
+import drahtgitter.operators.simplify as simplify
+import drahtgitter.operators.buildMeshlets as buildMeshlets
+import drahtgitter.operators.packVertexComponents as packVertexComponents
 import drahtgitter.operators.fixVertexComponents as fixVertexComponents
 import drahtgitter.operators.deflate as deflate
+import drahtgitter.operators.flattenIndices as flattenIndices
 import drahtgitter.writers.stlasciiwriter as stlasciiwriter
 import drahtgitter.writers.threejswriter as threejswriter
 
@@ -57,6 +77,26 @@ class TestMath(unittest.TestCase) :
         self.assertEqual(Vector.dot3(v0, v3), -1.0)
         self.assertTrue(abs(Vector.length(Vector.normalize(Vector(1.0, 2.0, 3.0, 4.0))) - 1.0) < 0.00001)
 
+    def test_Slots(self) :
+
+        # the value classes must not have a per-object dict
+        objs = [Vector(1.0, 2.0, 3.0), Triangle(0, 1, 2), VertexComponent(('position', 0), 3), MatParam('Diffuse', MatParam.Float4, Vector())]
+        for obj in objs :
+            self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertRaises(AttributeError, setattr, objs[0], 'bla', 1.0)
+
+        # memory footprint compared to an equivalent dict-backed class
+        class DictVector(object) :
+            def __init__(self, _x=0.0, _y=0.0, _z=0.0, _w=0.0) :
+                self.x = _x
+                self.y = _y
+                self.z = _z
+                self.w = _w
+        dictVec = DictVector(1.0, 2.0, 3.0)
+        dictSize = sys.getsizeof(dictVec) + sys.getsizeof(dictVec.__dict__)
+        slotSize = sys.getsizeof(Vector(1.0, 2.0, 3.0))
+        self.assertTrue(slotSize * 2 < dictSize)
+
 pos0 = ('position', 0)
 norm0 = ('normal', 0)
 tex0 = ('texcoord', 0)
@@ -97,6 +137,21 @@ class TestMesh(unittest.TestCase) :
         vc = VertexComponent(('position', 5), 0)
         self.assertRaises(Exception, vc.validate)
 
+        # packed formats
+        vc = VertexComponent(('normal', 0), 3)
+        self.assertEqual(vc.format, VertexComponent.Float)
+        self.assertEqual(vc.getPackedSize(), 12)
+        vc = VertexComponent(('normal', 0), 3, VertexComponent.OctSnorm16)
+        vc.validate()
+        self.assertEqual(vc.getPackedSize(), 4)
+        self.assertEqual(VertexComponent(('texcoord', 0), 3, VertexComponent.Half).getDataSize(), 6)
+        self.assertEqual(VertexComponent(('texcoord', 0), 3, VertexComponent.Half).getPackedSize(), 8)
+        self.assertEqual(VertexComponent(('color', 0), 3, VertexComponent.Unorm8).getPackedSize(), 4)
+        vc = VertexComponent(('normal', 0), 4, VertexComponent.OctSnorm16)
+        self.assertRaises(Exception, vc.validate)
+        vc = VertexComponent(('normal', 0), 3, 17)
+        self.assertRaises(Exception, vc.validate)
+
     def test_VertexLayout(self) :
         # create an empty vertex layout object
         vl = VertexLayout()
@@ -133,6 +188,17 @@ class TestMesh(unittest.TestCase) :
 
         self.assertEqual(vl.size, 10)
 
+        # packed vertex size and offsets
+        self.assertEqual(vl.getPackedSize(), 40)
+        vl.getComponent(norm0).format = VertexComponent.OctSnorm16
+        vl.getComponent(tex0).format = VertexComponent.Half
+        self.assertEqual(vl.getPackedSize(), 28)
+        self.assertEqual(vl.getPackedOffset(pos0), 0)
+        self.assertEqual(vl.getPackedOffset(norm0), 12)
+        self.assertEqual(vl.getPackedOffset(tex0), 16)
+        self.assertEqual(vl.getPackedOffset(tex1), 20)
+        self.assertEqual(vl.copy().getComponent(norm0).format, VertexComponent.OctSnorm16)
+
     def test_Mesh(self) :
 
         # create mesh with a simple vertex layout 
@@ -202,6 +268,1110 @@ class TestMesh(unittest.TestCase) :
         self.assertRaises(IndexError, lambda: mesh.vertexBuffer[24])
         self.assertRaises(IndexError, mesh.getVertex, 3, pos0);
 
+    def test_MeshPrecision(self) :
+
+        vl = self._buildVertexLayout()
+        mesh = Mesh(vl, 3)
+        self.assertEqual(mesh.getPrecision(), Mesh.Float64)
+        self.assertEqual(mesh.vertexBuffer.itemsize, 8)
+
+        mesh = Mesh(vl, 3, 0, Mesh.Float32)
+        self.assertEqual(mesh.getPrecision(), Mesh.Float32)
+        self.assertEqual(mesh.vertexBuffer.itemsize, 4)
+        self.assertEqual(len(mesh.vertexBuffer), 24)
+        mesh.reserveVertices(2)
+        self.assertEqual(mesh.getNumVertices(), 5)
+        mesh.setVertex(4, pos0, Vector(1.0, 2.0, 3.0))
+        self.assertEqual(mesh.getVertex(4, pos0), Vector(1.0, 2.0, 3.0))
+        self.assertRaises(Exception, Mesh, vl, 3, 0, 'i')
+
+        # operators must preserve the precision
+        model = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        model.mesh.vertexBuffer = array(Mesh.Float32, model.mesh.vertexBuffer)
+        reducedVl = VertexLayout()
+        reducedVl.add(VertexComponent(pos0, 3))
+        fixedModel = fixVertexComponents.do(model, reducedVl)
+        self.assertEqual(fixedModel.mesh.getPrecision(), Mesh.Float32)
+        reducedModel, indexMap = deflate.do(fixedModel)
+        self.assertEqual(reducedModel.mesh.getPrecision(), Mesh.Float32)
+        self.assertEqual(reducedModel.mesh.getNumVertices(), 8)
+
+    def test_Triangles(self) :
+
+        vl = self._buildVertexLayout()
+        mesh = Mesh(vl, 4, 2)
+        self.assertEqual(mesh.getNumTriangles(), 2)
+        self.assertEqual(len(mesh.indices), 6)
+        self.assertEqual(len(mesh.groupIndices), 2)
+        self.assertTrue(mesh.triangleNormals is None)
+
+        mesh.setTriangle(0, Triangle(0, 1, 2, 3))
+        mesh.setTriangle(1, Triangle(2, 3, 0, 1))
+        self.assertEqual(list(mesh.indices), [0, 1, 2, 2, 3, 0])
+        self.assertEqual(list(mesh.groupIndices), [3, 1])
+        self.assertTrue(mesh.triangleNormals is None)
+
+        # Triangle-compatible views
+        tri = mesh.triangles[1]
+        self.assertEqual((tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2, tri.groupIndex), (2, 3, 0, 1))
+        self.assertEqual(tri.getNormal(), Vector(0.0, 0.0, 0.0))
+        tri.vertexIndex1 = 1
+        tri.normalY = 1.0
+        self.assertEqual(mesh.indices[4], 1)
+        self.assertEqual(list(mesh.triangleNormals), [0.0, 0.0, 0.0, 0.0, 1.0, 0.0])
+        self.assertEqual(mesh.triangles[-1].getNormal(), Vector(0.0, 1.0, 0.0))
+        self.assertEqual(len(mesh.triangles), 2)
+        self.assertEqual([t.groupIndex for t in mesh.triangles], [3, 1])
+        self.assertRaises(IndexError, lambda: mesh.triangles[2])
+
+        mesh.triangles.append(Triangle(1, 2, 3, 2))
+        self.assertEqual(mesh.getNumTriangles(), 3)
+        self.assertEqual(mesh.getTriangle(2).groupIndex, 2)
+        self.assertEqual(len(mesh.triangleNormals), 9)
+        self.assertEqual([t.groupIndex for t in mesh.triangles[:2]], [3, 1])
+        self.assertEqual([t.groupIndex for t in mesh.triangles[::-2]], [2, 3])
+        self.assertEqual(mesh.triangles[5:], [])
+        self.assertRaises(TypeError, lambda: mesh.triangles['1'])
+        def assignSlice() :
+            mesh.triangles[0:1] = [Triangle(0, 1, 2, 0)]
+        self.assertRaises(TypeError, assignSlice)
+        clone = mesh.clone()
+        del clone.triangles[1:]
+        self.assertEqual(list(clone.groupIndices), [3])
+
+        mesh.removeTriangles([0, 2])
+        self.assertEqual(mesh.getNumTriangles(), 1)
+        self.assertEqual(list(mesh.indices), [2, 1, 0])
+        self.assertEqual(list(mesh.groupIndices), [1])
+        self.assertEqual(mesh.getTriangleNormal(0), (0.0, 1.0, 0.0))
+
+    def test_BulkAccess(self) :
+
+        vl = self._buildVertexLayout()
+        mesh = Mesh(vl, 4, 2)
+        mesh.setComponent(pos0, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0])
+        mesh.setComponent(tex0, [0.5, 0.25, 0.75, 1.0], 2)
+        self.assertEqual(mesh.getVertex(0, pos0), Vector(1.0, 2.0, 3.0))
+        self.assertEqual(mesh.getVertex(3, pos0), Vector(10.0, 11.0, 12.0))
+        self.assertEqual(mesh.getVertex(1, tex0), Vector(0.0, 0.0))
+        self.assertEqual(mesh.getVertex(2, tex0), Vector(0.5, 0.25))
+        self.assertEqual(mesh.getVertex(3, tex0), Vector(0.75, 1.0))
+        self.assertEqual(mesh.getVertex(3, norm0), Vector(0.0, 0.0, 0.0))
+
+        self.assertEqual(list(mesh.getComponentData(pos0, 1, 2)), [4.0, 5.0, 6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(list(mesh.getComponentData(tex0)), [0.0, 0.0, 0.0, 0.0, 0.5, 0.25, 0.75, 1.0])
+        self.assertEqual(len(mesh.getComponentData(norm0, 4)), 0)
+
+        self.assertRaises(IndexError, mesh.setComponent, pos0, [1.0, 2.0, 3.0], 4)
+        self.assertRaises(IndexError, mesh.getComponentData, pos0, 2, 3)
+        self.assertRaises(Exception, mesh.setComponent, pos0, [1.0, 2.0])
+        self.assertRaises(Exception, mesh.setComponent, ('color', 0), [1.0, 2.0, 3.0, 4.0])
+
+        mesh.setData4(0, 0, 1.0, 2.0, 3.0, 4.0)
+        self.assertEqual(mesh.getData4(0, 0), (1.0, 2.0, 3.0, 4.0))
+
+        mesh.setTriangles([0, 1, 2], 1)
+        mesh.setTriangles([2, 3, 0], 2, 1)
+        self.assertEqual(list(mesh.indices), [0, 1, 2, 2, 3, 0])
+        self.assertEqual(list(mesh.groupIndices), [1, 2])
+        self.assertRaises(IndexError, mesh.setTriangles, [0, 1, 2, 2, 3, 0], 0, 1)
+
+    def test_MeshBuilder(self) :
+
+        vl = self._buildVertexLayout()
+        builder = MeshBuilder(vl)
+        self.assertEqual(builder.appendVertex([1.0, 2.0, 3.0, 0.0, 0.0, 1.0, 0.5, 0.5]), 0)
+        self.assertEqual(builder.appendVertices([0.0] * 8 * 99), 1)
+        self.assertEqual(builder.getNumVertices(), 100)
+        self.assertTrue(len(builder.vertexBuffer) >= 100 * 8)
+        for i in range(0, 50) :
+            self.assertEqual(builder.appendTriangle(i, i + 1, i + 2, 1), i)
+        self.assertEqual(builder.appendTriangles([0, 1, 2, 3, 4, 5], 2), 50)
+        self.assertEqual(builder.getNumTriangles(), 52)
+        self.assertRaises(Exception, builder.appendVertex, [1.0, 2.0, 3.0])
+
+        # append a generated mesh, indices must be rebased
+        cubeModel = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        self.assertEqual(builder.appendMesh(cubeModel.mesh), 52)
+
+        # finalize must hand over the arrays without copying
+        vertexBuffer = builder.vertexBuffer
+        indices = builder.indices
+        mesh = builder.finalize()
+        self.assertTrue(mesh.vertexBuffer is vertexBuffer)
+        self.assertTrue(mesh.indices is indices)
+        self.assertEqual(mesh.getNumVertices(), 124)
+        self.assertEqual(mesh.getNumTriangles(), 64)
+        self.assertEqual(mesh.getVertex(0, pos0), Vector(1.0, 2.0, 3.0))
+        self.assertEqual(mesh.getVertex(100, pos0), cubeModel.mesh.getVertex(0, pos0))
+        self.assertEqual(mesh.getTriangle(1).vertexIndex2, 3)
+        self.assertEqual(mesh.getTriangle(51).groupIndex, 2)
+        self.assertEqual(mesh.getTriangle(53).vertexIndex1, 103)
+        self.assertEqual(builder.getNumVertices(), 0)
+        self.assertTrue(mesh.triangleNormals is None)
+
+        # mapped meshes append into normal builders and vice versa,
+        # the triangle normals are kept if all meshes have them
+        for mapped in (False, True) :
+            srcModel = computeTriangleNormals.do(cube.generate(vl, Vector(2.0, 2.0, 2.0)))
+            srcMesh = srcModel.mesh
+            srcMesh.mapToFile()
+            builder = MeshBuilder(vl, mapped=mapped)
+            builder.appendMesh(srcMesh)
+            builder.appendMesh(srcMesh)
+            mesh = builder.finalize()
+            self.assertEqual(mesh.getNumTriangles(), 24)
+            self.assertEqual(list(mesh.groupIndices), list(srcMesh.groupIndices) * 2)
+            self.assertEqual(list(mesh.triangleNormals), list(srcMesh.triangleNormals) * 2)
+            builder.appendMesh(srcMesh)
+            builder.appendMesh(cube.generate(vl).mesh)
+            self.assertTrue(builder.finalize().triangleNormals is None)
+
+            # vertex components are written directly into the builder
+            builder.appendVertex([0.0] * 8)
+            first = builder.appendComponents(2, [(pos0, [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]), (tex0, array('f', [0.25, 0.5, 0.75, 1.0]))])
+            self.assertEqual(first, 1)
+            self.assertRaises(Exception, builder.appendComponents, 2, [(pos0, [1.0])])
+            self.assertRaises(Exception, builder.appendComponents, 1, [(('bla', 0), [1.0])])
+            mesh = builder.finalize()
+            self.assertEqual(mesh.getNumVertices(), 3)
+            self.assertEqual(mesh.getVertex(2, pos0), Vector(4.0, 5.0, 6.0))
+            self.assertEqual(mesh.getVertex(2, norm0), Vector(0.0, 0.0, 0.0))
+            self.assertEqual(mesh.getVertex(1, tex0), Vector(0.25, 0.5))
+
+    def test_MeshBuilderDedup(self) :
+
+        vl = self._buildVertexLayout()
+        builder = MeshBuilder(vl, dedup=True)
+        vertex = [1.0, 2.0, 3.0, 0.0, 0.0, 1.0, 0.5, 0.5]
+        self.assertEqual(builder.appendVertex(vertex), 0)
+        self.assertEqual(builder.appendVertex([0.0] * 8), 1)
+        self.assertEqual(builder.appendVertex(vertex), 0)
+        self.assertEqual(builder.getNumVertices(), 2)
+        self.assertEqual(list(builder.insertVertices([0.0] * 8 + vertex + [2.0] * 8)), [1, 0, 2])
+        self.assertEqual(builder.getNumVertices(), 3)
+        self.assertRaises(Exception, builder.appendVertices, vertex)
+
+        # appending a mesh twice doesn't add any vertices the second time
+        cubeModel = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        builder.appendMesh(cubeModel.mesh)
+        self.assertEqual(builder.getNumVertices(), 27)
+        builder.appendMesh(cubeModel.mesh)
+        self.assertEqual(builder.getNumVertices(), 27)
+        mesh = builder.finalize()
+        self.assertEqual(mesh.getNumTriangles(), 24)
+        for triIndex in range(0, 12) :
+            for corner in range(0, 3) :
+                self.assertEqual(mesh.indices[triIndex * 3 + corner], mesh.indices[(triIndex + 12) * 3 + corner])
+        self.assertEqual(mesh.getVertex(mesh.indices[0], pos0), cubeModel.mesh.getVertex(cubeModel.mesh.indices[0], pos0))
+        self.assertEqual(len(builder.vertexMap), 0)
+
+        # a dedup builder matches an exact deflate
+        models = [cube.generate(vl), cylinder.generate(vl, 1.0, 1.0, 2.0, 16, 2), torus.generate(vl, 0.5, 1.0, 16, 12)]
+        for model in models :
+            builder = MeshBuilder(vl, dedup=True)
+            builder.appendMesh(model.mesh)
+            dedupMesh = builder.finalize()
+            deflatedModel, indexMap = deflate.do(model, deflate.Hash, 0.0)
+            self.assertEqual(dedupMesh.getNumVertices(), deflatedModel.mesh.getNumVertices())
+            self.assertEqual(dedupMesh.vertexBuffer, deflatedModel.mesh.vertexBuffer)
+            self.assertEqual(dedupMesh.indices, deflatedModel.mesh.indices)
+
+        # a mapped builder in dedup mode
+        builder = MeshBuilder(vl, Mesh.Float32, True, True)
+        builder.appendMesh(cubeModel.mesh)
+        builder.appendMesh(cubeModel.mesh)
+        mesh = builder.finalize()
+        self.assertTrue(mesh.isMapped())
+        self.assertEqual(mesh.getNumVertices(), 24)
+
+    def test_MappedArray(self) :
+
+        a = MappedArray('d', [1.0, 2.0, 3.0])
+        self.assertEqual(len(a), 3)
+        self.assertEqual(a[1], 2.0)
+        self.assertEqual(a[-1], 3.0)
+        self.assertRaises(IndexError, lambda: a[3])
+        a.extend(array('d', range(4, 101)))
+        self.assertEqual(len(a), 100)
+        self.assertEqual(list(a), [float(i) for i in range(1, 101)])
+        self.assertEqual(a[10:20:3], array('d', [11.0, 14.0, 17.0, 20.0]))
+        self.assertEqual(a[5:0:-2], array('d', [6.0, 4.0, 2.0]))
+        a[0:6:2] = array('d', [0.5, 0.5, 0.5])
+        self.assertEqual(a[0:6], array('d', [0.5, 2.0, 0.5, 4.0, 0.5, 6.0]))
+        self.assertRaises(ValueError, a.__setitem__, slice(0, 2), [1.0])
+        del a[1:3]
+        self.assertEqual(len(a), 98)
+        self.assertEqual(a[0:3], array('d', [0.5, 4.0, 0.5]))
+        del a[90:]
+        self.assertEqual(len(a), 90)
+        a.resize(92)
+        self.assertEqual(a[90:], array('d', [0.0, 0.0]))
+        self.assertEqual(MappedArray.zeros('I', 5).tolist(), [0, 0, 0, 0, 0])
+        b = copy.deepcopy(a)
+        b[0] = 7.0
+        self.assertEqual(a[0], 0.5)
+        self.assertEqual(b.tostring(), array('d', [7.0]).tostring() + a[1:].tostring())
+
+    def test_MappedMesh(self) :
+
+        vl = self._buildVertexLayout()
+        model = sphere.generate(vl, 2.0, 12, 8)
+        model = computeTriangleNormals.do(model)
+        mappedModel = sphere.generate(vl, 2.0, 12, 8)
+        mappedModel.mesh.mapToFile()
+        self.assertTrue(mappedModel.mesh.isMapped())
+        self.assertTrue(isinstance(mappedModel.mesh.vertexBuffer, MappedArray))
+        mappedModel = computeTriangleNormals.do(mappedModel)
+        self.assertTrue(isinstance(mappedModel.mesh.triangleNormals, MappedArray))
+        self.assertEqual(list(mappedModel.mesh.vertexBuffer), list(model.mesh.vertexBuffer))
+        self.assertEqual(list(mappedModel.mesh.triangleNormals), list(model.mesh.triangleNormals))
+
+        # operators must work unchanged on mapped meshes
+        reducedVl = VertexLayout()
+        reducedVl.add(VertexComponent(pos0, 3))
+        fixedModel = fixVertexComponents.do(mappedModel, reducedVl)
+        self.assertTrue(fixedModel.mesh.isMapped())
+        reducedModel, indexMap = deflate.do(fixedModel)
+        refModel, refIndexMap = deflate.do(fixVertexComponents.do(model, reducedVl))
+        self.assertTrue(isinstance(reducedModel.mesh.vertexBuffer, MappedArray))
+        self.assertEqual(indexMap, refIndexMap)
+        self.assertEqual(list(reducedModel.mesh.vertexBuffer), list(refModel.mesh.vertexBuffer))
+        self.assertEqual(list(reducedModel.mesh.indices), list(refModel.mesh.indices))
+        mappedModel.mesh.setTriangles([0, 0, 1], 0, 3)
+        mappedModel.mesh.removeTriangles([3])
+        self.assertEqual(mappedModel.mesh.getNumTriangles(), model.mesh.getNumTriangles() - 1)
+
+        # named files and a mapped mesh builder
+        tmpDir = tempfile.mkdtemp()
+        try :
+            path = os.path.join(tmpDir, 'sphere')
+            model.mesh.mapToFile(path)
+            self.assertTrue(os.path.getsize(path + '.vertices') >= len(model.mesh.vertexBuffer) * 8)
+            self.assertTrue(os.path.exists(path + '.normals'))
+            stlasciiwriter.write(model, os.path.join(tmpDir, 'sphere.stl'))
+            threejswriter.write(model, os.path.join(tmpDir, 'sphere.js'))
+        finally :
+            shutil.rmtree(tmpDir)
+        builder = MeshBuilder(vl, Mesh.Float32, True)
+        builder.appendMesh(model.mesh)
+        mesh = builder.finalize()
+        self.assertTrue(mesh.isMapped())
+        self.assertEqual(mesh.getNumVertices(), model.mesh.getNumVertices())
+        self.assertEqual(list(mesh.indices), list(model.mesh.indices))
+
+    def test_Clone(self) :
+
+        vl = self._buildVertexLayout()
+        model = computeTriangleNormals.do(cube.generate(vl, Vector(2.0, 2.0, 2.0)))
+        model.addMaterial(Material.createDefaultMaterial())
+        mesh = model.mesh
+
+        # a clone shares all arrays and materials
+        clone = model.clone()
+        cloneMesh = clone.mesh
+        for name in Mesh.ArrayNames :
+            self.assertTrue(getattr(cloneMesh, name) is getattr(mesh, name))
+            self.assertTrue(cloneMesh.isShared(name))
+            self.assertTrue(mesh.isShared(name))
+        self.assertTrue(clone.materials[0] is model.materials[0])
+
+        # modifying one side only copies the modified array
+        cloneMesh.setData3(0, 0, 9.0, 9.0, 9.0)
+        self.assertFalse(cloneMesh.vertexBuffer is mesh.vertexBuffer)
+        self.assertTrue(cloneMesh.indices is mesh.indices)
+        self.assertEqual(mesh.getData3(0, 0), (-1.0, -1.0, -1.0))
+        self.assertEqual(cloneMesh.getData3(0, 0), (9.0, 9.0, 9.0))
+        cloneMesh.triangles[0].vertexIndex0 = 5
+        self.assertEqual(mesh.indices[0], 0)
+        self.assertEqual(cloneMesh.indices[0], 5)
+        mesh.removeTriangle(11)
+        self.assertEqual(mesh.getNumTriangles(), 11)
+        self.assertEqual(cloneMesh.getNumTriangles(), 12)
+        self.assertEqual(len(cloneMesh.triangleNormals), 36)
+
+        # assigning a new array makes it unique
+        cloneMesh.groupIndices = array(Mesh.IndexType, [1]) * 12
+        self.assertFalse(cloneMesh.isShared('groupIndices'))
+        self.assertEqual(mesh.groupIndices[0], 0)
+
+        # materials are copied by ownMaterials()
+        clone.ownMaterials()
+        self.assertFalse(clone.materials[0] is model.materials[0])
+        clone.materials[0].get('Diffuse').x = 0.0
+        self.assertEqual(model.materials[0].get('Diffuse').x, 0.8)
+
+        # operators don't modify their source model
+        reducedVl = VertexLayout()
+        reducedVl.add(VertexComponent(pos0, 3))
+        fixedModel = fixVertexComponents.do(model, reducedVl)
+        self.assertTrue(fixedModel.mesh.indices is mesh.indices)
+        reducedModel, indexMap = deflate.do(fixedModel)
+        self.assertEqual(reducedModel.mesh.getNumVertices(), 8)
+        self.assertEqual(fixedModel.mesh.getNumVertices(), 24)
+        self.assertEqual(mesh.vertexLayout.size, 8)
+
+    def test_MultiIndexed(self) :
+
+        # build a multi-indexed cube from the separately deflated components
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        mesh = model.mesh
+        multiModel = model.clone()
+        multiModel.mesh = Mesh(vl, 0, 12)
+        for nameAndIndex in (pos0, norm0, tex0) :
+            compMesh = threejswriter.reduceComponent(model, nameAndIndex, vl.getComponent(nameAndIndex).size).mesh
+            multiModel.mesh.setStream(nameAndIndex, compMesh.vertexBuffer, compMesh.indices)
+        multiMesh = multiModel.mesh
+        self.assertTrue(multiMesh.isMultiIndexed())
+        self.assertFalse(mesh.isMultiIndexed())
+        self.assertEqual(multiMesh.getStream(pos0).getNumValues(), 8)
+        self.assertEqual(multiMesh.getStream(norm0).getNumValues(), 6)
+        self.assertEqual(multiMesh.getStream(tex0).getNumValues(), 4)
+        self.assertRaises(Exception, multiMesh.setStream, pos0, [0.0, 0.0, 0.0], [0, 0, 0])
+        self.assertRaises(IndexError, multiMesh.setStream, pos0, [0.0, 0.0, 0.0], [1] * 36)
+        self.assertRaises(Exception, deflate.do, multiModel)
+        computeTriangleNormals.do(multiModel)
+        self.assertEqual(list(multiMesh.triangleNormals), list(computeTriangleNormals.do(model).mesh.triangleNormals))
+
+        # flattening restores the interleaved vertices
+        flatModel = flattenIndices.do(multiModel)
+        flatMesh = flatModel.mesh
+        self.assertFalse(flatMesh.isMultiIndexed())
+        self.assertTrue(multiMesh.isMultiIndexed())
+        self.assertEqual(flatMesh.getNumVertices(), 24)
+        self.assertEqual(flatMesh.getNumTriangles(), 12)
+        vertexSize = vl.size
+        for corner in range(0, 36) :
+            srcIndex = mesh.indices[corner] * vertexSize
+            dstIndex = flatMesh.indices[corner] * vertexSize
+            self.assertEqual(list(flatMesh.vertexBuffer[dstIndex:dstIndex + vertexSize]), list(mesh.vertexBuffer[srcIndex:srcIndex + vertexSize]))
+        self.assertTrue(flattenIndices.do(flatModel) is flatModel)
+
+        # streams of a clone are copied before they are modified
+        cloneMesh = multiModel.clone().mesh
+        self.assertTrue(cloneMesh.isShared(pos0))
+        self.assertFalse(cloneMesh.getStream(pos0) is multiMesh.getStream(pos0))
+        self.assertTrue(cloneMesh.getStream(pos0).values is multiMesh.getStream(pos0).values)
+        version = cloneMesh.version
+        stream = cloneMesh.makeUnique(pos0)
+        stream.values[0] = 9.0
+        stream.indices[0] = 1
+        self.assertFalse(cloneMesh.isShared(pos0))
+        self.assertTrue(cloneMesh.version > version)
+        self.assertNotEqual(multiMesh.getStream(pos0).values[0], 9.0)
+        self.assertNotEqual(multiMesh.getStream(pos0).indices[0], 1)
+        self.assertTrue(cloneMesh.getStream(norm0).values is multiMesh.getStream(norm0).values)
+
+        # mesh builder with multi-indexed meshes
+        builder = MeshBuilder(vl)
+        builder.appendMesh(multiMesh)
+        builder.appendMesh(multiMesh)
+        builtMesh = builder.finalize()
+        self.assertEqual(builtMesh.getNumTriangles(), 24)
+        self.assertEqual(builtMesh.getStream(pos0).getNumValues(), 16)
+        self.assertEqual(builtMesh.getStream(pos0).indices[36], multiMesh.getStream(pos0).indices[0] + 8)
+        builder.appendMesh(multiMesh)
+        self.assertRaises(Exception, builder.appendMesh, mesh)
+
+        # the three.js writer directly uses the streams
+        tmpDir = tempfile.mkdtemp()
+        try :
+            path = os.path.join(tmpDir, 'cube.js')
+            threejswriter.write(multiModel, path)
+            multiJs = open(path).read()
+            threejswriter.write(model, path)
+            self.assertEqual(multiJs, open(path).read())
+        finally :
+            shutil.rmtree(tmpDir)
+
+    def test_DerivedDataCache(self) :
+
+        vl = self._buildVertexLayout()
+        model = sphere.generate(vl, 2.0, 12, 8)
+        mesh = model.mesh
+
+        # bounding volumes and min/max
+        bmin, bmax = mesh.getBoundingBox()
+        self.assertTrue(Vector.equal(bmin, Vector(-2.0, -2.0, -2.0), 0.00001))
+        self.assertTrue(Vector.equal(bmax, Vector(2.0, 2.0, 2.0), 0.00001))
+        center, radius = mesh.getBoundingSphere()
+        self.assertTrue(Vector.equal(center, Vector(), 0.00001))
+        self.assertTrue(abs(radius - 2.0) < 0.00001)
+        mins, maxs = mesh.getComponentMinMax(tex0)
+        self.assertEqual(mins, (0.0, 0.0))
+        self.assertTrue(mesh.getComponentMinMax(pos0) is mesh.getComponentMinMax(pos0))
+        self.assertEqual(Mesh(vl).getBoundingBox(), None)
+
+        # derived data is cached until the geometry changes
+        faceNormals = mesh.getFaceNormals()
+        self.assertTrue(mesh.getFaceNormals() is faceNormals)
+        self.assertEqual(len(faceNormals), mesh.getNumTriangles() * 3)
+        self.assertEqual(mesh.getDegenerateTriangles(), ())
+        computeTriangleNormals.do(model)
+        self.assertFalse(mesh.triangleNormals is faceNormals)
+        self.assertEqual(list(mesh.triangleNormals), list(faceNormals))
+        self.assertTrue(mesh.getFaceNormals() is faceNormals)
+        mesh.triangleNormals[0] = 42.0
+        self.assertNotEqual(mesh.getFaceNormals()[0], 42.0)
+        version = mesh.version
+        mesh.groupIndices = array(Mesh.IndexType, [1]) * mesh.getNumTriangles()
+        self.assertEqual(mesh.version, version)
+        mesh.setData3(0, 0, 0.0, 0.0, 5.0)
+        self.assertTrue(mesh.version > version)
+        self.assertFalse(mesh.getFaceNormals() is faceNormals)
+        self.assertEqual(mesh.getBoundingBox()[1].z, 5.0)
+        mesh.setTriangles([0, 0, 1], 0, 0)
+        self.assertEqual(mesh.getDegenerateTriangles(), (0,))
+        self.assertEqual(mesh.getZeroAreaTriangles(), (0,))
+        version = mesh.version
+        mesh.touch()
+        self.assertEqual(mesh.version, version + 1)
+
+        # clones share the cached data until they are modified
+        faceNormals = mesh.getFaceNormals()
+        clone = mesh.clone()
+        self.assertTrue(clone.getFaceNormals() is faceNormals)
+        clone.setData3(0, 0, 0.0, 0.0, 2.0)
+        self.assertEqual(clone.getBoundingBox()[1].z, 2.0)
+        self.assertEqual(mesh.getBoundingBox()[1].z, 5.0)
+
+        # direct writes to the geometry arrays need touch()
+        faceNormals = mesh.getFaceNormals()
+        tri = mesh.getTriangle(1)
+        mesh.vertexBuffer[tri.vertexIndex0 * vl.size + 2] = 9.0
+        mesh.touch()
+        self.assertFalse(mesh.getFaceNormals() is faceNormals)
+        self.assertNotEqual(list(mesh.getFaceNormals()[3:6]), list(faceNormals[3:6]))
+        self.assertEqual(mesh.getBoundingBox()[1].z, 9.0)
+        faceNormals = mesh.getFaceNormals()
+        mesh.indices[3] = tri.vertexIndex1
+        mesh.touch()
+        self.assertEqual(mesh.getDegenerateTriangles(), (0, 1))
+        self.assertFalse(mesh.getFaceNormals() is faceNormals)
+
+    def test_Fingerprint(self) :
+
+        vl = self._buildVertexLayout()
+        model = sphere.generate(vl, 2.0, 12, 8)
+        fp = model.fingerprint()
+        self.assertEqual(len(fp), 40)
+        self.assertEqual(fp, sphere.generate(vl, 2.0, 12, 8).fingerprint())
+        self.assertEqual(fp, model.clone().fingerprint())
+        self.assertNotEqual(fp, sphere.generate(vl, 2.0, 12, 9).fingerprint())
+        self.assertNotEqual(model.mesh.fingerprint(), fp)
+
+        # storage doesn't matter, content does
+        mapped = model.clone()
+        mapped.mesh.mapToFile()
+        self.assertEqual(mapped.fingerprint(), fp)
+        clone = model.clone()
+        clone.mesh.setData1(3, 6, 0.5)
+        self.assertNotEqual(clone.fingerprint(), fp)
+        clone = model.clone()
+        clone.mesh.triangles[0].groupIndex = 1
+        self.assertNotEqual(clone.fingerprint(), fp)
+        clone = computeTriangleNormals.do(model.clone())
+        self.assertNotEqual(clone.fingerprint(), fp)
+        clone = model.clone()
+        clone.ownMaterials()
+        clone.materials[0].get('Diffuse').x = 0.5
+        self.assertNotEqual(clone.fingerprint(), fp)
+        clone = model.clone()
+        clone.mesh = fixVertexComponents.do(model, vl).mesh
+        self.assertEqual(clone.fingerprint(), fp)
+
+    def test_MaterialLookup(self) :
+
+        mat = Material.createDefaultMaterial()
+        self.assertTrue(mat.hasParam('Diffuse'))
+        self.assertEqual(mat.get('Diffuse'), Vector(0.8, 0.8, 0.8))
+        self.assertEqual(mat.getParam('Ambient').name, 'Ambient')
+        self.assertEqual(mat.get('Bla'), None)
+        mat.addParam(MatParam('Diffuse', MatParam.Float4, Vector()))
+        self.assertEqual(mat.get('Diffuse'), Vector(0.8, 0.8, 0.8))
+        self.assertEqual(mat.removeParam('Diffuse').name, 'Diffuse')
+        self.assertFalse(mat.hasParam('Diffuse'))
+        self.assertEqual(len(mat.params), 6)
+        self.assertEqual(mat.removeParam('Diffuse'), None)
+        self.assertEqual(mat.clone().get('Ambient'), Vector(0.2, 0.2, 0.2))
+
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl)
+        for name in ('red', 'green', 'blue') :
+            model.addMaterial(Material(name))
+        self.assertEqual(model.findMaterialIndex('green'), 2)
+        self.assertEqual(model.findMaterial('blue').name, 'blue')
+        self.assertEqual(model.findMaterial('bla'), None)
+        model.addMaterial(Material('red'))
+        self.assertEqual(model.getNumMaterials(), 4)
+
+        # removing a material fixes the indices and triangle group indices
+        model.mesh.setTriangles([0, 1, 2], 3, 5)
+        self.assertRaises(Exception, model.removeMaterial, 'default')
+        clone = model.clone()
+        self.assertEqual(model.removeMaterial('green').name, 'green')
+        self.assertEqual(model.findMaterialIndex('blue'), 2)
+        self.assertEqual(model.findMaterial('green'), None)
+        self.assertEqual(model.mesh.groupIndices[5], 2)
+        self.assertEqual(model.removeMaterial('green'), None)
+        self.assertEqual(clone.findMaterialIndex('blue'), 3)
+        self.assertEqual(clone.mesh.groupIndices[5], 3)
+
+    @unittest.skipIf(numpy is None, 'numpy not installed')
+    def test_ComponentView(self) :
+
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        mesh = model.mesh
+
+        # creating a view keeps the cached data, only shared arrays are copied
+        faceNormals = mesh.getFaceNormals()
+        version = mesh.version
+        vertexBuffer = mesh.vertexBuffer
+        positions = mesh.componentView(pos0)
+        self.assertEqual(mesh.version, version)
+        self.assertTrue(mesh.vertexBuffer is vertexBuffer)
+        self.assertTrue(mesh.getFaceNormals() is faceNormals)
+        clone = mesh.clone()
+        clone.vertexView()[0, 0] = 7.0
+        self.assertFalse(clone.vertexBuffer is vertexBuffer)
+        self.assertNotEqual(mesh.vertexBuffer[0], 7.0)
+        self.assertTrue(clone.getFaceNormals() is not faceNormals)
+
+        self.assertEqual(positions.shape, (24, 3))
+        self.assertEqual(mesh.componentView(tex0).shape, (24, 2))
+        for vertexIndex in range(0, 24) :
+            self.assertEqual(tuple(positions[vertexIndex]), mesh.getData3(vertexIndex, 0))
+
+        # writing through the view must modify the vertex buffer (no copy)
+        normals = mesh.componentView(norm0)
+        normals *= -1.0
+        self.assertEqual(mesh.getVertex(0, norm0), Vector(1.0, 0.0, 0.0))
+        positions[:, 2] = 5.0
+        self.assertEqual(mesh.getVertex(7, pos0).z, 5.0)
+        self.assertEqual(mesh.vertexBuffer[2], 5.0)
+        self.assertEqual(mesh.getBoundingBox()[0].z, 5.0)
+        positions[0, 2] = 4.0
+        self.assertEqual(mesh.getBoundingBox()[0].z, 4.0)
+
+        indices = mesh.indexView()
+        self.assertEqual(indices.shape, (12, 3))
+        self.assertEqual(tuple(indices[1]), (2, 3, 0))
+        faceNormals = mesh.getFaceNormals()
+        indices[0, 0] = 1
+        self.assertEqual(mesh.indices[0], 1)
+        self.assertFalse(mesh.getFaceNormals() is faceNormals)
+        self.assertRaises(Exception, mesh.componentView, ('color', 0))
+
+        # views on memory-mapped meshes
+        mesh.mapToFile()
+        positions = mesh.componentView(pos0)
+        positions[:, 0] = 2.0
+        self.assertEqual(mesh.getVertex(3, pos0).x, 2.0)
+        self.assertEqual(tuple(mesh.indexView()[0]), (1, 1, 2))
+
+    def test_FaceNormalsBatched(self) :
+
+        # add a zero-area triangle to a sphere
+        vl = self._buildVertexLayout()
+        model = sphere.generate(vl, 1.0, 128, 64)
+        mesh = model.mesh
+        mesh.setTriangle(5, Triangle(3, 3, 4))
+
+        # the per-triangle reference implementation
+        expected = []
+        for triIndex in range(0, mesh.getNumTriangles()) :
+            tri = mesh.getTriangle(triIndex)
+            v0 = mesh.getVertex(tri.vertexIndex0, pos0)
+            cross = Vector.cross3(mesh.getVertex(tri.vertexIndex1, pos0) - v0, mesh.getVertex(tri.vertexIndex2, pos0) - v0)
+            if cross != Vector(0.0, 0.0, 0.0) :
+                expected.append(Vector.normalize(cross))
+            else :
+                expected.append(Vector(0.0, 1.0, 0.0))
+
+        # the pure Python and numpy code paths must match the reference
+        import drahtgitter.core
+        paths = [('python', None)]
+        if numpy is not None :
+            paths.append(('numpy', numpy))
+        for name, module in paths :
+            drahtgitter.core.numpy = module
+            try :
+                mesh.touch()
+                normals = mesh.getFaceNormals()
+                self.assertEqual(mesh.getZeroAreaTriangles(), (5,))
+                for triIndex in range(0, mesh.getNumTriangles()) :
+                    normal = Vector(normals[triIndex * 3], normals[triIndex * 3 + 1], normals[triIndex * 3 + 2])
+                    self.assertTrue(Vector.equal(normal, expected[triIndex], 0.000001))
+                computeTriangleNormals.do(model)
+                self.assertEqual(list(mesh.triangleNormals), list(normals))
+            finally :
+                drahtgitter.core.numpy = numpy
+
+    def test_ComputeVertexNormals(self) :
+
+        # a welded positions-only cube, the normal component is added
+        vl = self._buildVertexLayout()
+        posVl = VertexLayout()
+        posVl.add(VertexComponent(pos0, 3))
+        model = fixVertexComponents.do(cube.generate(vl, Vector(2.0, 2.0, 2.0)), posVl)
+        model, indexMap = deflate.do(model, deflate.Hash, 0.0)
+        self.assertEqual(model.mesh.getNumVertices(), 8)
+        smoothModel = computeVertexNormals.do(model)
+        mesh = smoothModel.mesh
+        self.assertFalse(model.mesh.vertexLayout.contains(norm0))
+        self.assertTrue(mesh.vertexLayout.contains(norm0))
+        self.assertEqual(mesh.getNumVertices(), 8)
+        self.assertTrue(mesh.indices is model.mesh.indices)
+        for vertexIndex in range(0, 8) :
+            pos = mesh.getVertex(vertexIndex, pos0)
+            self.assertEqual(pos, model.mesh.getVertex(vertexIndex, pos0))
+            self.assertTrue(Vector.equal(mesh.getVertex(vertexIndex, norm0), Vector.normalize(pos), 0.000001))
+
+        # a crease angle splits each corner into 3 vertices with the face normals
+        flatModel = computeVertexNormals.do(model, computeVertexNormals.Angle, 60.0)
+        mesh = flatModel.mesh
+        self.assertEqual(mesh.getNumVertices(), 24)
+        faceNormals = mesh.getFaceNormals()
+        for corner in range(0, mesh.getNumTriangles() * 3) :
+            triIndex = corner / 3
+            faceNormal = Vector(faceNormals[triIndex * 3], faceNormals[triIndex * 3 + 1], faceNormals[triIndex * 3 + 2])
+            self.assertTrue(Vector.equal(mesh.getVertex(mesh.indices[corner], norm0), faceNormal, 0.000001))
+            self.assertEqual(mesh.getVertex(mesh.indices[corner], pos0), model.mesh.getVertex(model.mesh.indices[corner], pos0))
+
+        # the split vertices of a cube keep their face normals, a crease
+        # angle welds them
+        splitModel = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        mesh = computeVertexNormals.do(splitModel).mesh
+        self.assertEqual(mesh.getNumVertices(), 24)
+        faceNormals = mesh.getFaceNormals()
+        for corner in range(0, mesh.getNumTriangles() * 3) :
+            triIndex = corner / 3
+            faceNormal = Vector(faceNormals[triIndex * 3], faceNormals[triIndex * 3 + 1], faceNormals[triIndex * 3 + 2])
+            self.assertTrue(Vector.equal(mesh.getVertex(mesh.indices[corner], norm0), faceNormal, 0.000001))
+        mesh = computeVertexNormals.do(splitModel, computeVertexNormals.Angle, 100.0).mesh
+        self.assertEqual(mesh.getNumVertices(), 24)
+        for vertexIndex in range(0, 24) :
+            self.assertTrue(Vector.equal(mesh.getVertex(vertexIndex, norm0), Vector.normalize(mesh.getVertex(vertexIndex, pos0)), 0.000001))
+
+        # the normals of a sphere point away from the center
+        sphereModel = sphere.generate(vl, 1.0, 64, 32)
+        for weighting in [computeVertexNormals.Angle, computeVertexNormals.Area] :
+            smoothModel = computeVertexNormals.do(sphereModel, weighting)
+            mesh = smoothModel.mesh
+            self.assertEqual(mesh.getNumVertices(), sphereModel.mesh.getNumVertices())
+            for vertexIndex in range(0, mesh.getNumVertices()) :
+                self.assertTrue(Vector.equal(mesh.getVertex(vertexIndex, norm0), mesh.getVertex(vertexIndex, pos0), 0.05))
+        self.assertRaises(Exception, computeVertexNormals.do, sphereModel, 'bla')
+
+    def _checkTangentSpace(self, mesh) :
+        # tangent and binormal must be unit length and orthogonal to the normal
+        tan0 = ('tangent', 0)
+        binorm0 = ('binormal', 0)
+        for vertexIndex in range(0, mesh.getNumVertices()) :
+            n = mesh.getVertex(vertexIndex, norm0)
+            t = mesh.getVertex(vertexIndex, tan0)
+            b = mesh.getVertex(vertexIndex, binorm0)
+            self.assertAlmostEqual(Vector.length(t), 1.0)
+            self.assertAlmostEqual(Vector.length(b), 1.0)
+            self.assertAlmostEqual(Vector.dot3(n, t), 0.0)
+            self.assertAlmostEqual(Vector.dot3(n, b), 0.0)
+            self.assertAlmostEqual(abs(Vector.dot3(Vector.cross3(n, t), b)), 1.0)
+
+    def test_ComputeTangents(self) :
+
+        # the tangents of a cube follow the u direction of each face
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        tangentModel = computeTangents.do(model)
+        mesh = tangentModel.mesh
+        self.assertEqual(mesh.getNumVertices(), 24)
+        self.assertTrue(mesh.indices is model.mesh.indices)
+        self.assertTrue(mesh.vertexLayout.contains(('tangent', 0)))
+        self.assertFalse(model.mesh.vertexLayout.contains(('tangent', 0)))
+        self._checkTangentSpace(mesh)
+        for triIndex in range(0, mesh.getNumTriangles()) :
+            tri = mesh.getTriangle(triIndex)
+            p0 = mesh.getVertex(tri.vertexIndex0, pos0)
+            p1 = mesh.getVertex(tri.vertexIndex1, pos0)
+            uv0 = mesh.getVertex(tri.vertexIndex0, tex0)
+            uv1 = mesh.getVertex(tri.vertexIndex1, tex0)
+            du = uv1.x - uv0.x
+            if du != 0.0 :
+                t = mesh.getVertex(tri.vertexIndex0, ('tangent', 0))
+                self.assertTrue(Vector.dot3(t, p1 - p0) * du > 0.0)
+        noUvVl = VertexLayout()
+        noUvVl.add(VertexComponent(pos0, 3))
+        noUvVl.add(VertexComponent(norm0, 3))
+        self.assertRaises(Exception, computeTangents.do, sphere.generate(noUvVl, 1.0, 8, 4))
+
+        # a uv mapping mirrored at the y axis, the shared vertices
+        # on the mirror seam must be split
+        mesh = Mesh(vl, 4, 2)
+        for vertexIndex, pos, uv in [(0, Vector(0.0, 0.0, 0.0), Vector(0.0, 0.0)),
+                                     (1, Vector(1.0, 0.0, 0.0), Vector(1.0, 0.0)),
+                                     (2, Vector(-1.0, 0.0, 0.0), Vector(1.0, 0.0)),
+                                     (3, Vector(0.0, 1.0, 0.0), Vector(0.0, 1.0))] :
+            mesh.setVertex(vertexIndex, pos0, pos)
+            mesh.setVertex(vertexIndex, norm0, Vector(0.0, 0.0, 1.0))
+            mesh.setVertex(vertexIndex, tex0, uv)
+        mesh.setTriangles([0, 1, 3, 0, 3, 2], 0)
+        model = Model('mirrored')
+        model.mesh = mesh
+        mesh = computeTangents.do(model).mesh
+        self.assertEqual(mesh.getNumVertices(), 6)
+        self._checkTangentSpace(mesh)
+        right = mesh.getTriangle(0)
+        left = mesh.getTriangle(1)
+        self.assertEqual(right.vertexIndex0, 0)
+        self.assertEqual(right.vertexIndex2, 3)
+        self.assertTrue(left.vertexIndex0 >= 4 and left.vertexIndex1 >= 4)
+        self.assertEqual(left.vertexIndex2, 2)
+        self.assertEqual(mesh.getVertex(left.vertexIndex0, pos0), mesh.getVertex(right.vertexIndex0, pos0))
+        self.assertEqual(mesh.getVertex(right.vertexIndex0, ('tangent', 0)), Vector(1.0, 0.0, 0.0))
+        self.assertEqual(mesh.getVertex(left.vertexIndex0, ('tangent', 0)), Vector(-1.0, 0.0, 0.0))
+        for vertexIndex in range(0, mesh.getNumVertices()) :
+            self.assertEqual(mesh.getVertex(vertexIndex, ('binormal', 0)), Vector(0.0, 1.0, 0.0))
+
+        # a sphere with a planar uv mapping
+        sphereModel = sphere.generate(vl, 1.0, 32, 16)
+        positions = sphereModel.mesh.getComponentData(pos0)
+        uvs = []
+        for i in range(0, len(positions), 3) :
+            uvs.extend((positions[i], positions[i + 2]))
+        sphereModel.mesh.setComponent(tex0, uvs)
+        self._checkTangentSpace(computeTangents.do(sphereModel).mesh)
+
+    def _shuffledSphere(self, numSlices, numStacks) :
+        # a sphere with 2 triangle groups and shuffled triangles
+        model = sphere.generate(self._buildVertexLayout(), 1.0, numSlices, numStacks)
+        mesh = model.mesh
+        numTriangles = mesh.getNumTriangles()
+        mesh.groupIndices = array(Mesh.IndexType, [0] * (numTriangles / 2) + [1] * (numTriangles - numTriangles / 2))
+        model.addMaterial(Material('second', 'phong'))
+        order = range(0, numTriangles)
+        random.Random(1).shuffle(order)
+        mesh.reorderTriangles(order)
+        return model
+
+    def test_ReorderTriangles(self) :
+        vl = self._buildVertexLayout()
+        model = computeTriangleNormals.do(cube.generate(vl))
+        mesh = model.mesh
+        order = range(mesh.getNumTriangles() - 1, -1, -1)
+        clone = mesh.clone()
+        clone.reorderTriangles(order)
+        self.assertEqual(list(clone.indices[0:3]), list(mesh.indices[-3:]))
+        self.assertEqual(list(clone.triangleNormals[0:3]), list(mesh.triangleNormals[-3:]))
+        self.assertEqual(clone.getTriangle(0).vertexIndex1, mesh.getTriangle(11).vertexIndex1)
+        self.assertNotEqual(clone.version, mesh.version)
+        self.assertRaises(Exception, clone.reorderTriangles, [0, 1])
+        # the ACMR of the cube: 24 vertices, each transformed once
+        self.assertEqual(mesh.getACMR(), 2.0)
+        self.assertEqual(mesh.getACMR(3), 2.5)
+
+    def test_OptimizeVertexCache(self) :
+        model = self._shuffledSphere(64, 32)
+        mesh = model.mesh
+        optModel = optimizeVertexCache.do(model)
+        optMesh = optModel.mesh
+        self.assertEqual(optMesh.groupIndices, mesh.groupIndices)
+        self.assertTrue(optMesh.getACMR() < mesh.getACMR() * 0.5)
+        self.assertTrue(optMesh.getACMR() < 1.0)
+
+        # each group must contain the same triangles
+        def groupTriangles(mesh, groupIndex) :
+            return sorted(tuple(mesh.indices[t * 3:t * 3 + 3]) for t in range(0, mesh.getNumTriangles()) if mesh.groupIndices[t] == groupIndex)
+        for groupIndex in (0, 1) :
+            self.assertEqual(groupTriangles(optMesh, groupIndex), groupTriangles(mesh, groupIndex))
+
+    def test_OptimizeOverdraw(self) :
+        vl = self._buildVertexLayout()
+        model = torus.generate(vl, 0.5, 1.0, 32, 48)
+        order = range(0, model.mesh.getNumTriangles())
+        random.Random(1).shuffle(order)
+        model.mesh.reorderTriangles(order)
+        cacheModel = optimizeVertexCache.do(model)
+        overdrawModel = optimizeOverdraw.do(cacheModel, 1.05)
+        mesh = overdrawModel.mesh
+        self.assertTrue(mesh.vertexBuffer is cacheModel.mesh.vertexBuffer)
+        self.assertEqual(sorted(tuple(mesh.indices[t * 3:t * 3 + 3]) for t in range(0, mesh.getNumTriangles())),
+                         sorted(tuple(model.mesh.indices[t * 3:t * 3 + 3]) for t in range(0, mesh.getNumTriangles())))
+        self.assertTrue(mesh.getACMR() < cacheModel.mesh.getACMR() * 1.25)
+
+        # the outside of the torus must come before the inside (which
+        # is occluded by the outside from most view directions)
+        def occlusionPotential(triIndex) :
+            tri = mesh.getTriangle(triIndex)
+            p0 = mesh.getVertex(tri.vertexIndex0, pos0)
+            p1 = mesh.getVertex(tri.vertexIndex1, pos0)
+            p2 = mesh.getVertex(tri.vertexIndex2, pos0)
+            centroid = Vector.scale(p0 + p1 + p2, 1.0 / 3.0)
+            return Vector.dot3(centroid, Vector.cross3(p1 - p0, p2 - p0))
+        numTriangles = mesh.getNumTriangles()
+        first = sum(occlusionPotential(t) for t in range(0, numTriangles / 4))
+        last = sum(occlusionPotential(t) for t in range(numTriangles - numTriangles / 4, numTriangles))
+        self.assertTrue(first > 0.0)
+        self.assertTrue(last < first)
+
+        # a higher threshold trades vertex cache efficiency for overdraw
+        looseModel = optimizeOverdraw.do(cacheModel, 3.0)
+        self.assertTrue(looseModel.mesh.getACMR() >= mesh.getACMR())
+        self.assertRaises(Exception, optimizeOverdraw.do, cacheModel, 0.5)
+
+    def test_OptimizeVertexFetch(self) :
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl, Vector(2.0, 2.0, 2.0))
+        model.mesh.removeTriangles([0, 1])
+        model.mesh.reorderTriangles(range(model.mesh.getNumTriangles() - 1, -1, -1))
+        fetchModel, indexMap = optimizeVertexFetch.do(model)
+        mesh = fetchModel.mesh
+        self.assertEqual(len(indexMap), 24)
+        self.assertEqual(indexMap[0:4], [-1, -1, -1, -1])
+        self.assertEqual(mesh.getNumVertices(), 20)
+        self.assertEqual(mesh.getNumTriangles(), 10)
+        self.assertTrue(mesh.groupIndices is model.mesh.groupIndices)
+
+        # the vertices are in first reference order
+        seen = -1
+        for vertexIndex in mesh.indices :
+            self.assertTrue(vertexIndex <= seen + 1)
+            seen = max(seen, vertexIndex)
+
+        # each triangle must reference the same vertex data
+        for corner in range(0, len(mesh.indices)) :
+            srcIndex = model.mesh.indices[corner]
+            self.assertEqual(indexMap[srcIndex], mesh.indices[corner])
+            for comp in (pos0, norm0, tex0) :
+                self.assertEqual(mesh.getVertex(mesh.indices[corner], comp), model.mesh.getVertex(srcIndex, comp))
+
+    def test_SortTriangleGroups(self) :
+        vl = self._buildVertexLayout()
+        model = cube.generate(vl)
+        mesh = model.mesh
+        self.assertEqual(mesh.groupRanges(), [(0, 0, 12)])
+        mesh.groupIndices = array(Mesh.IndexType, [2, 0, 1, 0, 2, 2, 1, 0, 0, 2, 1, 0])
+        self.assertEqual(mesh.groupRanges()[0:3], [(2, 0, 1), (0, 1, 1), (1, 2, 1)])
+        self.assertEqual(len(mesh.groupRanges()), 10)
+        self.assertEqual(Mesh().groupRanges(), [])
+
+        sortedModel = sortTriangleGroups.do(model)
+        sortedMesh = sortedModel.mesh
+        self.assertEqual(sortedMesh.groupRanges(), [(0, 0, 5), (1, 5, 3), (2, 8, 4)])
+        self.assertEqual(list(sortedMesh.groupIndices), [0] * 5 + [1] * 3 + [2] * 4)
+        self.assertTrue(sortedMesh.vertexBuffer is mesh.vertexBuffer)
+
+        # the sort is stable
+        expected = [t for g in (0, 1, 2) for t in range(0, 12) if mesh.groupIndices[t] == g]
+        for triIndex in range(0, 12) :
+            srcTri = mesh.getTriangle(expected[triIndex])
+            dstTri = sortedMesh.getTriangle(triIndex)
+            self.assertEqual((dstTri.vertexIndex0, dstTri.vertexIndex1, dstTri.vertexIndex2, dstTri.groupIndex),
+                             (srcTri.vertexIndex0, srcTri.vertexIndex1, srcTri.vertexIndex2, srcTri.groupIndex))
+
+    def _gridModel(self, n) :
+        # a flat n x n quad grid in the xy plane, uvs follow the positions
+        vl = self._buildVertexLayout()
+        mesh = Mesh(vl, (n + 1) * (n + 1), n * n * 2)
+        for y in range(0, n + 1) :
+            for x in range(0, n + 1) :
+                vertexIndex = y * (n + 1) + x
+                mesh.setVertex(vertexIndex, pos0, Vector(x, y, 0.0))
+                mesh.setVertex(vertexIndex, norm0, Vector(0.0, 0.0, 1.0))
+                mesh.setVertex(vertexIndex, tex0, Vector(float(x) / n, float(y) / n))
+        triIndex = 0
+        for y in range(0, n) :
+            for x in range(0, n) :
+                i0 = y * (n + 1) + x
+                mesh.setTriangle(triIndex, Triangle(i0, i0 + 1, i0 + n + 2, 0))
+                mesh.setTriangle(triIndex + 1, Triangle(i0, i0 + n + 2, i0 + n + 1, 0))
+                triIndex += 2
+        model = Model('grid')
+        model.mesh = mesh
+        return model
+
+    def test_Simplify(self) :
+        self.assertRaises(Exception, simplify.do, self._gridModel(2))
+
+        # the pure Python priority queue and the numpy passes
+        paths = [('python', None)]
+        if numpy is not None :
+            paths.append(('numpy', numpy))
+        for name, module in paths :
+            simplify.numpy = module
+            try :
+                # a flat grid collapses with zero error, the corners stay
+                model = self._gridModel(8)
+                simplified = simplify.do(model, maxError=0.0001)
+                mesh = simplified.mesh
+                self.assertTrue(mesh.getNumTriangles() <= 8)
+                self.assertTrue(mesh.getNumTriangles() >= 2)
+                for triIndex in range(0, mesh.getNumTriangles()) :
+                    self.assertTrue(mesh.getFaceNormals()[triIndex * 3 + 2] > 0.99)
+                corners = set((v.x, v.y) for v in (mesh.getVertex(i, pos0) for i in range(0, mesh.getNumVertices())))
+                for corner in ((0.0, 0.0), (8.0, 0.0), (0.0, 8.0), (8.0, 8.0)) :
+                    self.assertTrue(corner in corners)
+
+                # a sphere with a triangle group per hemisphere
+                model = sphere.generate(self._buildVertexLayout(), 1.0, 32, 16)
+                srcMesh = model.mesh
+                srcNormals = srcMesh.getFaceNormals()
+                srcMesh.groupIndices = array(Mesh.IndexType, [0 if srcNormals[triIndex * 3 + 2] > 0.0 else 1 for triIndex in range(0, srcMesh.getNumTriangles())])
+                model.addMaterial(Material('second', 'phong'))
+                target = srcMesh.getNumTriangles() / 4
+                simplified = simplify.do(model, target)
+                mesh = simplified.mesh
+                self.assertTrue(mesh.getNumTriangles() <= target)
+                self.assertTrue(mesh.getNumTriangles() >= target - 2)
+                self.assertTrue(mesh.getNumVertices() < srcMesh.getNumVertices())
+                self.assertEqual(srcMesh.getNumTriangles(), 32 * 2 + 32 * 2 * 14)
+                faceNormals = mesh.getFaceNormals()
+                for triIndex in range(0, mesh.getNumTriangles()) :
+                    tri = mesh.getTriangle(triIndex)
+                    center = Vector()
+                    for vertexIndex in (tri.vertexIndex0, tri.vertexIndex1, tri.vertexIndex2) :
+                        vertex = mesh.getVertex(vertexIndex, pos0)
+                        self.assertAlmostEqual(Vector.length(vertex), 1.0, 5)
+                        # the hemisphere border is kept
+                        if tri.groupIndex == 0 :
+                            self.assertTrue(vertex.z > -0.0001)
+                        else :
+                            self.assertTrue(vertex.z < 0.0001)
+                        center = center + vertex
+                    # no flipped triangles
+                    self.assertTrue(Vector.dot3(center, Vector(faceNormals[triIndex * 3], faceNormals[triIndex * 3 + 1], faceNormals[triIndex * 3 + 2])) > 0.0)
+
+                # the cube's hard edges are attribute seams, its corners are locked
+                model = cube.generate(self._buildVertexLayout())
+                self.assertEqual(simplify.do(model, 2).mesh.getNumTriangles(), 12)
+            finally :
+                simplify.numpy = numpy
+
+    def test_BuildMeshlets(self) :
+        model = optimizeVertexCache.do(self._shuffledSphere(64, 32))
+        self.assertRaises(Exception, buildMeshlets.do, model, 2)
+        self.assertRaises(Exception, buildMeshlets.do, model, 300)
+        self.assertRaises(Exception, buildMeshlets.do, model, 64, 0)
+        dstModel, meshlets = buildMeshlets.do(model, 64, 124)
+        mesh = dstModel.mesh
+        numTriangles = model.mesh.getNumTriangles()
+        self.assertEqual(mesh.getNumTriangles(), numTriangles)
+        self.assertTrue(len(meshlets) < numTriangles / 60)
+
+        # the meshlets cover the triangles in order, and their
+        # local indices reference the same vertices
+        positions = mesh.getPositionData()[0]
+        faceNormals = mesh.getFaceNormals()
+        first = 0
+        for meshlet in meshlets :
+            self.assertEqual(meshlet.firstTriangle, first)
+            self.assertTrue(meshlet.numTriangles <= 124)
+            self.assertTrue(len(meshlet.vertices) <= 64)
+            self.assertEqual(len(meshlet.localIndices), meshlet.numTriangles * 3)
+            for corner in range(0, meshlet.numTriangles * 3) :
+                self.assertEqual(meshlet.vertices[meshlet.localIndices[corner]], mesh.indices[first * 3 + corner])
+            for triIndex in range(first, first + meshlet.numTriangles) :
+                self.assertEqual(mesh.groupIndices[triIndex], meshlet.groupIndex)
+            for vertexIndex in meshlet.vertices :
+                pos = mesh.getVertex(vertexIndex, pos0)
+                self.assertTrue(Vector.length(pos - meshlet.center) <= meshlet.radius + 0.00001)
+            first += meshlet.numTriangles
+        self.assertEqual(first, numTriangles)
+        self.assertEqual([groupIndex for groupIndex, start, num in mesh.groupRanges()], [0, 1])
+
+        # the cone test is conservative
+        for cameraPos in (Vector(0.0, 0.0, 10.0), Vector(3.0, -2.0, 1.0), Vector(0.0, 0.0, 0.0)) :
+            numCulled = 0
+            for meshlet in meshlets :
+                if meshlet.isBackfacing(cameraPos) :
+                    numCulled += 1
+                    for triIndex in range(meshlet.firstTriangle, meshlet.firstTriangle + meshlet.numTriangles) :
+                        vertexIndex = mesh.indices[triIndex * 3]
+                        toTri = Vector(positions[vertexIndex * 3], positions[vertexIndex * 3 + 1], positions[vertexIndex * 3 + 2]) - cameraPos
+                        normal = Vector(faceNormals[triIndex * 3], faceNormals[triIndex * 3 + 1], faceNormals[triIndex * 3 + 2])
+                        self.assertTrue(Vector.dot3(toTri, normal) >= -0.00001)
+            if cameraPos.z != 1.0 :
+                self.assertTrue(numCulled > 0)
+
+        # a zero-area sliver must not widen the normal cone
+        model = self._gridModel(4)
+        model.mesh.setTriangle(1, Triangle(0, 1, 2, 0))
+        self.assertEqual(model.mesh.getZeroAreaTriangles(), (1,))
+        dstModel, meshlets = buildMeshlets.do(model)
+        self.assertEqual(len(meshlets), 1)
+        self.assertTrue(Vector.equal(meshlets[0].coneAxis, Vector(0.0, 0.0, 1.0), 0.000001))
+        self.assertAlmostEqual(meshlets[0].coneCutoff, 1.0, 6)
+        self.assertTrue(meshlets[0].isBackfacing(Vector(2.0, 2.0, -1.0)))
+        self.assertFalse(meshlets[0].isBackfacing(Vector(2.0, 2.0, 1.0)))
+
+    def test_PackVertexComponents(self) :
+        import drahtgitter.core
+        color0 = ('color', 0)
+        vl = self._buildVertexLayout()
+        vl.add(VertexComponent(color0, 4))
+        model = sphere.generate(vl, 1.0, 64, 32)
+        mesh = model.mesh
+        numVertices = mesh.getNumVertices()
+        rnd = random.Random(1)
+        for i in range(0, 4) :
+            mesh.vertexBuffer[vl.getComponent(color0).offset + i::vl.size] = array(mesh.getPrecision(), [rnd.random() for vertexIndex in range(0, numVertices)])
+        for i in range(0, 2) :
+            mesh.vertexBuffer[vl.getComponent(tex0).offset + i::vl.size] = array(mesh.getPrecision(), [rnd.uniform(-4.0, 4.0) for vertexIndex in range(0, numVertices)])
+
+        # half float conversion, rounded to nearest even
+        for f, h in ((0.0, 0x0000), (1.0, 0x3c00), (-2.0, 0xc000), (65504.0, 0x7bff), (1.0e6, 0x7c00),
+                     (2.0 ** -24, 0x0001), (1.0 + 2.0 ** -11, 0x3c00), (1.0 + 3.0 * 2.0 ** -11, 0x3c02)) :
+            self.assertEqual(drahtgitter.core._floatToHalf(f), h)
+        for f, h in ((1.0, 0x3c00), (-2.0, 0xc000), (65504.0, 0x7bff), (float('inf'), 0x7c00), (2.0 ** -24, 0x0001)) :
+            self.assertEqual(drahtgitter.core._halfToFloat(h), f)
+
+        formats = { norm0: VertexComponent.OctSnorm16, tex0: VertexComponent.Half, color0: VertexComponent.Unorm8, ('bla', 0): VertexComponent.Half }
+        self.assertRaises(Exception, packVertexComponents.do, model, { tex0: VertexComponent.OctSnorm16 })
+
+        # the pure Python and numpy code paths must give the same bytes
+        paths = [('python', None)]
+        if numpy is not None :
+            paths.append(('numpy', numpy))
+        results = []
+        for name, module in paths :
+            drahtgitter.core.numpy = module
+            try :
+                packedModel = packVertexComponents.do(model, formats)
+                packedMesh = packedModel.mesh
+                data = packedMesh.packVertices()
+                results.append(data)
+                self.assertEqual(mesh.vertexLayout.getComponent(norm0).format, VertexComponent.Float)
+                self.assertEqual(packedMesh.vertexLayout.getPackedSize(), 24)
+                self.assertEqual(len(data), numVertices * 24)
+
+                # the quantized values are stable, the float components
+                # are written as 32-bit floats
+                unpacked = packedMesh.clone()
+                unpacked.unpackVertices(str(data))
+                for vertexIndex in range(0, numVertices, 7) :
+                    for comp in (norm0, tex0, color0) :
+                        self.assertEqual(unpacked.getVertex(vertexIndex, comp), packedMesh.getVertex(vertexIndex, comp))
+                    self.assertTrue(Vector.equal(unpacked.getVertex(vertexIndex, pos0), packedMesh.getVertex(vertexIndex, pos0), 0.000001))
+                self.assertEqual(unpacked.packVertices(), data)
+                self.assertRaises(Exception, unpacked.unpackVertices, data[0:-1])
+
+                for vertexIndex in range(0, numVertices) :
+                    self.assertEqual(packedMesh.getVertex(vertexIndex, pos0), mesh.getVertex(vertexIndex, pos0))
+                    self.assertTrue(Vector.equal(packedMesh.getVertex(vertexIndex, norm0), mesh.getVertex(vertexIndex, norm0), 0.0002))
+                    uv = mesh.getVertex(vertexIndex, tex0)
+                    self.assertTrue(Vector.equal(packedMesh.getVertex(vertexIndex, tex0), uv, 0.002))
+                    self.assertTrue(Vector.equal(packedMesh.getVertex(vertexIndex, color0), mesh.getVertex(vertexIndex, color0), 0.5 / 255.0 + 0.000001))
+            finally :
+                drahtgitter.core.numpy = numpy
+        if len(results) == 2 :
+            self.assertEqual(results[0], results[1])
+
+        # back to floats
+        floatModel = packVertexComponents.do(packedModel, { norm0: VertexComponent.Float, tex0: VertexComponent.Float, color0: VertexComponent.Float })
+        self.assertEqual(floatModel.mesh.vertexLayout.getPackedSize(), 48)
+        self.assertEqual(list(floatModel.mesh.vertexBuffer), list(packedMesh.vertexBuffer))
+
     def test_CubeGenerator(self) :
 
         vl = self._buildVertexLayout()
@@ -280,6 +1450,89 @@ class TestMesh(unittest.TestCase) :
         stlasciiwriter.write(reducedModel, 'data/cube_reduced.ascii.stl')
         threejswriter.write(reducedModel, 'data/cube_reduced.model.js', 50.0)
 
+    def _checkIndexMap(self, srcMesh, dstMesh, indexMap, tolerance) :
+        # every source vertex must map to an equal vertex
+        size = srcMesh.vertexLayout.size
+        for srcIndex in range(0, srcMesh.getNumVertices()) :
+            dstIndex = indexMap[srcIndex]
+            for i in range(0, size) :
+                srcValue = srcMesh.vertexBuffer[srcIndex * size + i]
+                dstValue = dstMesh.vertexBuffer[dstIndex * size + i]
+                self.assertTrue(abs(srcValue - dstValue) <= tolerance)
+
+    def test_DeflateHashed(self) :
+
+        # the hashed and sorted welding must find the same vertices
+        vl = self._buildVertexLayout()
+        reducedVl = VertexLayout()
+        reducedVl.add(VertexComponent(pos0, 3))
+        for model in [cube.generate(vl, Vector(2.0, 2.0, 2.0)), torus.generate(vl, 0.5, 1.0, 16, 12)] :
+            model = fixVertexComponents.do(model, reducedVl)
+            sortedModel, sortedIndexMap = deflate.do(model, deflate.Sort)
+            for tolerance in [None, 0.0] :
+                hashedModel, hashedIndexMap = deflate.do(model, deflate.Hash, tolerance)
+                self.assertEqual(hashedModel.mesh.getNumVertices(), sortedModel.mesh.getNumVertices())
+                self.assertEqual(len(hashedIndexMap), model.mesh.getNumVertices())
+                self._checkIndexMap(model.mesh, hashedModel.mesh, hashedIndexMap, DG_TOLERANCE)
+                # first occurrence order is preserved
+                self.assertEqual(hashedIndexMap[0], 0)
+        self.assertRaises(Exception, deflate.do, model, 'bla')
+
+        # vertices closer than the tolerance on both sides of a cell border
+        # must be welded, cells are 16 * tolerance with a half cell offset
+        tolerance = 0.001
+        posVl = VertexLayout()
+        posVl.add(VertexComponent(pos0, 3))
+        mesh = Mesh(posVl, 6, 2)
+        mesh.setVertex(0, pos0, Vector(0.0079, 0.0, 0.0))
+        mesh.setVertex(1, pos0, Vector(0.0081, 0.0, 0.0))
+        mesh.setVertex(2, pos0, Vector(0.0, 0.0079, -0.0079))
+        mesh.setVertex(3, pos0, Vector(0.0, 0.0081, -0.0081))
+        mesh.setVertex(4, pos0, Vector(0.0, 0.0, 0.0))
+        mesh.setVertex(5, pos0, Vector(0.002, 0.0, 0.0))
+        mesh.setTriangles(array(Mesh.IndexType, [0, 1, 2, 3, 4, 5]), 0)
+        model = Model('border')
+        model.mesh = mesh
+        hashedModel, hashedIndexMap = deflate.do(model, deflate.Hash, tolerance)
+        self.assertEqual(hashedIndexMap, [0, 0, 1, 1, 2, 3])
+        self._checkIndexMap(mesh, hashedModel.mesh, hashedIndexMap, tolerance)
+        sortedModel, sortedIndexMap = deflate.do(model, deflate.Sort, tolerance)
+        self.assertEqual(sortedModel.mesh.getNumVertices(), 4)
+        exactModel, exactIndexMap = deflate.do(model, deflate.Hash, 0.0)
+        self.assertEqual(exactModel.mesh.getNumVertices(), 6)
+
+        # both modes find the same vertices on a larger mesh
+        model = fixVertexComponents.do(sphere.generate(vl, 1.0, 64, 32), reducedVl)
+        self.assertEqual(deflate.do(model, deflate.Hash)[0].mesh.getNumVertices(), deflate.do(model, deflate.Sort)[0].mesh.getNumVertices())
+
+    def test_DeflateThreaded(self) :
+
+        # deflate several models in parallel threads, the results
+        # must match a sequential deflate of the same models
+        vl = self._buildVertexLayout()
+        models = [cube.generate(vl, Vector(2.0, 2.0, 2.0)),
+                  sphere.generate(vl, 1.0, 16, 8),
+                  cylinder.generate(vl, 1.0, 1.0, 2.0, 16, 2),
+                  torus.generate(vl, 0.5, 1.0, 16, 12)]
+        expected = [deflate.do(model) for model in models]
+
+        results = [None] * len(models)
+        def worker(i) :
+            results[i] = deflate.do(models[i])
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(0, len(models))]
+        for thread in threads :
+            thread.start()
+        for thread in threads :
+            thread.join()
+
+        for i in range(0, len(models)) :
+            expectedModel, expectedIndexMap = expected[i]
+            resultModel, resultIndexMap = results[i]
+            self.assertEqual(resultIndexMap, expectedIndexMap)
+            self.assertEqual(resultModel.mesh.vertexBuffer, expectedModel.mesh.vertexBuffer)
+            self.assertEqual(resultModel.mesh.indices, expectedModel.mesh.indices)
+            self.assertTrue(resultModel.mesh.getNumVertices() <= models[i].mesh.getNumVertices())
+
 if __name__ == '__main__':
     unittest.main()
 #--- eof
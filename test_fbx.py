@@ -9,6 +9,7 @@ import drahtgitter.operators.deflate as deflate
 import drahtgitter.operators.randomMaterialColors as randomMaterialColors
 import drahtgitter.operators.removeDegenerateTriangles as removeDegenerateTriangles
 import drahtgitter.operators.computeTriangleNormals as computeTriangleNormals
+import drahtgitter.operators.flattenIndices as flattenIndices
 import drahtgitter.writers.stlasciiwriter as stlasciiwriter
 import drahtgitter.writers.threejswriter as threejswriter
 import drahtgitter.readers.fbxutil.nebulamaterialparser as nebulamaterialparser
@@ -31,6 +32,26 @@ class TestFBX(unittest.TestCase) :
         self._convert('radonlabs_opelblitz', 100)
         self._convert('radonlabs_tiger', 100)
 
+    def test_MultiIndexed(self) :
+        config = fbxreader.config()
+        config.multiIndexed = True
+        model = fbxreader.read(config, 'data/teapot_yellow.fbx', 'teapot')
+        self.assertTrue(model.mesh.isMultiIndexed())
+        threejswriter.write(model, 'data/teapot_multi.model.js', 100)
+        flatModel = flattenIndices.do(model)
+        self.assertFalse(flatModel.mesh.isMultiIndexed())
+        self.assertEqual(flatModel.mesh.getNumTriangles(), model.mesh.getNumTriangles())
+        flatModel = computeTriangleNormals.do(flatModel)
+
+    def test_Dedup(self) :
+        config = fbxreader.config()
+        model = fbxreader.read(config, 'data/teapot_yellow.fbx', 'teapot')
+        deflatedModel, indexMap = deflate.do(model, deflate.Hash, 0.0)
+        config.dedup = True
+        dedupModel = fbxreader.read(config, 'data/teapot_yellow.fbx', 'teapot')
+        self.assertEqual(dedupModel.mesh.getNumVertices(), deflatedModel.mesh.getNumVertices())
+        self.assertEqual(dedupModel.mesh.getNumTriangles(), model.mesh.getNumTriangles())
+
     def test_NebulaMaterialParser(self) :
         config = fbxreader.config()
         config.materialParsers.insert(0, nebulamaterialparser.nebulaMaterialParser())